@@ -0,0 +1,32 @@
+import logging
+
+from chapter_downloader.config import CAPTURE_BACKEND, BROWSER_TABS_PER_BROWSER
+from chapter_downloader.backends.base import CaptureBackend, CaptureSession, SessionError, SessionTimeout
+
+__all__ = ["CaptureBackend", "CaptureSession", "SessionError", "SessionTimeout", "create_capture_backend", "backend_tab_count"]
+
+logger = logging.getLogger(__name__)
+
+def backend_tab_count(name=CAPTURE_BACKEND, tabs_per_browser=BROWSER_TABS_PER_BROWSER):
+    """该后端每个浏览器实际可以同时打开的标签页数量。"""
+    if name == "playwright":
+        return max(1, tabs_per_browser)
+    if tabs_per_browser > 1:
+        logger.warning(f"{name} 后端不支持在一个浏览器中同时使用多个标签页，BROWSER_TABS_PER_BROWSER 按 1 处理。")
+    return 1
+
+def create_capture_backend(name=CAPTURE_BACKEND, pool_size=None, tabs_per_browser=BROWSER_TABS_PER_BROWSER):
+    """
+    按名称创建捕获后端（"selenium" / "playwright"）。
+    后端模块在这里才导入，未安装的浏览器自动化库只在被选用时才需要。
+    pool_size 为浏览器数量，为 None 时使用 DRIVER_POOL_SIZE；tabs_per_browser 为每个浏览器的标签页数量（仅 playwright）。
+    """
+    if name == "selenium":
+        from chapter_downloader.backends.selenium_backend import SeleniumBackend
+        return SeleniumBackend(pool_size=pool_size)
+    if name == "playwright":
+        from chapter_downloader.backends.playwright_backend import PlaywrightBackend
+        if pool_size is None:
+            return PlaywrightBackend(tabs_per_browser=tabs_per_browser)
+        return PlaywrightBackend(size=pool_size, tabs_per_browser=tabs_per_browser)
+    raise ValueError(f"未知的捕获后端: {name}（可选: selenium, playwright）")
@@ -0,0 +1,106 @@
+from chapter_downloader.tracing import null_tracer
+
+
+class SessionTimeout(Exception):
+    """等待页面、图片或翻页超时。会话仍然可用。"""
+
+class SessionError(Exception):
+    """浏览器或与浏览器的连接出错。调用方应放弃这次章节捕获，并以 healthy=False 归还会话。"""
+
+class CaptureSession:
+    """
+    一个浏览器标签页上的捕获操作，由 capture_chapter_images 在章节捕获期间使用。
+    所有方法都是同步的；超时抛出 SessionTimeout，浏览器错误抛出 SessionError（各后端负责转换自己的异常）。
+    """
+    def navigate(self, url, image_id):
+        """打开 url 并等待 id 为 image_id 的元素出现。"""
+        raise NotImplementedError
+
+    def reload(self, image_id):
+        """刷新当前页面并等待图片元素出现。"""
+        raise NotImplementedError
+
+    def read_page_state(self):
+        """返回阅读器显示的 (当前页码, 总页数)，无法读取的项为 None。"""
+        raise NotImplementedError
+
+    def jump_to_page(self, image_id, page_number):
+        """通过阅读器的翻页接口或 #p=N 跳到指定页并等待新图片可见，返回使用的方式（'api' / 'hash'）。"""
+        raise NotImplementedError
+
+    def click_next_page(self, image_id, tracer=null_tracer):
+        """点击“下一页”并等待新图片可见。没有下一页或导航超时返回 False。"""
+        raise NotImplementedError
+
+    def is_last_page(self):
+        """阅读器是否显示已禁用的“下一页”，即确认已到章节末尾。"""
+        raise NotImplementedError
+
+    def probe_page(self, image_id, page_number, isolate=False):
+        """
+        等待图片就绪并返回页面几何信息（见 reader_scripts.PROBE_PAGE_JS）。
+        等待超时返回 None。
+        """
+        raise NotImplementedError
+
+    def capture_clip(self, rect, vertical_offset_compensation, image_format, quality, beyond_viewport=True):
+        """
+        只截取 rect（页面坐标）所在区域，返回编码后的字节；尺寸无效时返回 None。
+        beyond_viewport 为 False 时只从当前视口截取，rect 必须已滚动到视口内。
+        """
+        raise NotImplementedError
+
+    def scroll_to(self, x, y):
+        """把窗口滚动到页面坐标 (x, y)。"""
+        raise NotImplementedError
+
+    def set_window_size(self, width, height):
+        raise NotImplementedError
+
+    def screenshot_window(self):
+        """截取整个窗口，返回 PNG 字节。"""
+        raise NotImplementedError
+
+    def fetch_network_page(self, probe, page_number):
+        """取出浏览器下载图片时收到的原始字节，返回 CapturedPage；不可用时返回 None。"""
+        raise NotImplementedError
+
+    def get_cookies(self):
+        """返回当前浏览器上下文的 Cookie（包括 HttpOnly），{name: value}。"""
+        raise NotImplementedError
+
+    def add_network_listener(self, listener):
+        """注册 listener(method, params)，接收 CDP Network 格式的网络事件（用于拦截统计）。"""
+        raise NotImplementedError
+
+    def remove_network_listener(self, listener):
+        raise NotImplementedError
+
+    def flush_network_events(self):
+        """把尚未分发的网络事件交给监听器。"""
+        raise NotImplementedError
+
+class CaptureBackend:
+    """
+    捕获后端：负责启动浏览器并提供 CaptureSession。
+    open_session 借出一个已重置状态、设置好 URL 拦截的会话，用完后必须 release_session 归还。
+    同一个后端可以被多个线程同时使用。
+    """
+    name = None
+
+    def open_session(self, urls_to_block, blocking_profile=None, wait=True):
+        """借出一个会话；wait 为 False 且没有空闲容量时立即返回 None。"""
+        raise NotImplementedError
+
+    def release_session(self, session, pages_captured=0, healthy=True):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,553 @@
+import asyncio
+import base64
+import fnmatch
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+from chapter_downloader.config import (
+    DRIVER_POOL_SIZE, BROWSER_TABS_PER_BROWSER, DRIVER_WINDOW_WIDTH, DRIVER_WINDOW_HEIGHT, IMAGE_WAIT_TIMEOUT,
+    BROWSER_PROFILE_PERSISTENT, NETWORK_BODY_WAIT, NETWORK_LOG_MAX_REQUESTS
+)
+from chapter_downloader.backends.base import CaptureBackend, CaptureSession, SessionError, SessionTimeout
+from chapter_downloader.backends.reader_scripts import (
+    PROBE_PAGE_JS, ARM_IMAGE_CHANGE_JS, WAIT_IMAGE_CHANGE_JS, READ_PAGE_STATE_JS,
+    GO_TO_PAGE_JS, NEXT_PAGE_BUTTONS_XPATH, DISABLED_NEXT_PAGE_XPATH
+)
+from chapter_downloader.browser_setup import configured_browser_binary, find_browser_binary, select_browser
+from chapter_downloader.browser_profile import acquire_profile
+from chapter_downloader.page_pipeline import CapturedPage
+from chapter_downloader.tracing import null_tracer
+
+
+logger = logging.getLogger(__name__)
+
+_TIMEOUT_MS = IMAGE_WAIT_TIMEOUT * 1000
+_LAUNCH_ARGS = ["--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu", "--force-device-scale-factor=1"]
+_VIEWPORT = {"width": DRIVER_WINDOW_WIDTH, "height": DRIVER_WINDOW_HEIGHT}
+# Playwright 的 request.resource_type 到 CDP Network.ResourceType 名称的映射，未列出的按 "Other" 处理
+_CDP_RESOURCE_TYPES = {
+    "document": "Document",
+    "stylesheet": "Stylesheet",
+    "image": "Image",
+    "media": "Media",
+    "font": "Font",
+    "script": "Script",
+    "texttrack": "TextTrack",
+    "xhr": "XHR",
+    "fetch": "Fetch",
+    "prefetch": "Prefetch",
+    "eventsource": "EventSource",
+    "websocket": "WebSocket",
+    "manifest": "Manifest",
+    "signedexchange": "SignedExchange",
+    "ping": "Ping",
+    "cspviolationreport": "CSPViolationReport",
+    "preflight": "Preflight",
+    "other": "Other"
+}
+
+def _sync_script(script):
+    """把按 execute_script 约定编写的脚本包装为 page.evaluate 可用的函数。"""
+    return f"(args) => (function() {{ {script} }}).apply(null, args)"
+
+def _async_script(script):
+    """把按 execute_async_script 约定编写的脚本（最后一个参数为完成回调）包装为返回 Promise 的函数。"""
+    return f"(args) => new Promise((resolve) => (function() {{ {script} }}).apply(null, args.concat([resolve])))"
+
+_PROBE_PAGE = _async_script(PROBE_PAGE_JS)
+_ARM_IMAGE_CHANGE = _sync_script(ARM_IMAGE_CHANGE_JS)
+_WAIT_IMAGE_CHANGE = _async_script(WAIT_IMAGE_CHANGE_JS)
+_READ_PAGE_STATE = _sync_script(READ_PAGE_STATE_JS)
+_GO_TO_PAGE = _sync_script(GO_TO_PAGE_JS)
+
+class _EventLoopThread:
+    """在后台线程中运行的 asyncio 事件循环，所有 Playwright 调用都在这个循环上执行。"""
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="playwright-loop", daemon=True)
+        self._thread.start()
+
+    def run(self, coroutine):
+        """在事件循环上执行协程并同步等待结果（可以从任意线程调用）。"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+def _translate_errors(method):
+    """在事件循环上执行会话方法对应的协程，并把 Playwright 的异常转换为 SessionTimeout / SessionError。"""
+    def wrapper(self, *args, **kwargs):
+        try:
+            return self._backend._loop.run(method(self, *args, **kwargs))
+        except (PlaywrightTimeoutError, asyncio.TimeoutError) as e:
+            raise SessionTimeout(str(e) or "等待超时") from e
+        except PlaywrightError as e:
+            raise SessionError(str(e)) from e
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+class PlaywrightSession(CaptureSession):
+    """
+    一个独立浏览器上下文（Cookie、缓存互不共享）中的标签页；使用持久配置目录时，
+    同一浏览器的所有会话都是同一个持久上下文中的标签页（owns_context 为 False）。
+    同一个浏览器的多个会话由同一个事件循环并发驱动。
+    """
+    def __init__(self, backend, context, page, blocked_patterns, blocked_resource_types, owns_context=True,
+                 allowlist_profile=None):
+        self._backend = backend
+        self.host = None
+        self.owns_context = owns_context
+        self.context = context
+        self.page = page
+        self._blocked_patterns = blocked_patterns
+        self._blocked_resource_types = blocked_resource_types
+        self._allowlist_profile = allowlist_profile
+        self._aborted_requests = set()
+        self._responses = OrderedDict() # 图片 URL -> Response
+        self._listeners = []
+        self._cdp = None
+        page.on("response", self._on_response)
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_finished)
+        page.on("requestfailed", self._on_request_failed)
+
+    # --- 事件处理（在事件循环线程中调用） ---
+
+    def _is_blocked(self, request):
+        if request.resource_type in self._blocked_resource_types or any(
+            fnmatch.fnmatchcase(request.url, pattern) for pattern in self._blocked_patterns
+        ):
+            return True
+        # 白名单：allow_domains 之外的第三方请求一律拦截。图片除外，漫画图片服务器可能换到列表之外的主机，
+        # 广告图片仍由上面的 block_domains 通配符拦截
+        if self._allowlist_profile is not None and request.resource_type != "image":
+            return not self._allowlist_profile.is_allowed(request.url)
+        return False
+
+    async def _route(self, route):
+        request = route.request
+        if self._is_blocked(request):
+            self._aborted_requests.add(request)
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
+
+    def _on_response(self, response):
+        if response.request.resource_type != "image":
+            return
+        self._responses[response.url] = response
+        self._responses.move_to_end(response.url)
+        while len(self._responses) > NETWORK_LOG_MAX_REQUESTS:
+            self._responses.popitem(last=False)
+
+    def _emit(self, method, params):
+        for listener in list(self._listeners):
+            listener(method, params)
+
+    def _on_request(self, request):
+        # 转换为与 CDP Network 事件相同的格式，拦截统计等监听器无需区分后端
+        self._emit('Network.requestWillBeSent', {
+            'requestId': id(request),
+            'request': {'url': request.url},
+            'type': _CDP_RESOURCE_TYPES.get(request.resource_type, "Other")
+        })
+
+    def _on_request_finished(self, request):
+        self._emit('Network.loadingFinished', {'requestId': id(request)})
+
+    def _on_request_failed(self, request):
+        blocked = request in self._aborted_requests
+        self._aborted_requests.discard(request)
+        self._emit('Network.loadingFailed', {
+            'requestId': id(request),
+            'blockedReason': 'inspector' if blocked else None
+        })
+
+    async def _evaluate_async(self, expression, *args):
+        # page.evaluate 没有脚本超时，和 Selenium 的 set_script_timeout 保持一致
+        return await asyncio.wait_for(self.page.evaluate(expression, list(args)), IMAGE_WAIT_TIMEOUT)
+
+    async def _wait_for_image(self, image_id, state):
+        await self.page.wait_for_selector(f"#{image_id}", state=state, timeout=_TIMEOUT_MS)
+
+    # --- CaptureSession ---
+
+    @_translate_errors
+    async def navigate(self, url, image_id):
+        await self.page.goto(url, wait_until="domcontentloaded", timeout=_TIMEOUT_MS)
+        await self._wait_for_image(image_id, "attached")
+
+    @_translate_errors
+    async def reload(self, image_id):
+        await self.page.reload(wait_until="domcontentloaded", timeout=_TIMEOUT_MS)
+        await self._wait_for_image(image_id, "attached")
+
+    @_translate_errors
+    async def read_page_state(self):
+        state = await self.page.evaluate(_READ_PAGE_STATE, []) or {}
+        return state.get('current'), state.get('total')
+
+    @_translate_errors
+    async def jump_to_page(self, image_id, page_number):
+        await self.page.evaluate(_ARM_IMAGE_CHANGE, [image_id])
+        method = await self.page.evaluate(_GO_TO_PAGE, [page_number])
+        await self._evaluate_async(_WAIT_IMAGE_CHANGE)
+        await self._wait_for_image(image_id, "visible")
+        return method
+
+    def click_next_page(self, image_id, tracer=null_tracer):
+        try:
+            return self._backend._loop.run(self._click_next_page(image_id, tracer))
+        except (PlaywrightTimeoutError, asyncio.TimeoutError):
+            logger.warning("等待页面导航超时。可能是章节末尾或加载缓慢。")
+            if self._backend._loop.run(self._is_last_page()):
+                logger.info("通过查找已禁用的“下一页”span确认已到章节末尾。")
+            return False
+        except PlaywrightError as e:
+            logger.error(f"点击“下一页”或等待导航时发生意外错误: {e}", exc_info=True)
+            return False
+
+    async def _click_next_page(self, image_id, tracer):
+        with tracer.span("next_click"):
+            next_page_button = None
+            buttons = self.page.locator(f"xpath={NEXT_PAGE_BUTTONS_XPATH}")
+            for index in range(await buttons.count()):
+                button = buttons.nth(index)
+                onclick_value = await button.get_attribute("onclick")
+                if "下一章" not in await button.inner_text() and not (onclick_value and "nextC" in onclick_value):
+                    next_page_button = button
+                    break
+            if next_page_button is None:
+                logger.info("未找到“下一页”按钮。假定已到章节末尾。")
+                return False
+
+            # 点击前布置观察器，避免在点击和开始等待之间错过图片切换
+            await self.page.evaluate(_ARM_IMAGE_CHANGE, [image_id])
+            try:
+                await next_page_button.click(timeout=10000)
+            except PlaywrightError:
+                logger.warning("点击“下一页”按钮失败，尝试使用 JavaScript 点击。")
+                await next_page_button.evaluate("(el) => el.click()")
+
+        with tracer.span("next_wait"):
+            await self._evaluate_async(_WAIT_IMAGE_CHANGE)
+            await self._wait_for_image(image_id, "visible")
+        logger.info("成功导航到下一页。")
+        return True
+
+    def is_last_page(self):
+        return self._backend._loop.run(self._is_last_page())
+
+    async def _is_last_page(self):
+        try:
+            return await self.page.locator(f"xpath={DISABLED_NEXT_PAGE_XPATH}").first.is_visible()
+        except PlaywrightError:
+            return False
+
+    def probe_page(self, image_id, page_number, isolate=False):
+        try:
+            return self._probe_page(image_id, isolate)
+        except SessionTimeout:
+            return None
+
+    @_translate_errors
+    async def _probe_page(self, image_id, isolate):
+        return await self._evaluate_async(_PROBE_PAGE, image_id, isolate)
+
+    @_translate_errors
+    async def capture_clip(self, rect, vertical_offset_compensation, image_format, quality, beyond_viewport=True):
+        # page.screenshot 不支持 WebP，直接使用 CDP 的 Page.captureScreenshot，与 Selenium 后端一致
+        if not rect or rect['width'] <= 0 or rect['height'] <= 0:
+            return None
+        if self._cdp is None:
+            self._cdp = await self.context.new_cdp_session(self.page)
+        params = {
+            'format': image_format,
+            'clip': {
+                'x': rect['x'],
+                'y': max(0, rect['y'] - vertical_offset_compensation),
+                'width': rect['width'],
+                'height': rect['height'],
+                'scale': 1
+            },
+            'captureBeyondViewport': beyond_viewport,
+            'fromSurface': True
+        }
+        if quality is not None:
+            params['quality'] = quality
+        result = await self._cdp.send('Page.captureScreenshot', params)
+        return base64.b64decode(result['data'])
+
+    @_translate_errors
+    async def scroll_to(self, x, y):
+        await self.page.evaluate("([x, y]) => window.scrollTo(x, y)", [x, y])
+
+    @_translate_errors
+    async def set_window_size(self, width, height):
+        await self.page.set_viewport_size({"width": int(width), "height": int(height)})
+
+    @_translate_errors
+    async def screenshot_window(self):
+        return await self.page.screenshot(type="png")
+
+    def fetch_network_page(self, probe, page_number):
+        src = probe.get('src')
+        if not src or not src.startswith(('http://', 'https://')):
+            logger.info(f"第 {page_number} 页：图片地址不是网络请求，无法读取响应体。")
+            return None
+        try:
+            result = self._fetch_response_body(src)
+        except (SessionError, SessionTimeout) as e:
+            logger.info(f"第 {page_number} 页：无法读取图片响应体: {e}")
+            return None
+        if result is None:
+            logger.info(f"第 {page_number} 页：没有找到图片的网络响应。")
+            return None
+        data, content_type = result
+        logger.info(f"第 {page_number} 页：已从网络响应中取得原图 ({len(data)} 字节)")
+        return CapturedPage(page_number, data, content_type=content_type, source="network", source_url=src)
+
+    @_translate_errors
+    async def _fetch_response_body(self, url):
+        # response 事件可能比图片就绪稍晚分发
+        deadline = time.monotonic() + NETWORK_BODY_WAIT
+        while url not in self._responses and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        response = self._responses.get(url)
+        if response is None or not response.ok:
+            return None
+        data = await response.body()
+        return data, response.headers.get('content-type')
+
+    @_translate_errors
+    async def get_cookies(self):
+        return {cookie['name']: cookie['value'] for cookie in await self.context.cookies()}
+
+    def add_network_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_network_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    @_translate_errors
+    async def flush_network_events(self):
+        # 事件由 Playwright 主动推送，让事件循环处理完已到达的事件即可
+        await asyncio.sleep(0)
+
+class _BrowserHost:
+    """
+    一个 Chromium 进程及其中已打开的标签页数量。
+    使用持久配置目录时没有 Browser 对象，只有 launch_persistent_context 返回的持久上下文。
+    """
+    def __init__(self, browser=None, context=None, profile=None):
+        self.browser = browser
+        self.context = context
+        self.profile = profile
+        self.open_tabs = 0
+        self._closed = False
+        if context is not None:
+            context.on("close", self._on_close)
+
+    def _on_close(self, _context):
+        self._closed = True
+
+    def is_connected(self):
+        if self.browser is not None:
+            return self.browser.is_connected()
+        return not self._closed
+
+    async def close(self):
+        try:
+            if self.browser is not None:
+                if self.browser.is_connected():
+                    await self.browser.close()
+            elif not self._closed:
+                await self.context.close()
+        finally:
+            if self.profile is not None:
+                self.profile.release()
+
+class PlaywrightBackend(CaptureBackend):
+    """
+    Playwright 后端：最多 size 个无头 Chromium，由后台线程中的单个 asyncio 事件循环驱动。
+    每个会话是某个浏览器中的一个独立浏览器上下文（标签页），每个浏览器最多同时打开 tabs_per_browser 个，
+    新会话优先放进已启动的浏览器，只有都已满时才启动新的浏览器；崩溃的浏览器在归还会话时丢弃。
+    请求拦截通过 page.route 实现，可以按资源类型拦截。
+    persistent_profile 为 True 时每个浏览器使用一个持久配置目录，会话共享其中的 Cookie 和缓存。
+    """
+    name = "playwright"
+
+    def __init__(self, size=DRIVER_POOL_SIZE, tabs_per_browser=BROWSER_TABS_PER_BROWSER, persistent_profile=BROWSER_PROFILE_PERSISTENT):
+        self.size = max(1, size)
+        self.tabs_per_browser = max(1, tabs_per_browser)
+        self.persistent_profile = persistent_profile
+        self._loop = _EventLoopThread()
+        self._slots = threading.BoundedSemaphore(self.size * self.tabs_per_browser)
+        self._lock = threading.Lock()
+        self._host_changed = threading.Condition(self._lock)
+        self._launching = 0 # 正在启动（锁外进行）的浏览器数量
+        self._start_lock = threading.Lock()
+        self._playwright = None
+        self._browser_name = None
+        self._executable_path = None
+        self._hosts = []
+
+    def _ensure_started(self):
+        """
+        第一次启动浏览器之前，在调用线程中选择浏览器（可能需要询问用户）并启动 Playwright，整个后端只进行一次。
+        放在事件循环之外，避免并发启动的协程各自启动一个 Playwright，也避免询问时阻塞事件循环。
+        """
+        with self._start_lock:
+            if self._playwright is not None:
+                return
+            selected_browser, _ = select_browser()
+            self._browser_name = selected_browser or "chromium"
+            self._executable_path = configured_browser_binary() or (
+                find_browser_binary(selected_browser) if selected_browser else None
+            )
+            self._playwright = self._loop.run(self._start_playwright())
+
+    async def _start_playwright(self):
+        return await async_playwright().start()
+
+    async def _launch(self):
+        executable_path = self._executable_path
+        logger.info(f"正在启动 Playwright 浏览器{f' ({executable_path})' if executable_path else ''}...")
+        if not self.persistent_profile:
+            browser = await self._playwright.chromium.launch(
+                headless=True, executable_path=executable_path, args=_LAUNCH_ARGS
+            )
+            return _BrowserHost(browser=browser)
+
+        profile = acquire_profile(self._browser_name)
+        try:
+            try:
+                context = await self._launch_persistent(profile, executable_path)
+            except PlaywrightError as e:
+                # 配置目录损坏时浏览器无法启动，清空后重试一次
+                profile.wipe(f"浏览器无法启动: {e}")
+                context = await self._launch_persistent(profile, executable_path)
+        except BaseException:
+            profile.release()
+            raise
+        return _BrowserHost(context=context, profile=profile)
+
+    async def _launch_persistent(self, profile, executable_path):
+        context = await self._playwright.chromium.launch_persistent_context(
+            profile.path,
+            headless=True,
+            executable_path=executable_path,
+            args=_LAUNCH_ARGS + profile.launch_arguments(),
+            viewport=_VIEWPORT,
+            device_scale_factor=1
+        )
+        context.set_default_timeout(_TIMEOUT_MS)
+        # 持久上下文启动时自带一个空白标签页，会话各自新建标签页
+        for page in context.pages:
+            await page.close()
+        return context
+
+    def _reserve_host(self):
+        """
+        选出有空闲标签页的浏览器（标签页最少者优先），必要时启动新的浏览器，并占用其中一个标签页。
+        浏览器在锁外启动，启动期间其他会话仍可使用已有的浏览器；浏览器数量已满且有浏览器正在启动时等待其启动完成。
+        """
+        with self._host_changed:
+            while True:
+                self._hosts = [host for host in self._hosts if host.is_connected() or host.open_tabs]
+                candidates = [
+                    host for host in self._hosts
+                    if host.open_tabs < self.tabs_per_browser and host.is_connected()
+                ]
+                if candidates:
+                    host = min(candidates, key=lambda h: h.open_tabs)
+                    host.open_tabs += 1
+                    return host
+                if not self._launching or len(self._hosts) + self._launching < self.size:
+                    break
+                self._host_changed.wait()
+            self._launching += 1
+
+        host = None
+        try:
+            self._ensure_started()
+            host = self._loop.run(self._launch())
+            return host
+        finally:
+            with self._host_changed:
+                self._launching -= 1
+                if host is not None:
+                    host.open_tabs += 1
+                    self._hosts.append(host)
+                self._host_changed.notify_all()
+
+    async def _new_session(self, host, urls_to_block, blocking_profile):
+        owns_context = host.context is None
+        if owns_context:
+            context = await host.browser.new_context(viewport=_VIEWPORT, device_scale_factor=1)
+            context.set_default_timeout(_TIMEOUT_MS)
+        else:
+            context = host.context
+        page = await context.new_page()
+        blocked_resource_types = set(blocking_profile.block_resource_types) if blocking_profile else set()
+        allowlist_profile = blocking_profile if blocking_profile is not None and blocking_profile.allow_domains_only else None
+        session = PlaywrightSession(
+            self, context, page, list(urls_to_block or []), blocked_resource_types, owns_context=owns_context,
+            allowlist_profile=allowlist_profile
+        )
+        session.host = host
+        if urls_to_block or blocked_resource_types or allowlist_profile is not None:
+            # 按标签页拦截，共享持久上下文的会话也各自使用自己的拦截列表
+            await page.route("**/*", session._route)
+        return session
+
+    def _return_host(self, host):
+        with self._lock:
+            host.open_tabs -= 1
+
+    def open_session(self, urls_to_block, blocking_profile=None, wait=True):
+        if not self._slots.acquire(blocking=wait):
+            return None
+        host = None
+        try:
+            host = self._reserve_host()
+            return self._loop.run(self._new_session(host, urls_to_block, blocking_profile))
+        except BaseException as e:
+            if host is not None:
+                self._return_host(host)
+            self._slots.release()
+            if isinstance(e, PlaywrightError):
+                raise SessionError(str(e)) from e
+            raise
+
+    def release_session(self, session, pages_captured=0, healthy=True):
+        try:
+            self._loop.run(session.context.close() if session.owns_context else session.page.close())
+        except PlaywrightError as e:
+            logger.warning(f"关闭浏览器上下文时出错: {e}")
+        finally:
+            self._return_host(session.host)
+            self._slots.release()
+
+    def close(self):
+        async def shutdown():
+            for host in self._hosts:
+                await host.close()
+            if self._playwright is not None:
+                await self._playwright.stop()
+        try:
+            self._loop.run(shutdown())
+        except PlaywrightError as e:
+            logger.warning(f"关闭 Playwright 时出错: {e}")
+        finally:
+            self._hosts = []
+            self._playwright = None
+            self._loop.stop()
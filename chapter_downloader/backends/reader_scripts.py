@@ -0,0 +1,148 @@
+# 阅读器页面中执行的脚本，各捕获后端共用。
+# 脚本按 Selenium execute_script / execute_async_script 的约定编写：参数通过 arguments 传入，
+# 异步脚本的最后一个参数是完成回调。其他后端需要自行按这一约定包装（见 playwright_backend.py）。
+
+# 隐藏 body 下除目标元素所在路径以外的所有内容，并把目标元素滚动到视图中央
+ISOLATE_ELEMENT_FUNCTION_JS = """
+    function isolateElement(targetElement) {
+        var bodyChildren = document.body.children;
+        for (var i = 0; i < bodyChildren.length; i++) {
+            bodyChildren[i].style.setProperty('display', 'none', 'important');
+        }
+        var current = targetElement;
+        var pathElements = [];
+        while (current && current !== document.body) {
+            pathElements.push(current);
+            current = current.parentElement;
+        }
+        pathElements.forEach(function(el) {
+            el.style.setProperty('display', '', '');
+            el.style.setProperty('visibility', 'visible', 'important');
+            if (el.parentElement) {
+                 el.parentElement.style.overflow = 'visible';
+            }
+        });
+        document.body.style.setProperty('display', '', '');
+        document.body.style.setProperty('visibility', 'visible', 'important');
+        document.body.style.overflow = 'visible';
+        if (document.documentElement) {
+            document.documentElement.style.setProperty('display', '', '');
+            document.documentElement.style.setProperty('visibility', 'visible', 'important');
+            document.documentElement.style.overflow = 'visible';
+        }
+        targetElement.scrollIntoView({block: 'center', inline: 'center'});
+        return true;
+    }
+"""
+
+# 一次往返完成一页所需的全部准备和测量：
+# 等待 #mangaFile 出现 →（可选）隔离元素 → 等待加载并解码、再等两帧让布局生效 → 返回几何信息和就绪状态
+PROBE_PAGE_JS = ISOLATE_ELEMENT_FUNCTION_JS + """
+    var imageId = arguments[0];
+    var isolate = arguments[1];
+    var done = arguments[arguments.length - 1];
+    function measure(img, isolated) {
+        var r = img.getBoundingClientRect();
+        var root = document.documentElement;
+        return {
+            isolated: isolated,
+            ready: img.complete && img.naturalWidth > 0 && img.getClientRects().length > 0,
+            src: img.currentSrc || img.src,
+            userAgent: navigator.userAgent,
+            url: location.href,
+            rect: {x: r.left + window.scrollX, y: r.top + window.scrollY, width: r.width, height: r.height},
+            docWidth: root.scrollWidth,
+            docHeight: root.scrollHeight,
+            windowWidth: window.outerWidth,
+            windowHeight: window.outerHeight,
+            viewportWidth: window.innerWidth,
+            viewportHeight: window.innerHeight,
+            dpr: window.devicePixelRatio || 1
+        };
+    }
+    function whenReady(img, isolated) {
+        function settle() {
+            requestAnimationFrame(function() { requestAnimationFrame(function() { done(measure(img, isolated)); }); });
+        }
+        function decodeThenSettle() {
+            if (img.decode) { img.decode().then(settle, settle); } else { settle(); }
+        }
+        if (img.complete && img.naturalWidth > 0) { decodeThenSettle(); return; }
+        // 已经加载失败的图片不会再触发 load/error，立即返回（ready 为 false）；还没有 src 的图片等待阅读器设置
+        if (img.complete && img.getAttribute('src')) { done(measure(img, isolated)); return; }
+        img.addEventListener('load', decodeThenSettle, {once: true});
+        img.addEventListener('error', function() { done(measure(img, isolated)); }, {once: true});
+    }
+    function start(img) {
+        var isolated = false;
+        if (isolate) {
+            isolated = isolateElement(img);
+            if (!isolated) { img.scrollIntoView({block: 'center', inline: 'center'}); }
+        }
+        whenReady(img, isolated);
+    }
+    var existing = document.getElementById(imageId);
+    if (existing) { start(existing); return; }
+    var observer = new MutationObserver(function() {
+        var img = document.getElementById(imageId);
+        if (img) { observer.disconnect(); start(img); }
+    });
+    observer.observe(document.documentElement, {childList: true, subtree: true});
+"""
+
+# 在点击翻页之前布置 MutationObserver：#mangaFile 被替换或 src 改变时兑现 window.__cadImageChanged
+ARM_IMAGE_CHANGE_JS = """
+    var imageId = arguments[0];
+    var oldImg = document.getElementById(imageId);
+    var oldSrc = oldImg ? (oldImg.currentSrc || oldImg.src) : null;
+    if (window.__cadImageObserver) { window.__cadImageObserver.disconnect(); }
+    window.__cadImageChanged = new Promise(function(resolve) {
+        function changed() {
+            var img = document.getElementById(imageId);
+            return img && (img !== oldImg || (img.currentSrc || img.src) !== oldSrc);
+        }
+        var observer = new MutationObserver(function() {
+            if (changed()) { observer.disconnect(); resolve(true); }
+        });
+        observer.observe(document.documentElement, {subtree: true, childList: true, attributes: true, attributeFilter: ['src']});
+        window.__cadImageObserver = observer;
+    });
+    return true;
+"""
+
+# 等待上面布置的 Promise；如果发生了整页跳转（window 状态丢失），直接视为已切换
+WAIT_IMAGE_CHANGE_JS = """
+    var done = arguments[arguments.length - 1];
+    if (!window.__cadImageChanged) { done(true); return; }
+    window.__cadImageChanged.then(function() { done(true); });
+"""
+
+# 读取阅读器当前页码和总页数（#pageSelect 下拉框 / #page 页码显示），读不到时为 null
+READ_PAGE_STATE_JS = """
+    var current = null, total = null;
+    var select = document.getElementById('pageSelect');
+    if (select && select.options.length) {
+        total = select.options.length;
+        current = select.selectedIndex + 1;
+    }
+    var pageSpan = document.getElementById('page');
+    if (pageSpan && /^\\d+$/.test(pageSpan.textContent.trim())) {
+        current = parseInt(pageSpan.textContent.trim(), 10);
+    }
+    return {current: current, total: total};
+"""
+
+# 通过阅读器自身的翻页接口跳到指定页，没有该接口时改写 #p=N 页面片段
+GO_TO_PAGE_JS = """
+    var pageNumber = arguments[0];
+    if (window.SMH && SMH.utils && typeof SMH.utils.goPage === 'function') {
+        SMH.utils.goPage(pageNumber);
+        return 'api';
+    }
+    location.hash = 'p=' + pageNumber;
+    return 'hash';
+"""
+
+# “下一页”按钮（排除“下一章”）以及章节末尾时显示的禁用状态
+NEXT_PAGE_BUTTONS_XPATH = "//div[@id='pagination']//a[contains(@class, 'next') and (contains(text(), '下一页') or contains(@href, 'SMH.utils.goPage'))]"
+DISABLED_NEXT_PAGE_XPATH = "//div[@id='pagination']//span[contains(@class, 'disabled') and (contains(text(), '下一页'))]"
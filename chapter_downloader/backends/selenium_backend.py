@@ -0,0 +1,235 @@
+import base64
+import functools
+import logging
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import (
+    TimeoutException, ScriptTimeoutException, NoSuchElementException, WebDriverException, ElementClickInterceptedException
+)
+
+from chapter_downloader.config import IMAGE_WAIT_TIMEOUT
+from chapter_downloader.backends.base import CaptureBackend, CaptureSession, SessionError, SessionTimeout
+from chapter_downloader.backends.reader_scripts import (
+    PROBE_PAGE_JS, ARM_IMAGE_CHANGE_JS, WAIT_IMAGE_CHANGE_JS, READ_PAGE_STATE_JS,
+    GO_TO_PAGE_JS, NEXT_PAGE_BUTTONS_XPATH, DISABLED_NEXT_PAGE_XPATH
+)
+from chapter_downloader.driver_pool import DriverPool
+from chapter_downloader.network_capture import NETWORK_EVENTS_ENABLED, fetch_page_from_network, get_network_log
+from chapter_downloader.tracing import null_tracer
+
+
+logger = logging.getLogger(__name__)
+
+# execute_async_script 超时抛出的 ScriptTimeoutException 是 WebDriverException 而不是 TimeoutException，
+# 同样只表示页面慢，不表示浏览器已损坏
+_TIMEOUT_EXCEPTIONS = (TimeoutException, ScriptTimeoutException)
+
+def _translate_errors(method):
+    """把 Selenium 的异常转换为后端无关的 SessionTimeout / SessionError。"""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except _TIMEOUT_EXCEPTIONS as e:
+            raise SessionTimeout(e.msg or "等待超时") from e
+        except WebDriverException as e:
+            raise SessionError(str(e)) from e
+    return wrapper
+
+class SeleniumSession(CaptureSession):
+    """基于 WebDriver 的捕获会话，每个会话独占一个浏览器。"""
+    def __init__(self, driver, timeout=IMAGE_WAIT_TIMEOUT):
+        self.driver = driver
+        self.wait = WebDriverWait(driver, timeout)
+        driver.set_script_timeout(timeout)
+
+    @_translate_errors
+    def navigate(self, url, image_id):
+        self.driver.get(url)
+        self.wait.until(EC.presence_of_element_located((By.ID, image_id)))
+
+    @_translate_errors
+    def reload(self, image_id):
+        self.driver.refresh()
+        self.wait.until(EC.presence_of_element_located((By.ID, image_id)))
+
+    @_translate_errors
+    def read_page_state(self):
+        state = self.driver.execute_script(READ_PAGE_STATE_JS) or {}
+        return state.get('current'), state.get('total')
+
+    @_translate_errors
+    def jump_to_page(self, image_id, page_number):
+        self.driver.execute_script(ARM_IMAGE_CHANGE_JS, image_id)
+        method = self.driver.execute_script(GO_TO_PAGE_JS, page_number)
+        self.driver.execute_async_script(WAIT_IMAGE_CHANGE_JS)
+        self.wait.until(EC.visibility_of_element_located((By.ID, image_id)))
+        return method
+
+    def click_next_page(self, image_id, tracer=null_tracer):
+        driver = self.driver
+        next_page_button = None
+        try:
+            with tracer.span("next_click"):
+                next_page_buttons = driver.find_elements(By.XPATH, NEXT_PAGE_BUTTONS_XPATH)
+                for btn in next_page_buttons:
+                    onclick_value = btn.get_attribute("onclick")
+                    is_next_chapter_button = False
+                    if onclick_value and "nextC" in onclick_value:
+                        is_next_chapter_button = True
+                    if "下一章" not in btn.text and not is_next_chapter_button:
+                        next_page_button = btn
+                        break
+
+                if not next_page_button:
+                    logger.info("未找到“下一页”按钮（不是 'a' 标签或不符合条件）。假定已到章节末尾。")
+                    return False
+
+                logger.info("正在将“下一页”按钮滚动到视图中。")
+                driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'center'});", next_page_button)
+
+                # 点击前布置观察器，避免在点击和开始等待之间错过图片切换
+                driver.execute_script(ARM_IMAGE_CHANGE_JS, image_id)
+
+                if not next_page_button.is_displayed():
+                    logger.warning("“下一页”按钮找到但在滚动后未显示。尝试使用 JavaScript 点击作为后备。")
+                    driver.execute_script("arguments[0].click();", next_page_button)
+                else:
+                    logger.info("“下一页”按钮已显示。等待其变为可点击状态并尝试点击。")
+                    try:
+                        WebDriverWait(driver, 10).until(EC.element_to_be_clickable(next_page_button))
+                        next_page_button.click()
+                    except ElementClickInterceptedException:
+                        logger.warning("点击“下一页”按钮时发生 ElementClickInterceptedException，尝试使用 JavaScript 点击。")
+                        driver.execute_script("arguments[0].click();", next_page_button)
+                    except TimeoutException:
+                        logger.warning("等待“下一页”按钮变为可点击状态超时，尝试使用 JavaScript 点击。")
+                        driver.execute_script("arguments[0].click();", next_page_button)
+
+            with tracer.span("next_wait"):
+                logger.info("等待页面导航（图片元素被替换或 src 改变）...")
+                driver.execute_async_script(WAIT_IMAGE_CHANGE_JS)
+
+                logger.info(f"等待新图片 '{image_id}' 在导航后可见...")
+                self.wait.until(EC.visibility_of_element_located((By.ID, image_id)))
+
+            logger.info("成功导航到下一页。")
+            return True
+
+        except NoSuchElementException as nse:
+            logger.error(f"在下一页点击/等待逻辑中发生 NoSuchElementException: {nse}", exc_info=True)
+            return False
+        except _TIMEOUT_EXCEPTIONS:
+            logger.warning("等待页面导航超时（陈旧状态或新图片可见性）。可能是章节末尾或加载缓慢。")
+            try:
+                if driver.find_element(By.XPATH, DISABLED_NEXT_PAGE_XPATH).is_displayed():
+                    logger.info("通过查找已禁用的“下一页”span确认已到章节末尾。")
+            except NoSuchElementException:
+                logger.info("超时后未找到已禁用的“下一页”span。")
+            return False
+        except Exception as e:
+            logger.error(f"点击“下一页”或等待导航时发生意外错误: {e}", exc_info=True)
+            return False
+
+    @_translate_errors
+    def is_last_page(self):
+        try:
+            return self.driver.find_element(By.XPATH, DISABLED_NEXT_PAGE_XPATH).is_displayed()
+        except NoSuchElementException:
+            return False
+
+    @_translate_errors
+    def probe_page(self, image_id, page_number, isolate=False):
+        try:
+            return self.driver.execute_async_script(PROBE_PAGE_JS, image_id, isolate)
+        except _TIMEOUT_EXCEPTIONS:
+            return None
+
+    @_translate_errors
+    def capture_clip(self, rect, vertical_offset_compensation, image_format, quality, beyond_viewport=True):
+        # 通过 CDP 的 Page.captureScreenshot 只截取矩形区域，无需调整窗口大小
+        if not rect or rect['width'] <= 0 or rect['height'] <= 0:
+            return None
+        params = {
+            'format': image_format,
+            'clip': {
+                'x': rect['x'],
+                'y': max(0, rect['y'] - vertical_offset_compensation),
+                'width': rect['width'],
+                'height': rect['height'],
+                'scale': 1
+            },
+            'captureBeyondViewport': beyond_viewport,
+            'fromSurface': True
+        }
+        if quality is not None:
+            params['quality'] = quality
+        result = self.driver.execute_cdp_cmd('Page.captureScreenshot', params)
+        return base64.b64decode(result['data'])
+
+    @_translate_errors
+    def scroll_to(self, x, y):
+        self.driver.execute_script("window.scrollTo(arguments[0], arguments[1]);", x, y)
+
+    @_translate_errors
+    def set_window_size(self, width, height):
+        self.driver.set_window_size(width, height)
+
+    @_translate_errors
+    def screenshot_window(self):
+        return self.driver.get_screenshot_as_png()
+
+    def fetch_network_page(self, probe, page_number):
+        return fetch_page_from_network(self.driver, probe, page_number)
+
+    @_translate_errors
+    def get_cookies(self):
+        # HttpOnly Cookie 读不到 document.cookie，只能通过 WebDriver 取得
+        return {c['name']: c['value'] for c in self.driver.get_cookies()}
+
+    def add_network_listener(self, listener):
+        get_network_log(self.driver).add_listener(listener)
+
+    def remove_network_listener(self, listener):
+        get_network_log(self.driver).remove_listener(listener)
+
+    @_translate_errors
+    def flush_network_events(self):
+        if NETWORK_EVENTS_ENABLED:
+            get_network_log(self.driver).poll()
+
+class SeleniumBackend(CaptureBackend):
+    """
+    Selenium 后端：会话来自 DriverPool，每个会话对应一个独立的无头浏览器。
+    传入已有的 driver_pool 时由调用方负责关闭它。
+    """
+    name = "selenium"
+
+    def __init__(self, driver_pool=None, pool_size=None):
+        self._owns_pool = driver_pool is None
+        if driver_pool is None:
+            driver_pool = DriverPool() if pool_size is None else DriverPool(size=pool_size)
+        self.driver_pool = driver_pool
+
+    def open_session(self, urls_to_block, blocking_profile=None, wait=True):
+        # 拦截规则已经编译进 urls_to_block，Network.setBlockedURLs 只能按 URL 匹配
+        try:
+            driver = self.driver_pool.acquire(urls_to_block, wait=wait)
+        except WebDriverException as e:
+            raise SessionError(str(e)) from e
+        if driver is None:
+            return None
+        try:
+            return SeleniumSession(driver)
+        except WebDriverException as e:
+            self.driver_pool.release(driver, healthy=False)
+            raise SessionError(str(e)) from e
+
+    def release_session(self, session, pages_captured=0, healthy=True):
+        self.driver_pool.release(session.driver, pages_captured=pages_captured, healthy=healthy)
+
+    def close(self):
+        if self._owns_pool:
+            self.driver_pool.close()
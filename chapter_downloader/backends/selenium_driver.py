@@ -0,0 +1,73 @@
+import logging
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service as ChromeService
+from selenium.webdriver.edge.service import Service as EdgeService
+from selenium.common.exceptions import WebDriverException
+
+from chapter_downloader.config import (
+    DRIVER_WINDOW_WIDTH, DRIVER_WINDOW_HEIGHT, NETWORK_MAX_TOTAL_BUFFER, NETWORK_MAX_RESOURCE_BUFFER
+)
+from chapter_downloader.browser_setup import default_browser_cache
+from chapter_downloader.network_capture import NETWORK_EVENTS_ENABLED
+
+
+logger = logging.getLogger(__name__)
+
+def _build_driver(selected_browser, setup, profile=None):
+    if selected_browser == 'chrome':
+        options = webdriver.ChromeOptions()
+        service = ChromeService(setup['driver'])
+        driver_class = webdriver.Chrome
+    else:  # edge
+        options = webdriver.ChromeOptions()  # Edge 使用相同的选项
+        service = EdgeService(setup['driver'])
+        driver_class = webdriver.ChromiumEdge  # 或者 webdriver.Edge
+
+    if setup.get('binary'):
+        options.binary_location = setup['binary']
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--force-device-scale-factor=1")
+    options.add_argument(f"--window-size={DRIVER_WINDOW_WIDTH},{DRIVER_WINDOW_HEIGHT}")
+    if profile is not None:
+        options.add_argument(f"--user-data-dir={profile.path}")
+        for argument in profile.launch_arguments():
+            options.add_argument(argument)
+    if NETWORK_EVENTS_ENABLED:
+        # "network" 捕获方式和拦截统计通过性能日志读取 CDP Network 事件
+        logging_prefs_capability = 'ms:loggingPrefs' if selected_browser == 'edge' else 'goog:loggingPrefs'
+        options.set_capability(logging_prefs_capability, {'performance': 'ALL'})
+        options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+    return driver_class(service=service, options=options)
+
+def create_driver(selected_browser, profile=None):
+    """
+    根据浏览器类型启动一个无头浏览器
+    浏览器和驱动路径来自 browser_setup 的缓存，只在缓存失效时才重新解析
+    传入 profile（browser_profile.BrowserProfile）时使用该持久配置目录
+    返回: WebDriver 实例
+    """
+    logger.info(f"正在初始化{selected_browser.capitalize()}驱动程序...")
+    setup = default_browser_cache.get_setup(selected_browser)
+    try:
+        return _build_driver(selected_browser, setup, profile)
+    except WebDriverException as e:
+        # 缓存的驱动可能与升级后的浏览器不匹配，丢弃缓存重新解析一次
+        logger.warning(f"使用缓存的驱动程序启动浏览器失败，将重新解析驱动: {e}")
+        default_browser_cache.invalidate(selected_browser)
+        if profile is not None:
+            # 配置目录损坏同样会使浏览器无法启动
+            profile.wipe("浏览器无法启动")
+        return _build_driver(selected_browser, default_browser_cache.get_setup(selected_browser), profile)
+
+def apply_blocked_urls(driver, urls_to_block):
+    """通过 CDP 设置（或清空）需要拦截的URL列表。"""
+    # 加大响应体缓冲区，使 "network" 捕获方式在图片加载后仍能读到响应体
+    driver.execute_cdp_cmd('Network.enable', {
+        'maxTotalBufferSize': NETWORK_MAX_TOTAL_BUFFER,
+        'maxResourceBufferSize': NETWORK_MAX_RESOURCE_BUFFER
+    })
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(urls_to_block or [])})
@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from chapter_downloader.config import BROWSER_PROFILE_DIR, BROWSER_DISK_CACHE_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+# 浏览器异常退出后留下的单实例锁；持有我们自己的锁时可以安全删除
+_CHROMIUM_SINGLETON_FILES = ("SingletonLock", "SingletonSocket", "SingletonCookie", "lockfile")
+# 同一浏览器最多同时使用的配置目录数量
+_MAX_PROFILE_SLOTS = 64
+
+def _try_lock(handle):
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            # msvcrt 从当前位置开始加锁，'a+' 模式打开时位置在文件末尾
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+def _unlock(handle):
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+    except OSError:
+        pass
+
+class BrowserProfile:
+    """
+    一个持久化的浏览器用户数据目录（Cookie、localStorage 和磁盘缓存跨章节、跨运行保留）。
+    使用期间持有 <目录>.lock 上的系统文件锁，进程退出（包括崩溃）时锁自动释放，
+    所以同一目录不会被两个浏览器同时使用，每个工作进程/浏览器会拿到不同的目录。
+    """
+    def __init__(self, path, lock_handle):
+        self.path = path
+        self._lock_handle = lock_handle
+
+    def launch_arguments(self):
+        """启动 Chromium 时需要附加的命令行参数（不含 --user-data-dir）。"""
+        return [f"--disk-cache-size={BROWSER_DISK_CACHE_SIZE}"]
+
+    def prepare(self):
+        """清理异常退出留下的单实例锁；配置文件已损坏时清空整个目录。"""
+        os.makedirs(self.path, exist_ok=True)
+        for name in _CHROMIUM_SINGLETON_FILES:
+            stale = os.path.join(self.path, name)
+            if os.path.lexists(stale):
+                try:
+                    os.remove(stale)
+                except OSError as e:
+                    logger.warning(f"无法删除浏览器配置目录中的残留锁 '{stale}': {e}")
+        local_state = os.path.join(self.path, "Local State")
+        if os.path.exists(local_state):
+            try:
+                with open(local_state, 'r', encoding='utf-8') as f:
+                    json.load(f)
+            except (OSError, ValueError) as e:
+                self.wipe(f"Local State 无法读取: {e}")
+
+    def wipe(self, reason):
+        """删除并重建配置目录（只丢失缓存和登录状态）。"""
+        logger.warning(f"浏览器配置目录 '{self.path}' 不可用（{reason}），已清空重建。")
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+
+    def release(self):
+        if self._lock_handle is not None:
+            _unlock(self._lock_handle)
+            self._lock_handle.close()
+            self._lock_handle = None
+
+def acquire_profile(browser, root=BROWSER_PROFILE_DIR):
+    """为 browser 取得一个当前没有被其他浏览器使用的持久配置目录。"""
+    os.makedirs(root, exist_ok=True)
+    for slot in range(_MAX_PROFILE_SLOTS):
+        path = os.path.join(root, f"{browser}-{slot}")
+        handle = open(f"{path}.lock", 'a+')
+        if not _try_lock(handle):
+            handle.close()
+            continue
+        profile = BrowserProfile(path, handle)
+        try:
+            profile.prepare()
+        except Exception:
+            profile.release()
+            raise
+        logger.info(f"使用持久浏览器配置目录: {path}")
+        return profile
+    raise RuntimeError(f"'{root}' 中的 {_MAX_PROFILE_SLOTS} 个浏览器配置目录都在使用中。")
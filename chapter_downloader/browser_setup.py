@@ -0,0 +1,308 @@
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+
+from webdriver_manager.chrome import ChromeDriverManager
+from webdriver_manager.microsoft import EdgeChromiumDriverManager
+
+from chapter_downloader.config import BROWSER_CHOICE, BROWSER_BINARY_PATH, BROWSER_DRIVER_PATH, BROWSER_CACHE_FILE
+
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_BROWSERS = ('chrome', 'edge')
+
+# 各平台常见的浏览器安装位置，按优先级排列
+_BROWSER_PATHS = {
+    'win32': {
+        'chrome': [
+            r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+            r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+            os.path.expanduser(r"~\AppData\Local\Google\Chrome\Application\chrome.exe")
+        ],
+        'edge': [
+            r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe",
+            r"C:\Program Files\Microsoft\Edge\Application\msedge.exe",
+            os.path.expanduser(r"~\AppData\Local\Microsoft\Edge\Application\msedge.exe")
+        ]
+    },
+    'darwin': {
+        'chrome': [
+            "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+            os.path.expanduser("~/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"),
+            "/Applications/Chromium.app/Contents/MacOS/Chromium"
+        ],
+        'edge': [
+            "/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge",
+            os.path.expanduser("~/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge")
+        ]
+    },
+    'linux': {
+        'chrome': [
+            "/opt/google/chrome/chrome",
+            "/usr/lib/chromium/chromium",
+            "/snap/bin/chromium"
+        ],
+        'edge': [
+            "/opt/microsoft/msedge/msedge"
+        ]
+    }
+}
+
+# 在 PATH 中查找的可执行文件名
+_BROWSER_COMMANDS = {
+    'chrome': ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome"],
+    'edge': ["microsoft-edge", "microsoft-edge-stable", "msedge"]
+}
+_DRIVER_COMMANDS = {
+    'chrome': ["chromedriver"],
+    'edge': ["msedgedriver"]
+}
+
+def _platform_key():
+    if sys.platform.startswith('win'):
+        return 'win32'
+    if sys.platform == 'darwin':
+        return 'darwin'
+    return 'linux'
+
+def find_browser_binary(browser):
+    """按平台的常见安装位置和 PATH 查找浏览器可执行文件，找不到返回 None。"""
+    for path in _BROWSER_PATHS[_platform_key()].get(browser, []):
+        if os.path.exists(path):
+            return path
+    for command in _BROWSER_COMMANDS[browser]:
+        path = shutil.which(command)
+        if path:
+            return path
+    return None
+
+def detect_browsers():
+    """
+    检测系统中可用的浏览器
+    返回: {'chrome': path_or_none, 'edge': path_or_none}
+    """
+    return {browser: find_browser_binary(browser) for browser in SUPPORTED_BROWSERS}
+
+_warned_missing_binary = False
+
+def configured_browser_binary():
+    """
+    配置中指定的浏览器路径（BROWSER_BINARY_PATH）；未配置或文件不存在时返回 None，
+    不存在时只警告一次并改为自动查找浏览器。
+    """
+    global _warned_missing_binary
+    if not BROWSER_BINARY_PATH:
+        return None
+    if os.path.exists(BROWSER_BINARY_PATH):
+        return BROWSER_BINARY_PATH
+    if not _warned_missing_binary:
+        _warned_missing_binary = True
+        logger.warning(f"BROWSER_BINARY_PATH 指定的浏览器不存在: {BROWSER_BINARY_PATH}，忽略该配置并自动查找浏览器。")
+    return None
+
+def _browser_for_binary(binary_path):
+    """按可执行文件名判断浏览器类型（msedge、microsoft-edge 为 Edge，其余按 Chrome/Chromium 处理）。"""
+    return 'edge' if 'edge' in os.path.basename(binary_path).lower() else 'chrome'
+
+def _is_chromium(binary_path):
+    return bool(binary_path) and 'chromium' in os.path.basename(binary_path).lower()
+
+def _install_driver(browser, binary_path):
+    """通过 webdriver-manager 下载（或从其缓存取得）与浏览器匹配的驱动。"""
+    if browser == 'edge':
+        return EdgeChromiumDriverManager().install()
+    if _is_chromium(binary_path):
+        try:
+            from webdriver_manager.core.os_manager import ChromeType
+        except ImportError: # webdriver-manager 3.x
+            from webdriver_manager.core.utils import ChromeType
+        return ChromeDriverManager(chrome_type=ChromeType.CHROMIUM).install()
+    return ChromeDriverManager().install()
+
+def _resolve_setup(browser):
+    binary_path = configured_browser_binary() or find_browser_binary(browser)
+    driver_path = BROWSER_DRIVER_PATH
+    if not driver_path:
+        for command in _DRIVER_COMMANDS[browser]:
+            driver_path = shutil.which(command)
+            if driver_path:
+                logger.info(f"在 PATH 中找到驱动程序: {driver_path}")
+                break
+    if not driver_path:
+        logger.info(f"正在通过 webdriver-manager 获取{browser.capitalize()}驱动程序...")
+        driver_path = _install_driver(browser, binary_path)
+    return {
+        'browser': browser,
+        'binary': binary_path,
+        'binary_mtime': os.path.getmtime(binary_path) if binary_path else None,
+        'driver': driver_path
+    }
+
+def _is_setup_valid(setup, browser):
+    """缓存的路径仍然存在，且浏览器没有被升级（升级后驱动版本可能不再匹配）。"""
+    if not setup or setup.get('browser') != browser:
+        return False
+    configured_binary = configured_browser_binary()
+    if configured_binary and setup.get('binary') != configured_binary:
+        return False
+    if BROWSER_DRIVER_PATH and setup.get('driver') != BROWSER_DRIVER_PATH:
+        return False
+    driver_path = setup.get('driver')
+    if not driver_path or not os.path.exists(driver_path):
+        return False
+    binary_path = setup.get('binary')
+    if binary_path:
+        if not os.path.exists(binary_path) or os.path.getmtime(binary_path) != setup.get('binary_mtime'):
+            return False
+    return True
+
+class BrowserSetupCache:
+    """
+    浏览器选择与可执行文件/驱动路径的缓存。
+    每个进程只解析一次，结果写入 BROWSER_CACHE_FILE，后续运行（以及工作进程）直接复用，
+    不再每次启动浏览器都调用 webdriver-manager。
+    """
+    def __init__(self, path=BROWSER_CACHE_FILE):
+        self.path = path
+        self._setups = {}
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"读取浏览器缓存 '{self.path}' 失败，将重新检测: {e}")
+            return {}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._state, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"写入浏览器缓存 '{self.path}' 失败: {e}")
+
+    def selected_browser(self):
+        """上次选择并记录下来的浏览器，没有则返回 None。"""
+        browser = self._state.get('selected')
+        if browser in SUPPORTED_BROWSERS:
+            return browser
+        return None
+
+    def remember_selection(self, browser):
+        with self._lock:
+            if self._state.get('selected') != browser:
+                self._state['selected'] = browser
+                self._save()
+
+    def get_setup(self, browser):
+        """返回 {'browser', 'binary', 'driver', ...}，优先使用进程内和磁盘上的缓存。"""
+        with self._lock:
+            setup = self._setups.get(browser)
+            if setup is not None:
+                return setup
+            setup = self._state.get('setups', {}).get(browser)
+            if _is_setup_valid(setup, browser):
+                logger.info(f"使用缓存的{browser.capitalize()}驱动程序: {setup['driver']}")
+            else:
+                setup = _resolve_setup(browser)
+                self._state.setdefault('setups', {})[browser] = setup
+                self._save()
+            self._setups[browser] = setup
+            return setup
+
+    def invalidate(self, browser):
+        """驱动无法启动时丢弃缓存，下次重新解析。"""
+        with self._lock:
+            self._setups.pop(browser, None)
+            if self._state.get('setups', {}).pop(browser, None) is not None:
+                self._save()
+
+default_browser_cache = BrowserSetupCache()
+
+# 全局变量存储用户选择的浏览器，避免重复询问
+_selected_browser = None
+
+def set_selected_browser(browser):
+    """直接指定要使用的浏览器（例如由主进程传给工作进程），跳过检测和询问。"""
+    global _selected_browser
+    _selected_browser = browser
+
+def select_browser():
+    """
+    检测并选择要使用的浏览器
+    记住用户的选择，避免重复询问
+    返回: ('chrome' 或 'edge', driver_manager)
+    """
+    global _selected_browser
+    from metadata.utils import get_user_input
+
+    # 如果已经选择过，直接返回
+    if _selected_browser is not None:
+        return _selected_browser, None
+
+    # 配置中指定了浏览器时不检测也不询问
+    if BROWSER_CHOICE:
+        if BROWSER_CHOICE not in SUPPORTED_BROWSERS:
+            logger.error(f"BROWSER_CHOICE 配置无效: {BROWSER_CHOICE}（可选: {', '.join(SUPPORTED_BROWSERS)}）")
+            return None, None
+        _selected_browser = BROWSER_CHOICE
+        return _selected_browser, None
+
+    # 配置中指定了浏览器路径时，该浏览器就是要使用的浏览器（即使不在常见安装位置或 PATH 中）
+    configured_binary = configured_browser_binary()
+    if configured_binary:
+        _selected_browser = _browser_for_binary(configured_binary)
+        logger.info(f"使用 BROWSER_BINARY_PATH 指定的浏览器: {_selected_browser.capitalize()} ({configured_binary})")
+        return _selected_browser, None
+
+    browsers = detect_browsers()
+    available_browsers = {k: v for k, v in browsers.items() if v is not None}
+
+    # 之前运行时已经选择过且该浏览器仍然可用
+    cached_browser = default_browser_cache.selected_browser()
+    if cached_browser in available_browsers:
+        logger.info(f"使用上次选择的浏览器: {cached_browser.capitalize()}")
+        _selected_browser = cached_browser
+        return cached_browser, None
+
+    if not available_browsers:
+        logger.error("未检测到 Chrome 或 Edge 浏览器。请安装其中一个浏览器后重试。")
+        logger.info("下载链接：")
+        logger.info("- Chrome: https://www.google.com/chrome/")
+        logger.info("- Edge: https://www.microsoft.com/en-us/edge")
+        return None, None
+
+    if len(available_browsers) == 1:
+        browser = list(available_browsers.keys())[0]
+        logger.info(f"检测到唯一可用的浏览器: {browser.capitalize()}")
+        _selected_browser = browser
+        return browser, None
+
+    # 两个浏览器都可用，让用户选择（只在第一次运行时）
+    logger.info("检测到多个可用浏览器:")
+    for i, (browser, path) in enumerate(available_browsers.items(), 1):
+        logger.info(f"{i}. {browser.capitalize()} ({path})")
+
+    while True:
+        choice = get_user_input("请选择要使用的浏览器 (输入对应的编号 1 或 2): ", valid_inputs=['1', '2'])
+        try:
+            choice_idx = int(choice) - 1
+            if 0 <= choice_idx < len(available_browsers):
+                selected_browser = list(available_browsers.keys())[choice_idx]
+                logger.info(f"已选择: {selected_browser.capitalize()}")
+                _selected_browser = selected_browser  # 记住选择
+                default_browser_cache.remember_selection(selected_browser)
+                return selected_browser, None
+        except ValueError:
+            continue
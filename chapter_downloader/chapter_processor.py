@@ -1,9 +1,12 @@
+import io
 import json
 import os
-import time
 import logging
 import re
-import glob # For finding image files
+import multiprocessing
+import multiprocessing.util
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from PIL import Image # For PDF creation
 
 # Adjust import for the new structure
@@ -11,7 +14,18 @@ from PIL import Image # For PDF creation
 # For development, if running this file directly, you might need to adjust paths:
 # import sys
 # sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Add parent dir (comic_auto_downloader)
-from chapter_downloader.screenshot_engine import capture_chapter_images, target_image_id, blocked_urls, vertical_offset
+from chapter_downloader.screenshot_engine import (
+    capture_chapter_images, target_image_id, blocked_urls, vertical_offset
+)
+from chapter_downloader.http_engine import capture_chapter_images_http
+from chapter_downloader.manhuagui_reader import is_manhuagui_url
+from chapter_downloader.backends import create_capture_backend, backend_tab_count
+from chapter_downloader.browser_setup import default_browser_cache, select_browser, set_selected_browser
+from chapter_downloader.page_store import list_page_images
+from chapter_downloader.page_encoding import pdf_page_image
+from chapter_downloader.pdf_writer import StreamingPdfWriter, passthrough_pdf_image
+from chapter_downloader.pacing import default_pacing
+from chapter_downloader.config import CHAPTER_WORKER_PROCESSES, HTTP_ENGINE_ENABLED, PDF_PASSTHROUGH, PDF_WORKER_PROCESSES
 
 
 logger = logging.getLogger(__name__)
@@ -55,77 +69,153 @@ def get_chapter_sort_key(title):
 
 def create_pdf_from_chapter_images(chapter_images_dir, output_pdf_path):
     """
-    Creates a PDF file from all .png images in a given directory.
-    Images are sorted numerically by their filenames (e.g., 1.png, 2.png, ...).
+    Creates a PDF file from all page images (1.png, 2.jpg, 3.webp, ...) in a given directory.
+    Images are sorted numerically by their filenames. Pages are streamed into the PDF one at a
+    time, so peak memory stays at about one page regardless of the chapter length.
     """
     logger.info(f"开始为目录 '{chapter_images_dir}' 创建 PDF 到 '{output_pdf_path}'")
     try:
-        image_paths = sorted(
-            glob.glob(os.path.join(chapter_images_dir, '*.png')),
-            key=lambda x: int(os.path.splitext(os.path.basename(x))[0]) # Sort by page number
-        )
+        image_paths = list_page_images(chapter_images_dir) # Sorted by page number
 
         if not image_paths:
-            logger.warning(f"在目录 '{chapter_images_dir}' 中未找到 PNG 图片，无法创建 PDF。")
+            logger.warning(f"在目录 '{chapter_images_dir}' 中未找到页面图片，无法创建 PDF。")
             return False
 
-        images_pil = []
-        first_image = None
-        for img_path in image_paths:
-            try:
-                img = Image.open(img_path)
-                # Convert to RGB to avoid issues with different image modes (e.g., RGBA, P)
-                # and to ensure compatibility for saving as PDF.
-                if img.mode == 'RGBA' or img.mode == 'P':
-                    img = img.convert('RGB')
-                elif img.mode != 'RGB': # Handle other modes like L (grayscale) etc.
-                    logger.info(f"图片 '{img_path}' 模式为 {img.mode}, 转换为 RGB。")
-                    img = img.convert('RGB')
-
-                if first_image is None:
-                    first_image = img
-                else:
-                    images_pil.append(img)
-            except Exception as e:
-                logger.error(f"打开或转换图片 '{img_path}' 失败: {e}")
-                return False # Fail PDF creation if one image fails
-
-        if first_image is None: # Should be caught by the earlier check if image_paths is empty
-            logger.warning(f"没有可用于创建 PDF 的有效图片。")
-            return False
+        passthrough_pages = 0
+        with StreamingPdfWriter(output_pdf_path) as writer:
+            for img_path in image_paths:
+                try:
+                    with open(img_path, 'rb') as f:
+                        data = f.read()
+                    # JPEG/PNG pages are embedded as-is (no decode, no re-compression) when possible
+                    embedded = passthrough_pdf_image(data) if PDF_PASSTHROUGH else None
+                    if embedded is not None:
+                        writer.add_image_page(*embedded)
+                        passthrough_pages += 1
+                        continue
+                    with Image.open(io.BytesIO(data)) as img:
+                        # Grayscale pages are embedded as L (or 1-bit line art); everything else
+                        # (RGBA, P, CMYK, ...) is converted to RGB for compatibility with the PDF writer.
+                        writer.add_page(pdf_page_image(img))
+                except Exception as e:
+                    logger.error(f"打开或转换图片 '{img_path}' 失败: {e}")
+                    writer.abort()
+                    return False # Fail PDF creation if one image fails
 
-        first_image.save(
-            output_pdf_path,
-            save_all=True,
-            append_images=images_pil, # Pass the list of subsequent images
-            resolution=100.0 # Optional: set resolution
-        )
-        logger.info(f"PDF 已成功创建并保存到: {output_pdf_path}")
+        logger.info(f"PDF 已成功创建并保存到: {output_pdf_path} (共 {len(image_paths)} 页，其中 {passthrough_pages} 页直接嵌入)")
         return True
     except Exception as e:
         logger.error(f"创建 PDF '{output_pdf_path}' 失败: {e}", exc_info=True)
         return False
 
-def download_chapters_from_json_file(json_file_path):
+def capture_chapter(chapter_type, chapter_info, base_manga_dir, backend=None, pacing=None):
     """
-    Processes the JSON file and downloads manga chapters.
-    Returns True if all operations completed (even if some chapters failed individual downloads),
-    False if there was a critical error like file not found or JSON parsing error.
+    Downloads the pages of one chapter (with retries) without building its PDF.
+    Returns (chapter_images_dir, pdf_output_path) on success, None if the capture failed.
     """
-    if not os.path.exists(json_file_path):
-        logger.error(f"JSON 文件未找到: {json_file_path}")
+    pacing = pacing or default_pacing
+    title = chapter_info.get("title")
+    url = chapter_info.get("url")
+
+    sanitized_title_for_dir = sanitize_filename_for_path(title)
+    sanitized_chapter_type_for_dir = sanitize_filename_for_path(chapter_type)
+    
+    chapter_output_full_dir = os.path.join(base_manga_dir, sanitized_chapter_type_for_dir, sanitized_title_for_dir)
+    os.makedirs(chapter_output_full_dir, exist_ok=True)
+    logger.info(f"创建/确认目录: {chapter_output_full_dir}")
+
+    logger.info(f"开始下载章节: '{title}' (URL: {url})")
+    
+    download_successful_for_chapter = False
+    attempts = 0
+    max_attempts = 3
+
+    if HTTP_ENGINE_ENABLED and is_manhuagui_url(url):
+        try:
+            download_successful_for_chapter = capture_chapter_images_http(url, chapter_output_full_dir, pacing)
+        except Exception as e:
+            logger.error(f"免浏览器下载章节 '{title}' 时发生错误: {e}", exc_info=True)
+        if download_successful_for_chapter:
+            logger.info(f"章节 '{title}' 已通过免浏览器方式下载成功。")
+        else:
+            logger.warning(f"章节 '{title}' 无法通过免浏览器方式完成，改用浏览器捕获（已保存的页面会被跳过）。")
+
+    while attempts < max_attempts and not download_successful_for_chapter:
+        attempts += 1
+        logger.info(f"尝试第 {attempts}/{max_attempts} 次下载章节 '{title}'")
+        try:
+            capture_successful_flag = capture_chapter_images(
+                start_url=url,
+                image_id=target_image_id, # These should be imported from screenshot_engine
+                urls_to_block=blocked_urls,
+                vertical_offset_compensation=vertical_offset,
+                base_output_dir=chapter_output_full_dir,
+                backend=backend,
+                pacing=pacing
+            )
+            if capture_successful_flag: # Assuming capture_chapter_images returns True on success
+                download_successful_for_chapter = True
+                logger.info(f"章节 '{title}' 下载成功。")
+            else:
+                logger.warning(f"章节 '{title}' 第 {attempts} 次下载失败 (截图引擎报告失败)。")
+        except Exception as e:
+            logger.error(f"下载章节 '{title}' (尝试 {attempts}) 时发生错误: {e}", exc_info=True)
+        
+        if not download_successful_for_chapter and attempts < max_attempts:
+            pacing.before_retry(attempts)
+
+    if not download_successful_for_chapter:
+        logger.error(f"章节 '{title}' 下载失败 {max_attempts} 次，跳过此章节。")
+        return None
+
+    # PDF will be saved in the chapter type directory, e.g., downloaded_comics/MangaName/ChapterType/ChapterTitle.pdf
+    pdf_filename = f"{sanitized_title_for_dir}.pdf"
+    # chapter_output_full_dir is like downloaded_comics/MangaName/ChapterType/ChapterTitle_img_folder
+    # So, os.path.dirname(chapter_output_full_dir) gives downloaded_comics/MangaName/ChapterType/
+    pdf_output_path = os.path.join(os.path.dirname(chapter_output_full_dir), pdf_filename)
+    return chapter_output_full_dir, pdf_output_path
+
+def build_chapter_pdf(title, chapter_images_dir, pdf_output_path):
+    """
+    Builds the PDF of a captured chapter. Returns True if the PDF was created.
+    Also runs in the background PDF worker processes, so it must stay a module-level function.
+    """
+    logger.info(f"尝试为章节 '{title}' 从 '{chapter_images_dir}' 创建 PDF 文件到 '{pdf_output_path}'...")
+    if not create_pdf_from_chapter_images(chapter_images_dir, pdf_output_path):
+        logger.error(f"章节 '{title}' 的 PDF 创建失败。章节将不会被标记为已完成。")
         return False
 
+    logger.info(f"章节 '{title}' 的 PDF 创建成功。")
+    return True
+
+def process_chapter(chapter_type, chapter_info, base_manga_dir, backend=None, pacing=None):
+    """
+    Downloads one chapter (with retries) and builds its PDF synchronously.
+    Returns True only if both the capture and the PDF succeeded; the caller is responsible
+    for marking the chapter as completed in the JSON file.
+    """
+    captured = capture_chapter(chapter_type, chapter_info, base_manga_dir, backend, pacing)
+    if captured is None:
+        return False
+    return build_chapter_pdf(chapter_info.get("title"), *captured)
+
+def _save_chapters_json(json_file_path, data):
+    """Writes the chapter list back to disk. Returns False if the write failed."""
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        temp_path = json_file_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f_update:
+            json.dump(data, f_update, ensure_ascii=False, indent=4)
+        os.replace(temp_path, json_file_path)
+        return True
     except Exception as e:
-        logger.error(f"读取或解析JSON文件失败: {json_file_path} - {e}")
+        logger.error(f"更新JSON文件失败: {e}")
         return False
 
-    base_manga_dir = os.path.dirname(json_file_path)
-    logger.info(f"漫画根目录: {base_manga_dir}")
-
+def _collect_pending_chapters(data):
+    """
+    Returns [(chapter_type, chapter_info), ...] for every chapter that still needs downloading,
+    in processing order. Chapter lists in `data` are sorted in place.
+    """
     # Define processing order for chapter types if they exist as keys in the JSON
     # User-defined order: "番外篇", "单行本", "单话"
     preferred_order = ["番外篇", "单行本", "单话"]
@@ -145,12 +235,7 @@ def download_chapters_from_json_file(json_file_path):
     # Add any remaining types (those not in preferred_order but present in JSON)
     ordered_chapter_types_to_process.extend(available_types)
 
-    if not ordered_chapter_types_to_process:
-        logger.info("JSON文件中没有找到可处理的章节类型。")
-        return True # No chapters to process is not an error in itself
-
-    all_chapters_processed_successfully = True # Track overall success
-
+    pending = []
     for chapter_type in ordered_chapter_types_to_process:
         if not isinstance(data.get(chapter_type), list):
             logger.warning(f"在JSON文件中，'{chapter_type}' 的值不是列表，跳过。")
@@ -163,91 +248,309 @@ def download_chapters_from_json_file(json_file_path):
         
         # Sort chapters using the new sort key function
         chapters_to_process.sort(key=lambda x: get_chapter_sort_key(x.get("title", "")))
-        logger.info(f"开始处理类型 '{chapter_type}'，共 {len(chapters_to_process)} 章 (已排序)。")
+        logger.info(f"类型 '{chapter_type}' 共 {len(chapters_to_process)} 章 (已排序)。")
 
         for chapter_info in chapters_to_process:
             title = chapter_info.get("title")
             url = chapter_info.get("url")
-            completed = chapter_info.get("completed", False)
 
             if not title or not url:
                 logger.warning(f"章节信息不完整，跳过: {chapter_info}")
                 continue
 
-            if completed:
+            if chapter_info.get("completed", False):
                 logger.info(f"章节 '{title}' 已标记为完成，跳过。")
                 continue
 
-            sanitized_title_for_dir = sanitize_filename_for_path(title)
-            sanitized_chapter_type_for_dir = sanitize_filename_for_path(chapter_type)
-            
-            chapter_output_full_dir = os.path.join(base_manga_dir, sanitized_chapter_type_for_dir, sanitized_title_for_dir)
-            os.makedirs(chapter_output_full_dir, exist_ok=True)
-            logger.info(f"创建/确认目录: {chapter_output_full_dir}")
+            pending.append((chapter_type, chapter_info))
+    return pending
 
-            logger.info(f"开始下载章节: '{title}' (URL: {url})")
-            
-            download_successful_for_chapter = False
-            attempts = 0
-            max_attempts = 3
+def download_chapters_from_json_file(json_file_path, worker_processes=CHAPTER_WORKER_PROCESSES):
+    """
+    Processes the JSON file and downloads manga chapters.
+    With worker_processes > 1, chapters are captured by that many worker processes (each with its
+    own browser) pulling from a shared queue; completion updates are merged by this process only.
+    Otherwise, when the backend supports several tabs per browser (BROWSER_TABS_PER_BROWSER), that many
+    chapters are captured concurrently in tabs of a single browser.
+    In every mode, PDFs are built in background processes (PDF_WORKER_PROCESSES) while the next chapters
+    are captured, and a chapter is marked completed only once both its capture and its PDF succeeded.
+    Returns True if all operations completed (even if some chapters failed individual downloads),
+    False if there was a critical error like file not found or JSON parsing error.
+    """
+    if not os.path.exists(json_file_path):
+        logger.error(f"JSON 文件未找到: {json_file_path}")
+        return False
 
-            while attempts < max_attempts and not download_successful_for_chapter:
-                attempts += 1
-                logger.info(f"尝试第 {attempts}/{max_attempts} 次下载章节 '{title}'")
-                try:
-                    capture_successful_flag = capture_chapter_images(
-                        start_url=url,
-                        image_id=target_image_id, # These should be imported from screenshot_engine
-                        urls_to_block=blocked_urls,
-                        vertical_offset_compensation=vertical_offset,
-                        base_output_dir=chapter_output_full_dir
-                    )
-                    if capture_successful_flag: # Assuming capture_chapter_images returns True on success
-                        download_successful_for_chapter = True
-                        logger.info(f"章节 '{title}' 下载成功。")
-                    else:
-                        logger.warning(f"章节 '{title}' 第 {attempts} 次下载失败 (截图引擎报告失败)。")
-                except Exception as e:
-                    logger.error(f"下载章节 '{title}' (尝试 {attempts}) 时发生错误: {e}", exc_info=True)
-                
-                if not download_successful_for_chapter and attempts < max_attempts:
-                    logger.info(f"等待5秒后重试...")
-                    time.sleep(5)
-
-            if download_successful_for_chapter:
-                # PDF Creation Step
-                # PDF will be saved in the chapter type directory, e.g., downloaded_comics/MangaName/ChapterType/ChapterTitle.pdf
-                pdf_filename = f"{sanitized_title_for_dir}.pdf"
-                # chapter_output_full_dir is like downloaded_comics/MangaName/ChapterType/ChapterTitle_img_folder
-                # So, os.path.dirname(chapter_output_full_dir) gives downloaded_comics/MangaName/ChapterType/
-                pdf_output_path = os.path.join(os.path.dirname(chapter_output_full_dir), pdf_filename)
-
-                logger.info(f"尝试为章节 '{title}' 从 '{chapter_output_full_dir}' 创建 PDF 文件到 '{pdf_output_path}'...")
-                pdf_created_successfully = create_pdf_from_chapter_images(chapter_output_full_dir, pdf_output_path)
-
-                if pdf_created_successfully:
-                    logger.info(f"章节 '{title}' 的 PDF 创建成功。")
-                    chapter_info["completed"] = True # Mark completed only if PDF is also created
-                    try:
-                        with open(json_file_path, 'w', encoding='utf-8') as f_update:
-                            json.dump(data, f_update, ensure_ascii=False, indent=4)
-                        logger.info(f"已更新JSON文件，标记章节 '{title}' 为已完成。")
-                    except Exception as e:
-                        logger.error(f"更新JSON文件失败: {e}")
-                        all_chapters_processed_successfully = False # If JSON update fails, it's an issue
-                    
-                    logger.info(f"章节 '{title}' (包括PDF) 处理完毕，暂停5秒...")
-                    time.sleep(5) # Be kind to servers
-                else:
-                    logger.error(f"章节 '{title}' 的 PDF 创建失败。章节将不会被标记为已完成。")
-                    all_chapters_processed_successfully = False # Mark that at least one chapter (PDF part) failed
-            else:
-                logger.error(f"章节 '{title}' 下载失败 {max_attempts} 次，跳过此章节。")
-                all_chapters_processed_successfully = False # Mark that at least one chapter failed
+    try:
+        with open(json_file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        logger.error(f"读取或解析JSON文件失败: {json_file_path} - {e}")
+        return False
+
+    base_manga_dir = os.path.dirname(json_file_path)
+    logger.info(f"漫画根目录: {base_manga_dir}")
+
+    pending_chapters = _collect_pending_chapters(data)
+    if not pending_chapters:
+        logger.info("JSON文件中没有需要下载的章节。")
+        return True # No chapters to process is not an error in itself
+
+    logger.info(f"共有 {len(pending_chapters)} 章待下载。")
+    tab_count = backend_tab_count()
+    if worker_processes > 1 and len(pending_chapters) > 1:
+        all_chapters_processed_successfully = _download_chapters_in_workers(
+            json_file_path, data, base_manga_dir, pending_chapters, worker_processes
+        )
+    elif tab_count > 1 and len(pending_chapters) > 1:
+        all_chapters_processed_successfully = _download_chapters_in_tabs(
+            json_file_path, data, base_manga_dir, pending_chapters, tab_count
+        )
+    else:
+        all_chapters_processed_successfully = _download_chapters_serially(
+            json_file_path, data, base_manga_dir, pending_chapters
+        )
 
     logger.info("所有章节类型处理完毕。")
     return all_chapters_processed_successfully
 
+def _download_chapters_serially(json_file_path, data, base_manga_dir, pending_chapters):
+    all_chapters_processed_successfully = True # Track overall success
+
+    # 整个运行期间共用浏览器，避免每章（以及每次重试）都重新启动浏览器
+    backend = create_capture_backend()
+    pdf_builder = _PdfBuilder()
+    pdf_futures = {}
+    pacing = default_pacing
+    try:
+        for index, (chapter_type, chapter_info) in enumerate(pending_chapters, 1):
+            title = chapter_info["title"]
+            logger.info(f"[{index}/{len(pending_chapters)}] 开始处理 '{chapter_type}' / '{title}'")
+            captured = capture_chapter(chapter_type, chapter_info, base_manga_dir, backend, pacing)
+            if captured is None:
+                all_chapters_processed_successfully = False # Mark that at least one chapter failed
+                continue
+
+            # PDF 在后台生成，浏览器直接开始下一章；章节在 PDF 成功后才标记为完成
+            pdf_futures[pdf_builder.submit(title, *captured)] = chapter_info
+            if not _record_pdf_results(json_file_path, data, pdf_futures, wait_all=False):
+                all_chapters_processed_successfully = False
+            pacing.after_chapter() # Be kind to servers
+    finally:
+        backend.close()
+        try:
+            if not _record_pdf_results(json_file_path, data, pdf_futures, wait_all=True):
+                all_chapters_processed_successfully = False
+        finally:
+            pdf_builder.close()
+    return all_chapters_processed_successfully
+
+# --- 多进程 / 多标签页章节下载 ---
+# 每个工作进程持有自己的捕获后端，由 _init_chapter_worker 创建
+_worker_backend = None
+
+def _init_pdf_worker(log_level):
+    # PDF 工作进程以 spawn 方式启动，不继承主进程的日志配置
+    logging.basicConfig(
+        level=log_level,
+        format='%(asctime)s - %(levelname)s - [%(processName)s] - %(module)s - %(funcName)s - %(message)s'
+    )
+
+class _PdfBuilder:
+    """
+    在后台进程池（PDF_WORKER_PROCESSES 个进程）中生成章节 PDF，捕获线程提交后立即开始下一章。
+    进程数为 0 时 submit 在当前线程中同步生成，并返回已完成的 Future。
+    """
+    def __init__(self, workers=PDF_WORKER_PROCESSES):
+        self._executor = None
+        if workers > 0:
+            # 主进程中可能已有浏览器驱动或事件循环线程，fork 出的子进程可能继承被占用的锁，因此使用 spawn
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_pdf_worker,
+                initargs=(logging.getLogger().getEffectiveLevel(),)
+            )
+
+    def submit(self, title, chapter_images_dir, pdf_output_path):
+        if self._executor is not None:
+            logger.info(f"章节 '{title}' 的 PDF 已交给后台进程生成。")
+            return self._executor.submit(build_chapter_pdf, title, chapter_images_dir, pdf_output_path)
+        future = Future()
+        try:
+            future.set_result(build_chapter_pdf(title, chapter_images_dir, pdf_output_path))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+class _ChapterLogFilter(logging.Filter):
+    """为工作进程（或标签页线程）的日志记录附加当前正在处理的章节标题。"""
+    _current = threading.local()
+
+    @classmethod
+    def set_chapter(cls, chapter):
+        cls._current.chapter = chapter
+
+    def filter(self, record):
+        record.chapter = getattr(_ChapterLogFilter._current, "chapter", "-")
+        return True
+
+class _ChapterLogFormatter(logging.Formatter):
+    """包装处理器原有的格式（例如 main.py 配置的格式），只在消息前加上 [进程名或线程名][章节标题]。"""
+    def __init__(self, base_formatter, worker_field):
+        super().__init__()
+        self.base_formatter = base_formatter or logging.Formatter()
+        self.worker_field = worker_field
+
+    def format(self, record):
+        tagged = logging.makeLogRecord(record.__dict__)
+        tagged.msg = f"[{getattr(record, self.worker_field, '-')}][{getattr(record, 'chapter', '-')}] {record.getMessage()}"
+        tagged.args = None
+        return self.base_formatter.format(tagged)
+
+def _install_chapter_log_format(worker_field):
+    """在根日志处理器的消息前加入 worker_field（进程名或线程名）和当前章节标题；每个处理器只安装一次。"""
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers:
+        if not any(isinstance(f, _ChapterLogFilter) for f in handler.filters):
+            handler.addFilter(_ChapterLogFilter())
+        if not isinstance(handler.formatter, _ChapterLogFormatter):
+            handler.setFormatter(_ChapterLogFormatter(handler.formatter, worker_field))
+
+def _init_chapter_worker(selected_browser):
+    global _worker_backend
+    # 浏览器已在主进程中选定，工作进程中不能再交互式询问
+    set_selected_browser(selected_browser)
+
+    _install_chapter_log_format("processName")
+
+    # 工作进程一次只处理一章，只需要一个标签页
+    _worker_backend = create_capture_backend(pool_size=1, tabs_per_browser=1)
+    # 工作进程退出时关闭浏览器（multiprocessing 的 Finalize 会在子进程正常退出时执行）
+    multiprocessing.util.Finalize(None, _worker_backend.close, exitpriority=10)
+
+def _run_chapter_job(chapter_type, chapter_info, base_manga_dir, backend=None):
+    _ChapterLogFilter.set_chapter(chapter_info.get("title", "-"))
+    try:
+        # 只负责捕获，PDF 由调用方交给 _PdfBuilder，工作进程/标签页可以立即领取下一章
+        captured = capture_chapter(chapter_type, chapter_info, base_manga_dir, backend or _worker_backend, default_pacing)
+        if captured is not None:
+            default_pacing.after_chapter() # Be kind to servers
+        return captured
+    finally:
+        _ChapterLogFilter.set_chapter("-")
+
+def _download_chapters_in_workers(json_file_path, data, base_manga_dir, pending_chapters, worker_processes):
+    # 交互式的浏览器选择只能在主进程中进行
+    selected_browser, _ = select_browser()
+    if not selected_browser:
+        return False
+    # 在启动工作进程之前解析一次驱动路径并写入磁盘缓存，工作进程直接复用
+    default_browser_cache.get_setup(selected_browser)
+
+    worker_count = min(worker_processes, len(pending_chapters))
+    logger.info(f"使用 {worker_count} 个工作进程并行下载章节。")
+
+    pdf_builder = _PdfBuilder()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=worker_count,
+            initializer=_init_chapter_worker,
+            initargs=(selected_browser,)
+        ) as executor:
+            futures = {
+                executor.submit(_run_chapter_job, chapter_type, dict(chapter_info), base_manga_dir): chapter_info
+                for chapter_type, chapter_info in pending_chapters
+            }
+            return _merge_chapter_results(json_file_path, data, futures, pdf_builder)
+    finally:
+        pdf_builder.close()
+
+def _download_chapters_in_tabs(json_file_path, data, base_manga_dir, pending_chapters, tab_count):
+    # 交互式的浏览器选择必须在启动线程之前完成
+    selected_browser, _ = select_browser()
+    if not selected_browser:
+        return False
+
+    tab_count = min(tab_count, len(pending_chapters))
+    logger.info(f"在同一个浏览器的 {tab_count} 个标签页中并行下载章节。")
+    _install_chapter_log_format("threadName")
+
+    backend = create_capture_backend(pool_size=1, tabs_per_browser=tab_count)
+    pdf_builder = _PdfBuilder()
+    try:
+        with ThreadPoolExecutor(max_workers=tab_count, thread_name_prefix="tab") as executor:
+            futures = {
+                executor.submit(_run_chapter_job, chapter_type, dict(chapter_info), base_manga_dir, backend): chapter_info
+                for chapter_type, chapter_info in pending_chapters
+            }
+            return _merge_chapter_results(json_file_path, data, futures, pdf_builder)
+    finally:
+        backend.close()
+        pdf_builder.close()
+
+def _record_chapter_result(json_file_path, data, chapter_info, future, progress):
+    """根据章节最终（PDF）任务的结果标记完成状态并写回 JSON，返回该章是否成功。"""
+    title = chapter_info["title"]
+    try:
+        succeeded = future.result()
+    except Exception as e:
+        logger.error(f"处理章节 '{title}' 时发生错误: {e}", exc_info=True)
+        succeeded = False
+
+    if not succeeded:
+        logger.error(f"{progress}章节 '{title}' 处理失败。")
+        return False
+
+    chapter_info["completed"] = True # Mark completed only if PDF is also created
+    if not _save_chapters_json(json_file_path, data):
+        return False
+    logger.info(f"{progress}章节 '{title}' 已完成，JSON 已更新。")
+    return True
+
+def _record_pdf_results(json_file_path, data, pdf_futures, wait_all):
+    """
+    处理已结束的 PDF 任务（pdf_futures: Future -> chapter_info，处理过的会被移除）；
+    wait_all 为 True 时等待全部任务结束。返回这些章节是否都成功。
+    """
+    finished = list(as_completed(pdf_futures)) if wait_all else [future for future in pdf_futures if future.done()]
+    all_succeeded = True
+    for future in finished:
+        chapter_info = pdf_futures.pop(future)
+        if not _record_chapter_result(json_file_path, data, chapter_info, future, ""):
+            all_succeeded = False
+    return all_succeeded
+
+def _merge_chapter_results(json_file_path, data, futures, pdf_builder):
+    """
+    按完成顺序收集各章的捕获结果：捕获成功的章节交给 pdf_builder 生成 PDF，
+    PDF 也成功后才由调用线程标记完成状态、写回 JSON。
+    """
+    all_chapters_processed_successfully = True
+    finished = 0
+    # 只有主进程写 JSON，工作进程只返回结果，避免并发写坏 chapters_manhuagui.json
+    pending = {future: (chapter_info, "capture") for future, chapter_info in futures.items()}
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            chapter_info, stage = pending.pop(future)
+            if stage == "capture":
+                try:
+                    captured = future.result()
+                except Exception:
+                    captured = None
+                if captured is not None:
+                    pending[pdf_builder.submit(chapter_info["title"], *captured)] = (chapter_info, "pdf")
+                    continue
+            finished += 1
+            progress = f"[{finished}/{len(futures)}] "
+            if not _record_chapter_result(json_file_path, data, chapter_info, future, progress):
+                all_chapters_processed_successfully = False
+    return all_chapters_processed_successfully
 
 if __name__ == "__main__":
     logging.basicConfig(
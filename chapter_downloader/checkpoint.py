@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import threading
+
+from PIL import Image
+
+
+logger = logging.getLogger(__name__)
+
+# 章节目录中记录已保存页面的检查点文件
+CHECKPOINT_FILENAME = ".capture_checkpoint.json"
+
+class ChapterCheckpoint:
+    """
+    章节内的页面级检查点。
+    记录哪些页面已经保存并通过校验，重试或重新运行时可以直接跳到第一个缺失的页面。
+    文件内容: {"url": ..., "total_pages": N 或 null, "pages": {"1": {"file": "1.webp", "size": 12345}, ...}}
+    """
+    def __init__(self, chapter_dir, chapter_url):
+        self.chapter_dir = chapter_dir
+        self.chapter_url = chapter_url
+        self.path = os.path.join(chapter_dir, CHECKPOINT_FILENAME)
+        self.total_pages = None
+        self.pages = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取检查点 '{self.path}' 失败，将从头开始: {e}")
+            return
+        if state.get("url") != self.chapter_url:
+            logger.info(f"检查点 '{self.path}' 属于其他 URL，忽略。")
+            return
+        self.total_pages = state.get("total_pages")
+        self.pages = {int(k): v for k, v in state.get("pages", {}).items()}
+
+    def _save(self):
+        state = {
+            "url": self.chapter_url,
+            "total_pages": self.total_pages,
+            "pages": {str(k): v for k, v in sorted(self.pages.items())}
+        }
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+    def is_page_done(self, page_number):
+        """页面已记录且文件仍存在、大小未变时返回 True。"""
+        with self._lock:
+            entry = self.pages.get(page_number)
+        if not entry:
+            return False
+        path = os.path.join(self.chapter_dir, entry["file"])
+        return os.path.exists(path) and os.path.getsize(path) == entry["size"]
+
+    def record_page(self, page_number, path, verify=True):
+        """
+        校验已保存的页面文件并写入检查点。文件损坏时返回 False。
+        写入前已经校验过内容的调用方（例如流水线）可以传 verify=False。
+        """
+        if verify:
+            try:
+                with Image.open(path) as img:
+                    img.verify()
+            except Exception as e:
+                logger.error(f"第 {page_number} 页的文件 '{path}' 校验失败: {e}")
+                return False
+        with self._lock:
+            self.pages[page_number] = {"file": os.path.basename(path), "size": os.path.getsize(path)}
+            self._save()
+        return True
+
+    def mark_finished(self, total_pages):
+        """记录章节总页数（已到达最后一页）。"""
+        with self._lock:
+            self.total_pages = total_pages
+            self._save()
+
+    def first_missing_page(self):
+        """返回第一个尚未保存的页码；章节已全部完成时返回 None。"""
+        page_number = 1
+        while self.is_page_done(page_number):
+            page_number += 1
+        if self.total_pages is not None and page_number > self.total_pages:
+            return None
+        return page_number
+
+    def is_complete(self):
+        return self.total_pages is not None and self.first_missing_page() is None
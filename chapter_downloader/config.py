@@ -0,0 +1,189 @@
+# 章节下载与截图引擎的全局配置
+import os
+
+# --- 捕获后端 ---
+# 驱动浏览器的方式（见 backends/）:
+#   "selenium"   每个会话独占一个 WebDriver 浏览器，由驱动池管理
+#   "playwright" 一个 Chromium 中的多个独立浏览器上下文，由 asyncio 事件循环驱动（需要安装 playwright）
+CAPTURE_BACKEND = "selenium"
+
+# --- 浏览器驱动池 ---
+# 同时保留的浏览器实例数量（playwright 后端为同时打开的浏览器上下文数量）
+DRIVER_POOL_SIZE = 1
+# 单个浏览器最多处理多少章/多少页后被回收（关闭并重新启动），0 表示不限制
+DRIVER_MAX_CHAPTERS_PER_BROWSER = 20
+DRIVER_MAX_PAGES_PER_BROWSER = 2000
+# 浏览器初始窗口尺寸，章节之间会恢复为该尺寸
+DRIVER_WINDOW_WIDTH = 1920
+DRIVER_WINDOW_HEIGHT = 1080
+
+# --- 浏览器与驱动 ---
+# 指定使用的浏览器 "chrome"（含 Chromium）或 "edge"；为 None 时自动检测，检测到多个时询问一次
+BROWSER_CHOICE = None
+# 显式指定浏览器可执行文件和驱动程序的路径，为 None 时自动查找；指定的浏览器文件不存在时忽略该配置（只警告一次）
+BROWSER_BINARY_PATH = None
+BROWSER_DRIVER_PATH = None
+# 浏览器选择、可执行文件和驱动路径的缓存文件；删除它即可重新检测和选择
+BROWSER_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "comic_auto_downloader", "browser.json")
+# 使用持久化的浏览器配置目录（每个浏览器一个，跨章节和跨运行保留 Cookie、localStorage 和磁盘缓存），
+# 阅读器脚本、样式等静态资源命中磁盘缓存，不必每章重新下载；为 False 时每次启动都使用临时配置
+BROWSER_PROFILE_PERSISTENT = False
+BROWSER_PROFILE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "comic_auto_downloader", "profiles")
+# 每个配置目录的磁盘缓存上限（字节）
+BROWSER_DISK_CACHE_SIZE = 256 * 1024 * 1024
+
+# --- 页面捕获 ---
+# 依次尝试的页面捕获方式：
+#   "network"    通过 CDP Network.getResponseBody 取出浏览器下载图片时收到的原始字节（不截图，也不重复请求）
+#   "source"     读取已加载图片的 src，带 Referer/Cookie 直接下载原图（保留站点原始编码和分辨率）
+#   "screenshot" 对页面截图并裁剪出图片区域
+PAGE_CAPTURE_STRATEGIES = ("network", "source", "screenshot")
+# "network" 方式：图片就绪后等待网络日志中出现已完成请求的最长时间（秒），以及记录的最近请求数
+NETWORK_BODY_WAIT = 1.0
+NETWORK_LOG_MAX_REQUESTS = 500
+# Network.enable 的响应体缓冲区大小（字节），太小时较早的图片响应体会被浏览器丢弃
+NETWORK_MAX_TOTAL_BUFFER = 200 * 1024 * 1024
+NETWORK_MAX_RESOURCE_BUFFER = 20 * 1024 * 1024
+# 翻页方式：
+#   "direct" 读取一次总页数，通过阅读器的 SMH.utils.goPage 或 #p=N 直接跳页，失败时回退到点击按钮
+#   "click"  始终点击“下一页”按钮
+PAGE_NAVIGATION_MODE = "direct"
+
+# --- 请求拦截 ---
+# 按站点配置的拦截规则（见 request_blocking.py），通过 CDP Network.setBlockedURLs 生效：
+#   hosts                适用的站点域名
+#   allow_domains        捕获需要的域名（页面本身、阅读器脚本、漫画图片服务器），其子域名也允许
+#   block_domains        始终拦截的域名（广告、统计等）
+#   block_resource_types 按资源类型拦截（按 URL 后缀匹配）: "font" / "media" / "stylesheet"
+#   block_url_patterns   额外拦截的 URL 通配符（例如评论区、其他章节的缩略图）
+#   block_third_party    是否自动拦截页面加载过程中出现的其他第三方主机（从网络事件中学习，并保存到 BLOCKING_LEARNED_FILE）；
+#                        学习的是完整主机名，提供过页面图片的主机不会被学习。学到的主机会一直被拦截，默认关闭，
+#                        开启前请确认 allow_domains 已包含站点当前使用的全部图片服务器
+#   allow_domains_only   只放行 allow_domains 中的域名：其他主机的非图片请求（脚本、XHR、样式、iframe 等）一律拦截，
+#                        图片请求不受白名单限制（仍受 block_domains 等规则约束）。需要按请求拦截，只有 playwright 后端支持；
+#                        selenium 后端的 Network.setBlockedURLs 只能按通配符拦截，此选项不起作用
+BLOCKING_PROFILES = {
+    "manhuagui": {
+        "hosts": ("manhuagui.com", "mhgui.com"),
+        "allow_domains": ("manhuagui.com", "mhgui.com", "hamreus.com"),
+        "block_domains": (
+            "doubleclick.net", "googleadservices.com", "googlesyndication.com", "adservice.google.com",
+            "sitemaji.com", "exdynsrv.com", "google-analytics.com", "googletagmanager.com"
+        ),
+        "block_resource_types": ("font", "media"),
+        "block_url_patterns": (),
+        "block_third_party": False,
+        "allow_domains_only": True
+    }
+}
+BLOCKING_LEARNED_FILE = os.path.join(os.path.expanduser("~"), ".cache", "comic_auto_downloader", "blocked_domains.json")
+# 读取网络事件统计每章被拦截（命中）和未拦截的第三方请求（未命中），需要浏览器的性能日志
+BLOCKING_STATS = True
+
+# --- HTTP 下载 ---
+HTTP_POOL_SIZE = 8
+HTTP_MAX_RETRIES = 2
+SOURCE_DOWNLOAD_TIMEOUT = 30
+
+# --- 免浏览器捕获 ---
+# manhuagui 章节先尝试不启动浏览器：直接请求章节页面，解出打包脚本中的 SMH.imgData（LZString 压缩的词表），
+# 用连接池带 Referer 下载全部页面；解析失败或有页面下载不到时回退到浏览器捕获（已保存的页面不会重复捕获）
+HTTP_ENGINE_ENABLED = True
+# 依次尝试的图片服务器
+MANHUAGUI_IMAGE_HOSTS = ("i.hamreus.com", "us.hamreus.com", "eu.hamreus.com")
+
+# --- 截图 ---
+# 使用 CDP Page.captureScreenshot 只截取图片元素所在区域（不调整窗口大小）；
+# 关闭或浏览器不支持时回退到整窗截图 + PIL 裁剪
+SCREENSHOT_USE_CDP_CLIP = True
+# 高于 SCREENSHOT_TILE_MIN_PAGE_HEIGHT（CSS 像素）的页面（长条漫）改为分块截图：在固定大小的视口中逐块滚动，
+# 每块只截取视口内的区域，拼接为 PNG。避免把窗口或截图表面放大到整页高度（超过 Chromium 纹理上限时截图会被截断）
+SCREENSHOT_TILED_CAPTURE = True
+SCREENSHOT_TILE_MIN_PAGE_HEIGHT = 4000
+# 每块的高度（CSS 像素），不超过视口高度
+SCREENSHOT_TILE_HEIGHT = 1024
+
+# --- 页面保存格式 ---
+# 截图得到的页面按此格式保存: "png" / "webp" / "jpeg"
+# 有损格式（jpeg、有损 webp）直接由浏览器按目标格式编码截图；无损格式在编码阶段转换
+PAGE_OUTPUT_FORMAT = "png"
+PAGE_PNG_COMPRESS_LEVEL = 6     # 0-9
+PAGE_PNG_OPTIMIZE = False       # 额外的 PNG 压缩优化（更慢，更小）
+PAGE_WEBP_LOSSLESS = True
+PAGE_WEBP_QUALITY = 90          # 有损时为画质；无损时为压缩力度
+PAGE_WEBP_METHOD = 4            # 0(快)-6(小)
+PAGE_JPEG_QUALITY = 90
+# 直接取得的原图（"network"/"source"）保留站点的原始编码，不转换为上面的格式
+PAGE_KEEP_SOURCE_ENCODING = True
+# 灰度检测：三个通道几乎相同的页面（大部分漫画页）以 8 位灰度（L）保存（png/jpeg 输出）并以灰度嵌入 PDF，
+# 文件更小、编码更快。通道差超过 PAGE_GRAYSCALE_TOLERANCE 的像素比例超过 PAGE_GRAYSCALE_MAX_COLOR_RATIO 时视为彩色页
+PAGE_GRAYSCALE_DETECT = True
+PAGE_GRAYSCALE_TOLERANCE = 8
+PAGE_GRAYSCALE_MAX_COLOR_RATIO = 0.001
+# 纯线稿（灰度页面中 32-224 之间的中间调像素比例不超过 PAGE_BILEVEL_MAX_MIDTONE_RATIO）以 1 位黑白保存（png 输出）和嵌入 PDF。
+# 网点、灰阶会被二值化，默认关闭
+PAGE_BILEVEL_ENABLED = False
+PAGE_BILEVEL_MAX_MIDTONE_RATIO = 0.005
+
+# --- PDF ---
+# 章节 PDF 由 pdf_writer.StreamingPdfWriter 逐页写入，内存中同时只有一页
+# 页面尺寸按 PDF_RESOLUTION（DPI）由像素换算；需要重新编码的灰度/彩色页面以 PDF_JPEG_QUALITY 编码为 JPEG（DCT）嵌入
+PDF_RESOLUTION = 100.0
+PDF_JPEG_QUALITY = 75
+# 已压缩的 JPEG 页面作为 DCT 流、PNG 页面的压缩数据作为 Flate 流直接嵌入 PDF，不解码也不重新压缩（没有画质损失）；
+# 其他格式（WebP、带透明度或 16 位的 PNG 等）仍解码后按上面的设置编码
+PDF_PASSTHROUGH = True
+# 章节捕获完成后在这么多个后台进程中生成 PDF，浏览器立即开始下一章；章节在 PDF 生成成功后才标记为完成。
+# 0 表示捕获完成后在当前线程中同步生成
+PDF_WORKER_PROCESSES = 1
+
+# --- 等待与节奏 ---
+# 等待图片加载/解码、页面切换的超时时间（秒）
+IMAGE_WAIT_TIMEOUT = 60
+# 所有主动的礼貌性延时都集中在这里（见 pacing.py），设为 0 即关闭
+PACING_PAGE_DELAY = 0.3        # 每页之间
+PACING_BATCH_PAGES = 30        # 每处理这么多页后额外暂停一次
+PACING_BATCH_PAUSE = 3.0
+PACING_CHAPTER_DELAY = 2.0     # 每章完成之后
+PACING_RETRY_DELAY = 5.0       # 章节下载失败重试之前（按重试次数线性增加）
+PACING_JITTER = 0.2            # 在上述延时上加的随机抖动比例
+
+# --- 并行下载 ---
+# 同时下载章节的工作进程数，每个进程有自己的无头浏览器；1 表示在当前进程中逐章下载
+CHAPTER_WORKER_PROCESSES = 1
+# 每个浏览器中同时下载的章节数，每章使用一个独立的标签页（浏览器上下文），共用同一个浏览器进程；
+# 只有 playwright 后端支持，selenium 后端始终为 1。单进程模式（CHAPTER_WORKER_PROCESSES = 1）下大于 1 时，
+# 在当前进程中用同样数量的线程并行下载，比多开工作进程占用的内存少得多
+BROWSER_TABS_PER_BROWSER = 1
+# 单章内的并行捕获：待捕获页数不少于 CHAPTER_SPLIT_MIN_PAGES 的章节（例如单行本）分成连续的几段，
+# 最多由 CHAPTER_SPLIT_SESSIONS 个会话（浏览器或标签页）各自直接跳到本段第一页并行捕获，页面仍按 1..N 写入同一目录。
+# 只在能读取总页数并使用 "direct" 翻页时生效；额外的会话不等待，后端没有空闲容量时按实际借到的数量分段
+# （selenium 后端的容量为 DRIVER_POOL_SIZE，playwright 后端为 DRIVER_POOL_SIZE × BROWSER_TABS_PER_BROWSER）
+CHAPTER_SPLIT_SESSIONS = 1
+CHAPTER_SPLIT_MIN_PAGES = 60
+
+# --- 捕获 → 编码 → 写盘 流水线 ---
+# 解码/裁剪/编码页面的线程数
+PIPELINE_ENCODE_WORKERS = 2
+# 已捕获但尚未写盘的页面数上限，达到后浏览器线程等待（背压）
+PIPELINE_MAX_PENDING_PAGES = 4
+
+# --- 页面质量检测 ---
+# 捕获后检测空白/半加载/占位图/与上一页重复的页面，并在有限次数内重新捕获
+PAGE_QUALITY_CHECK = True
+PAGE_RECAPTURE_ATTEMPTS = 2
+# 与中位灰度相差不超过 BLANK_PIXEL_TOLERANCE 的像素比例达到 BLANK_UNIFORM_RATIO，或灰度熵低于 BLANK_MIN_ENTROPY 比特时视为空白
+BLANK_PIXEL_TOLERANCE = 8
+BLANK_UNIFORM_RATIO = 0.995
+BLANK_MIN_ENTROPY = 0.5
+# 与上一页的 dHash 汉明距离不超过该值时视为重复（翻页未生效）
+DUPLICATE_HASH_DISTANCE = 2
+# 已知占位图（例如防盗链图片）的 dHash（16 位十六进制），可用 python -m chapter_downloader.page_quality <图片> 计算
+KNOWN_PLACEHOLDER_HASHES = ()
+PLACEHOLDER_HASH_DISTANCE = 6
+
+# --- 耗时追踪 ---
+# 把每页各阶段（等待/下载/截图/检测/翻页/编码/写盘）的耗时写入章节目录中的 JSONL 文件，
+# 用 python -m chapter_downloader.tracing <目录> 汇总 p50/p95/max
+TRACE_ENABLED = True
+TRACE_FILENAME = ".capture_trace.jsonl"
@@ -0,0 +1,176 @@
+import logging
+import threading
+
+from chapter_downloader.config import (
+    DRIVER_POOL_SIZE, DRIVER_MAX_CHAPTERS_PER_BROWSER, DRIVER_MAX_PAGES_PER_BROWSER,
+    DRIVER_WINDOW_WIDTH, DRIVER_WINDOW_HEIGHT, BROWSER_PROFILE_PERSISTENT
+)
+from chapter_downloader.browser_setup import select_browser
+from chapter_downloader.browser_profile import acquire_profile
+from chapter_downloader.backends.selenium_driver import create_driver, apply_blocked_urls
+from chapter_downloader.network_capture import NETWORK_EVENTS_ENABLED, get_network_log
+
+
+logger = logging.getLogger(__name__)
+
+class _PooledDriver:
+    """池中的一个浏览器实例、它使用的持久配置目录及其使用统计。"""
+    def __init__(self, driver, profile=None):
+        self.driver = driver
+        self.profile = profile
+        self.chapters_served = 0
+        self.pages_served = 0
+
+class DriverPool:
+    """
+    在一次运行中复用的浏览器池。
+    浏览器在首次需要时启动，章节之间重置状态（Cookie、窗口大小、CDP 拦截列表），
+    处理的章节数或页数达到上限后关闭并在下次借用时重新启动。
+    persistent_profile 为 True 时每个浏览器使用一个持久配置目录，章节之间保留 Cookie 和缓存。
+    """
+    def __init__(
+        self,
+        size=DRIVER_POOL_SIZE,
+        max_chapters_per_driver=DRIVER_MAX_CHAPTERS_PER_BROWSER,
+        max_pages_per_driver=DRIVER_MAX_PAGES_PER_BROWSER,
+        persistent_profile=BROWSER_PROFILE_PERSISTENT
+    ):
+        self.size = max(1, size)
+        self.persistent_profile = persistent_profile
+        self.max_chapters_per_driver = max_chapters_per_driver
+        self.max_pages_per_driver = max_pages_per_driver
+        self._idle = []
+        self._leased = {}
+        self._started = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def acquire(self, urls_to_block=None, wait=True):
+        """借出一个已重置状态的浏览器；池已满时阻塞等待归还（wait 为 False 时返回 None）。"""
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("浏览器池已关闭。")
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._started < self.size:
+                    self._started += 1
+                    entry = None
+                    break
+                if not wait:
+                    return None
+                self._condition.wait()
+
+        if entry is None:
+            try:
+                entry = self._start_driver()
+            except Exception:
+                with self._condition:
+                    self._started -= 1
+                    self._condition.notify()
+                raise
+
+        try:
+            self._reset_driver(entry.driver, urls_to_block)
+        except Exception as e:
+            logger.warning(f"重置浏览器状态失败，将重新启动浏览器: {e}")
+            self._quit(entry)
+            try:
+                entry = self._start_driver()
+                self._reset_driver(entry.driver, urls_to_block)
+            except Exception:
+                with self._condition:
+                    self._started -= 1
+                    self._condition.notify()
+                raise
+
+        with self._condition:
+            self._leased[id(entry.driver)] = entry
+        return entry.driver
+
+    def release(self, driver, pages_captured=0, healthy=True):
+        """
+        归还浏览器。
+        healthy 为 False（例如发生 WebDriver 错误）或达到回收上限时，浏览器会被关闭。
+        """
+        with self._condition:
+            entry = self._leased.pop(id(driver), None)
+        if entry is None:
+            logger.warning("归还了一个不属于该池的浏览器，直接关闭。")
+            driver.quit()
+            return
+
+        entry.chapters_served += 1
+        entry.pages_served += pages_captured
+
+        recycle = not healthy or self._closed
+        if self.max_chapters_per_driver and entry.chapters_served >= self.max_chapters_per_driver:
+            logger.info(f"浏览器已处理 {entry.chapters_served} 章，达到上限，回收。")
+            recycle = True
+        if self.max_pages_per_driver and entry.pages_served >= self.max_pages_per_driver:
+            logger.info(f"浏览器已处理 {entry.pages_served} 页，达到上限，回收。")
+            recycle = True
+
+        if recycle:
+            self._quit(entry)
+            with self._condition:
+                self._started -= 1
+                self._condition.notify()
+        else:
+            with self._condition:
+                self._idle.append(entry)
+                self._condition.notify()
+
+    def close(self):
+        """关闭池中所有空闲的浏览器；仍被借出的浏览器在归还时关闭。"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._started -= len(idle)
+            self._condition.notify_all()
+        for entry in idle:
+            self._quit(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _start_driver(self):
+        selected_browser, _ = select_browser()
+        if not selected_browser:
+            raise RuntimeError("没有可用的浏览器。")
+        profile = acquire_profile(selected_browser) if self.persistent_profile else None
+        try:
+            driver = create_driver(selected_browser, profile)
+        except Exception:
+            if profile is not None:
+                profile.release()
+            raise
+        logger.info(f"浏览器池已启动新的{selected_browser.capitalize()}实例。")
+        return _PooledDriver(driver, profile)
+
+    def _reset_driver(self, driver, urls_to_block):
+        driver.get("about:blank")
+        if not self.persistent_profile:
+            # about:blank 下 delete_all_cookies 只作用于当前域，改用 CDP 清空整个浏览器的 Cookie
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.set_window_size(DRIVER_WINDOW_WIDTH, DRIVER_WINDOW_HEIGHT)
+        apply_blocked_urls(driver, urls_to_block)
+        if NETWORK_EVENTS_ENABLED:
+            # 清空上一章的网络日志，避免按 URL 匹配到旧的请求
+            get_network_log(driver).reset()
+
+    def _quit(self, entry):
+        try:
+            entry.driver.quit()
+            logger.info("浏览器已关闭。")
+        except Exception as e:
+            logger.warning(f"关闭浏览器时出错: {e}")
+        finally:
+            # 浏览器退出后才释放配置目录，下一个浏览器才能使用它
+            if entry.profile is not None:
+                entry.profile.release()
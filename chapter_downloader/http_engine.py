@@ -0,0 +1,117 @@
+import logging
+import os
+
+import requests
+
+from chapter_downloader.config import (
+    MANHUAGUI_IMAGE_HOSTS, PAGE_QUALITY_CHECK, SOURCE_DOWNLOAD_TIMEOUT
+)
+from chapter_downloader.checkpoint import ChapterCheckpoint
+from chapter_downloader.image_source import download_image_bytes, get_http_session
+from chapter_downloader.manhuagui_reader import ReaderDataError, page_image_urls, parse_reader_data
+from chapter_downloader.pacing import default_pacing
+from chapter_downloader.page_pipeline import CapturedPage, PagePipeline
+from chapter_downloader.page_quality import PageQualityChecker
+from chapter_downloader.tracing import open_chapter_tracer
+
+
+logger = logging.getLogger(__name__)
+
+def fetch_reader_data(start_url):
+    """请求章节页面并解出 SMH.imgData。页面无法下载或解析时返回 None。"""
+    try:
+        response = get_http_session().get(start_url, timeout=SOURCE_DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"下载章节页面失败 ({start_url}): {e}")
+        return None
+    if not response.encoding or response.encoding.lower() == 'iso-8859-1':
+        response.encoding = 'utf-8'
+    try:
+        return parse_reader_data(response.text)
+    except ReaderDataError as e:
+        logger.warning(f"无法解析章节页面中的阅读器数据: {e}")
+        return None
+
+def _download_page(host_urls, start_url, page_number, quality_checker):
+    """
+    依次从各图片服务器下载一页，返回 CapturedPage；所有服务器都失败时返回 None。
+    只拒绝无法解码的图片和已知占位图，原图之间不做空白/重复判断。
+    """
+    for host, url in host_urls:
+        data, content_type = download_image_bytes(url, referer=start_url)
+        if not data:
+            continue
+        captured_page = CapturedPage(page_number, data, content_type=content_type, source="source", source_url=url)
+        if quality_checker is not None:
+            problem, _ = quality_checker.inspect(captured_page)
+            if problem in ("undecodable", "placeholder"):
+                logger.warning(f"第 {page_number} 页：{host} 返回了异常图片 ({problem})。")
+                continue
+        return captured_page
+    return None
+
+def capture_chapter_images_http(start_url, base_output_dir="manga_chapters", pacing=None):
+    """
+    不启动浏览器捕获一个 manhuagui 章节：解出阅读器数据后按页下载原图，
+    通过与浏览器捕获相同的流水线和检查点写入 1..N 页。
+    全部页面保存成功时返回 True；否则返回 False，已保存的页面留在检查点中，
+    调用方回退到浏览器捕获时会跳过这些页面。
+    """
+    pacing = pacing or default_pacing
+    chapter_output_dir = base_output_dir
+    os.makedirs(chapter_output_dir, exist_ok=True)
+
+    checkpoint = ChapterCheckpoint(chapter_output_dir, start_url)
+    if checkpoint.is_complete():
+        logger.info(f"检查点显示本章 {checkpoint.total_pages} 页均已保存，无需重新捕获。")
+        return True
+
+    reader_data = fetch_reader_data(start_url)
+    if reader_data is None:
+        return False
+    page_urls_by_host = [page_image_urls(reader_data, host) for host in MANHUAGUI_IMAGE_HOSTS]
+    total_pages = len(reader_data["files"])
+    logger.info(f"已解析阅读器数据，本章共 {total_pages} 页，不启动浏览器直接下载。")
+
+    tracer = open_chapter_tracer(chapter_output_dir, os.path.basename(os.path.normpath(chapter_output_dir)))
+    pipeline = PagePipeline(chapter_output_dir, checkpoint, tracer=tracer)
+    quality_checker = PageQualityChecker() if PAGE_QUALITY_CHECK else None
+    chapter_fully_captured = True
+    pages_processed = 0
+    try:
+        for page_number in range(1, total_pages + 1):
+            if checkpoint.is_page_done(page_number):
+                continue
+            host_urls = [(host, urls[page_number - 1]) for host, urls in zip(MANHUAGUI_IMAGE_HOSTS, page_urls_by_host)]
+            with tracer.span("http_download", page_number) as span:
+                captured_page = _download_page(host_urls, start_url, page_number, quality_checker)
+                span["bytes"] = len(captured_page.data) if captured_page else 0
+            if captured_page is None:
+                logger.warning(f"第 {page_number} 页无法从任何图片服务器下载。")
+                chapter_fully_captured = False
+                break
+            logger.info(f"第 {page_number}/{total_pages} 页：已下载原图 ({len(captured_page.data)} 字节)")
+            with tracer.span("pipeline_wait", page_number):
+                pipeline.submit(captured_page)
+            if pipeline.failed:
+                logger.warning(f"流水线中有页面处理失败 {pipeline.failed_pages()}。")
+                chapter_fully_captured = False
+                break
+            pages_processed += 1
+            with tracer.span("pacing", page_number):
+                pacing.after_page(pages_processed)
+    except Exception as e:
+        logger.error(f"免浏览器捕获过程中发生意外错误: {e}", exc_info=True)
+        chapter_fully_captured = False
+    finally:
+        if not pipeline.close():
+            chapter_fully_captured = False
+        tracer.close()
+
+    if chapter_fully_captured:
+        checkpoint.mark_finished(total_pages)
+        if checkpoint.first_missing_page() is not None:
+            logger.warning(f"章节结束时仍有未保存的页面 (第 {checkpoint.first_missing_page()} 页)。")
+            chapter_fully_captured = False
+    return chapter_fully_captured
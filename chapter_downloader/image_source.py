@@ -0,0 +1,81 @@
+import base64
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from chapter_downloader.config import HTTP_POOL_SIZE, HTTP_MAX_RETRIES, SOURCE_DOWNLOAD_TIMEOUT
+from chapter_downloader.page_pipeline import CapturedPage
+from metadata.config import HEADERS
+
+
+logger = logging.getLogger(__name__)
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """返回进程内共享的、带连接池和重试的 requests.Session。"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            retry = Retry(
+                total=HTTP_MAX_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET'])
+            )
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(HEADERS)
+            _http_session = session
+        return _http_session
+
+def download_image_bytes(url, referer, user_agent=None, cookies=None):
+    """
+    通过共享会话下载图片原始字节。
+    返回 (bytes, content_type)，失败时返回 (None, None)。
+    """
+    if url.startswith('data:'):
+        header, _, payload = url.partition(',')
+        if ';base64' not in header:
+            return None, None
+        return base64.b64decode(payload), header[5:].split(';')[0]
+    if not url.startswith(('http://', 'https://')):
+        # blob: 等地址无法在浏览器之外访问
+        logger.info(f"图片地址无法直接下载: {url[:80]}")
+        return None, None
+
+    headers = {'Referer': referer}
+    if user_agent:
+        headers['User-Agent'] = user_agent
+    try:
+        response = get_http_session().get(url, headers=headers, cookies=cookies, timeout=SOURCE_DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"下载图片原图失败 ({url}): {e}")
+        return None, None
+    return response.content, response.headers.get('Content-Type')
+
+def fetch_page_from_image_source(session, probe, page_number):
+    """
+    按 probe_page_image 测得的 src，带上页面的 Referer、User-Agent 和 Cookie 下载原图。
+    返回 CapturedPage，失败时返回 None（调用方应回退到截图）。
+    """
+    src = probe.get('src')
+    if not src:
+        logger.warning(f"第 {page_number} 页：图片没有 src，无法直接下载。")
+        return None
+
+    # HttpOnly Cookie 读不到 document.cookie，只能通过浏览器会话取得
+    cookies = session.get_cookies()
+    data, content_type = download_image_bytes(src, probe['url'], probe['userAgent'], cookies)
+    if not data:
+        return None
+
+    logger.info(f"第 {page_number} 页：已直接下载原图 ({len(data)} 字节)")
+    return CapturedPage(page_number, data, content_type=content_type, source="source", source_url=src)
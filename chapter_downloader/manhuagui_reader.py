@@ -0,0 +1,146 @@
+import json
+import logging
+import re
+from urllib.parse import quote, urlsplit
+
+from chapter_downloader.config import MANHUAGUI_IMAGE_HOSTS
+
+
+logger = logging.getLogger(__name__)
+
+# manhuagui 阅读器页面中的打包脚本：
+#   window["eval"](function(p,a,c,k,e,d){...}('<payload>',62,281,'<LZString>'['split']('|'),0,{}))
+# payload 中的单词按 a 进制编号，对应解压后按 '|' 分割的词表
+_PACKED_SCRIPT_RE = re.compile(r"\}\('(.+?)',(\d+),(\d+),'([A-Za-z0-9+/=]+)'\[", re.S)
+_IMG_DATA_RE = re.compile(r"SMH\.imgData\((\{.*\})\)", re.S)
+_BASE36_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+_LZ_BASE64_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+_LZ_BASE64_VALUES = {char: index for index, char in enumerate(_LZ_BASE64_ALPHABET)}
+
+class ReaderDataError(ValueError):
+    """阅读器页面中没有可解析的 SMH.imgData 数据。"""
+
+def lz_decompress_from_base64(data):
+    """LZString.decompressFromBase64 的 Python 实现。数据损坏时返回 None。"""
+    if data is None:
+        return ""
+    if data == "":
+        return None
+    length = len(data)
+    values = [_LZ_BASE64_VALUES.get(char, 0) for char in data]
+    # 读到末尾之后 JS 版本得到 undefined，按位与的结果为 0
+    state = {"value": values[0], "position": 32, "index": 1}
+
+    def read_bits(count):
+        bits = 0
+        power = 1
+        while power != 1 << count:
+            bit = state["value"] & state["position"]
+            state["position"] >>= 1
+            if state["position"] == 0:
+                state["position"] = 32
+                state["value"] = values[state["index"]] if state["index"] < length else 0
+                state["index"] += 1
+            if bit:
+                bits |= power
+            power <<= 1
+        return bits
+
+    dictionary = ["", "", ""]
+    enlarge_in = 4
+    num_bits = 3
+
+    first = read_bits(2)
+    if first == 0:
+        entry = chr(read_bits(8))
+    elif first == 1:
+        entry = chr(read_bits(16))
+    else:
+        return ""
+    dictionary.append(entry)
+    previous = entry
+    result = [entry]
+
+    while True:
+        if state["index"] > length:
+            return ""
+        code = read_bits(num_bits)
+        if code in (0, 1):
+            dictionary.append(chr(read_bits(8 if code == 0 else 16)))
+            code = len(dictionary) - 1
+            enlarge_in -= 1
+        elif code == 2:
+            return "".join(result)
+
+        if enlarge_in == 0:
+            enlarge_in = 1 << num_bits
+            num_bits += 1
+
+        if code < len(dictionary):
+            entry = dictionary[code]
+        elif code == len(dictionary):
+            entry = previous + previous[0]
+        else:
+            return None
+        result.append(entry)
+        dictionary.append(previous + entry[0])
+        enlarge_in -= 1
+        previous = entry
+
+        if enlarge_in == 0:
+            enlarge_in = 1 << num_bits
+            num_bits += 1
+
+def _encode_word_index(index, radix):
+    """打包脚本中的 e(c)：把词表下标编码为 radix 进制（36 以上的数位使用大写字母）。"""
+    prefix = "" if index < radix else _encode_word_index(index // radix, radix)
+    index %= radix
+    return prefix + (chr(index + 29) if index > 35 else _BASE36_DIGITS[index])
+
+def unpack_packed_script(payload, radix, count, words):
+    """还原 Dean Edwards 的 p,a,c,k,e,d 打包脚本：把 payload 中的编号单词替换为词表中的原词。"""
+    table = {}
+    for index in range(count):
+        word = words[index] if index < len(words) else ""
+        key = _encode_word_index(index, radix)
+        table[key] = word or key
+    return re.sub(r"\b\w+\b", lambda match: table.get(match.group(0), match.group(0)), payload, flags=re.ASCII)
+
+def _unescape_js_string(text):
+    return re.sub(r"\\(.)", r"\1", text, flags=re.S)
+
+def parse_reader_data(html):
+    """
+    从阅读器页面的 HTML 中解出 SMH.imgData 的 JSON（包含 path、files 和签名参数 sl）。
+    解析失败时抛出 ReaderDataError。
+    """
+    match = _PACKED_SCRIPT_RE.search(html)
+    if not match:
+        raise ReaderDataError("页面中没有找到打包的阅读器脚本")
+    payload, radix, count, packed_words = match.groups()
+    words_text = lz_decompress_from_base64(packed_words)
+    if not words_text:
+        raise ReaderDataError("词表 LZString 解压失败")
+    script = unpack_packed_script(_unescape_js_string(payload), int(radix), int(count), words_text.split('|'))
+
+    data_match = _IMG_DATA_RE.search(script)
+    if not data_match:
+        raise ReaderDataError("解包后的脚本中没有 SMH.imgData")
+    try:
+        data = json.loads(data_match.group(1))
+    except ValueError as e:
+        raise ReaderDataError(f"SMH.imgData 不是有效的 JSON: {e}")
+    if not data.get("files") or not data.get("path"):
+        raise ReaderDataError("SMH.imgData 中缺少 files 或 path")
+    return data
+
+def page_image_urls(reader_data, host=MANHUAGUI_IMAGE_HOSTS[0]):
+    """按 SMH.imgData 生成每页图片的完整地址（带 e/m 签名参数），下标 0 为第 1 页。"""
+    signing = reader_data.get("sl") or {}
+    query = "&".join(f"{key}={quote(str(value))}" for key, value in signing.items())
+    path = quote(reader_data["path"])
+    return [f"https://{host}{path}{quote(name)}" + (f"?{query}" if query else "") for name in reader_data["files"]]
+
+def is_manhuagui_url(url):
+    host = (urlsplit(url).hostname or "").lower()
+    return host.endswith(("manhuagui.com", "mhgui.com"))
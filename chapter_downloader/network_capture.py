@@ -0,0 +1,153 @@
+import base64
+import json
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from selenium.common.exceptions import WebDriverException
+
+from chapter_downloader.config import PAGE_CAPTURE_STRATEGIES, NETWORK_BODY_WAIT, NETWORK_LOG_MAX_REQUESTS, BLOCKING_STATS
+from chapter_downloader.page_pipeline import CapturedPage
+
+
+logger = logging.getLogger(__name__)
+
+NETWORK_CAPTURE_ENABLED = "network" in PAGE_CAPTURE_STRATEGIES
+# 只有启用了 "network" 捕获方式或拦截统计时，浏览器才需要打开性能日志（CDP 网络事件）
+NETWORK_EVENTS_ENABLED = NETWORK_CAPTURE_ENABLED or BLOCKING_STATS
+
+class NetworkResponseLog:
+    """
+    从 WebDriver 的性能日志中读取 CDP Network 事件，记录每个请求的 URL、MIME 类型和完成状态。
+    performance 日志读取一次就会被清空，所以每个浏览器只能有一个读取者，用 get_network_log 取得；
+    其他需要网络事件的模块（例如拦截统计）通过 add_listener 注册回调。
+    """
+    def __init__(self, driver, max_requests=NETWORK_LOG_MAX_REQUESTS):
+        self.driver = driver
+        self.max_requests = max_requests
+        self._request_ids = OrderedDict() # 请求 URL -> requestId（重定向时 requestId 不变）
+        self._requests = {}               # requestId -> {"url", "mime_type", "status", "finished", "failed"}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """注册 listener(method, params)，在 poll 时对每个网络事件调用。"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def poll(self):
+        """读取并处理自上次以来的所有网络事件。"""
+        entries = self.driver.get_log('performance')
+        with self._lock:
+            for entry in entries:
+                try:
+                    message = json.loads(entry['message'])['message']
+                except (KeyError, ValueError):
+                    continue
+                method, params = message.get('method'), message.get('params', {})
+                self._handle(method, params)
+                for listener in self._listeners:
+                    listener(method, params)
+
+    def _handle(self, method, params):
+        request_id = params.get('requestId')
+        if method == 'Network.requestWillBeSent':
+            url = params['request']['url']
+            self._request_ids[url] = request_id
+            self._request_ids.move_to_end(url)
+            self._requests.setdefault(request_id, {"url": url, "finished": False, "failed": False})
+            while len(self._request_ids) > self.max_requests:
+                _, old_request_id = self._request_ids.popitem(last=False)
+                self._requests.pop(old_request_id, None)
+        elif method == 'Network.responseReceived':
+            request = self._requests.get(request_id)
+            if request is not None:
+                response = params['response']
+                request["mime_type"] = response.get('mimeType')
+                request["status"] = response.get('status')
+        elif method == 'Network.loadingFinished':
+            request = self._requests.get(request_id)
+            if request is not None:
+                request["finished"] = True
+        elif method == 'Network.loadingFailed':
+            request = self._requests.get(request_id)
+            if request is not None:
+                request["failed"] = True
+
+    def find_request(self, url):
+        """返回 (requestId, 请求信息)，没有记录时返回 (None, None)。"""
+        with self._lock:
+            request_id = self._request_ids.get(url)
+            if request_id is None:
+                return None, None
+            return request_id, dict(self._requests.get(request_id, {}))
+
+    def reset(self):
+        """丢弃已有的记录（例如浏览器池在章节之间重置浏览器时）。"""
+        self.poll()
+        with self._lock:
+            self._request_ids.clear()
+            self._requests.clear()
+
+_network_logs = weakref.WeakKeyDictionary()
+_network_logs_lock = threading.Lock()
+
+def get_network_log(driver):
+    """返回该浏览器唯一的 NetworkResponseLog。"""
+    with _network_logs_lock:
+        network_log = _network_logs.get(driver)
+        if network_log is None:
+            network_log = NetworkResponseLog(driver)
+            _network_logs[driver] = network_log
+        return network_log
+
+def fetch_page_from_network(driver, probe, page_number):
+    """
+    通过 Network.getResponseBody 取出浏览器为 #mangaFile 下载的原始字节，无需截图或再次请求。
+    响应体已被浏览器丢弃、图片来自 blob:/data: 地址或请求失败时返回 None（调用方应回退到其他方式）。
+    """
+    src = probe.get('src')
+    if not src or not src.startswith(('http://', 'https://')):
+        logger.info(f"第 {page_number} 页：图片地址不是网络请求，无法读取响应体。")
+        return None
+
+    network_log = get_network_log(driver)
+    # 图片已就绪时 loadingFinished 事件通常已经产生，但性能日志可能稍有延迟
+    deadline = time.monotonic() + NETWORK_BODY_WAIT
+    while True:
+        network_log.poll()
+        request_id, request = network_log.find_request(src)
+        if request_id is not None and (request["finished"] or request["failed"]):
+            break
+        if time.monotonic() >= deadline:
+            logger.info(f"第 {page_number} 页：网络日志中没有已完成的图片请求。")
+            return None
+        time.sleep(0.05)
+
+    if request["failed"] or (request.get("status") and request["status"] >= 400):
+        logger.warning(f"第 {page_number} 页：图片请求失败 (状态: {request.get('status')})。")
+        return None
+
+    try:
+        result = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+    except WebDriverException as e:
+        # 响应体可能已被逐出缓冲区，或者图片来自内存缓存
+        logger.info(f"第 {page_number} 页：无法读取图片响应体: {e}")
+        return None
+    if not result.get('base64Encoded'):
+        # 图片响应体总是以 base64 返回，文本说明拿到的不是图片
+        logger.warning(f"第 {page_number} 页：图片响应体不是二进制内容。")
+        return None
+    data = base64.b64decode(result['body'])
+    if not data:
+        return None
+
+    logger.info(f"第 {page_number} 页：已从网络响应中取得原图 ({len(data)} 字节)")
+    return CapturedPage(page_number, data, content_type=request.get("mime_type"), source="network", source_url=src)
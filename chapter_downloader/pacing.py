@@ -0,0 +1,58 @@
+import logging
+import random
+import time
+
+from chapter_downloader.config import (
+    PACING_PAGE_DELAY, PACING_BATCH_PAGES, PACING_BATCH_PAUSE,
+    PACING_CHAPTER_DELAY, PACING_RETRY_DELAY, PACING_JITTER
+)
+
+
+logger = logging.getLogger(__name__)
+
+class PacingPolicy:
+    """
+    下载过程中所有主动延时的统一策略。
+    页面是否就绪由事件判断（图片解码、页面切换），这里只负责对站点的礼貌性限速。
+    """
+    def __init__(
+        self,
+        page_delay=PACING_PAGE_DELAY,
+        batch_pages=PACING_BATCH_PAGES,
+        batch_pause=PACING_BATCH_PAUSE,
+        chapter_delay=PACING_CHAPTER_DELAY,
+        retry_delay=PACING_RETRY_DELAY,
+        jitter=PACING_JITTER
+    ):
+        self.page_delay = page_delay
+        self.batch_pages = batch_pages
+        self.batch_pause = batch_pause
+        self.chapter_delay = chapter_delay
+        self.retry_delay = retry_delay
+        self.jitter = jitter
+
+    def after_page(self, pages_done):
+        """每捕获完一页后调用，pages_done 为本章已处理的页数。"""
+        if self.batch_pages and pages_done % self.batch_pages == 0 and self.batch_pause > 0:
+            self._sleep(self.batch_pause, f"已处理 {pages_done} 页")
+        else:
+            self._sleep(self.page_delay)
+
+    def after_chapter(self):
+        """每章处理完毕后调用。"""
+        self._sleep(self.chapter_delay, "章节处理完毕")
+
+    def before_retry(self, attempt):
+        """第 attempt 次尝试失败、准备重试前调用。"""
+        self._sleep(self.retry_delay * attempt, "准备重试")
+
+    def _sleep(self, seconds, reason=None):
+        if seconds <= 0:
+            return
+        seconds *= 1 + random.uniform(0, self.jitter)
+        if reason:
+            logger.info(f"{reason}，暂停 {seconds:.1f} 秒...")
+        time.sleep(seconds)
+
+# 未显式传入策略时使用的默认策略
+default_pacing = PacingPolicy()
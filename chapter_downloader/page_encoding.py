@@ -0,0 +1,121 @@
+import io
+import logging
+
+import numpy as np
+from PIL import Image, features
+
+from chapter_downloader.config import (
+    PAGE_OUTPUT_FORMAT, PAGE_PNG_COMPRESS_LEVEL, PAGE_PNG_OPTIMIZE,
+    PAGE_WEBP_LOSSLESS, PAGE_WEBP_QUALITY, PAGE_WEBP_METHOD, PAGE_JPEG_QUALITY,
+    PAGE_GRAYSCALE_DETECT, PAGE_GRAYSCALE_TOLERANCE, PAGE_GRAYSCALE_MAX_COLOR_RATIO,
+    PAGE_BILEVEL_ENABLED, PAGE_BILEVEL_MAX_MIDTONE_RATIO
+)
+
+
+logger = logging.getLogger(__name__)
+
+# PAGE_OUTPUT_FORMAT 对应的 Pillow 格式名和扩展名
+_PIL_FORMATS = {'png': 'PNG', 'webp': 'WEBP', 'jpeg': 'JPEG'}
+_EXTENSIONS = {'png': '.png', 'webp': '.webp', 'jpeg': '.jpg'}
+# 能以灰度保存的输出格式（WebP 只有 RGB(A)，Pillow 会把灰度图重新扩展为 RGB）
+_GRAYSCALE_FORMATS = ('png', 'jpeg')
+# 二值化判断中视为“中间调”的灰度范围（开区间）；二值化时以 128 为阈值
+_BILEVEL_MIDTONE_RANGE = (32, 224)
+
+if PAGE_OUTPUT_FORMAT not in _PIL_FORMATS:
+    raise ValueError(f"不支持的页面输出格式: {PAGE_OUTPUT_FORMAT}（可选 png / webp / jpeg）")
+
+def output_extension():
+    return _EXTENSIONS[PAGE_OUTPUT_FORMAT]
+
+def _stores_grayscale():
+    return PAGE_GRAYSCALE_DETECT and PAGE_OUTPUT_FORMAT in _GRAYSCALE_FORMATS
+
+def screenshot_capture_format():
+    """
+    返回向浏览器请求元素截图时使用的 (格式, 质量)。
+    有损输出直接让浏览器按目标格式编码；无损输出先取 PNG，再在编码阶段转换。
+    需要检测灰度的 JPEG 输出也先取 PNG，避免浏览器的彩色 JPEG 再以灰度重新有损编码一次。
+    """
+    if PAGE_OUTPUT_FORMAT == 'jpeg' and not _stores_grayscale():
+        return 'jpeg', PAGE_JPEG_QUALITY
+    if PAGE_OUTPUT_FORMAT == 'webp' and not PAGE_WEBP_LOSSLESS:
+        return 'webp', PAGE_WEBP_QUALITY
+    return 'png', None
+
+def needs_reencode(image_format, image_mode=None):
+    """已编码的页面（Pillow 格式名 image_format，模式 image_mode）是否需要按输出设置重新编码。"""
+    if image_format != _PIL_FORMATS[PAGE_OUTPUT_FORMAT]:
+        return True
+    if _stores_grayscale() and image_mode not in ('L', '1'):
+        # 需要解码后判断是否为灰度页面
+        return True
+    # 浏览器输出的 PNG 使用默认压缩，开启 optimize 时重新压缩
+    return PAGE_OUTPUT_FORMAT == 'png' and PAGE_PNG_OPTIMIZE
+
+def is_grayscale(img):
+    """
+    RGB 图片的三个通道是否几乎相同：通道差超过 PAGE_GRAYSCALE_TOLERANCE 的像素比例
+    不超过 PAGE_GRAYSCALE_MAX_COLOR_RATIO（容忍 JPEG 色度噪声和零星的彩色像素）。
+    """
+    pixels = np.asarray(img)
+    spread = pixels.max(axis=2) - pixels.min(axis=2)
+    colored = np.count_nonzero(spread > PAGE_GRAYSCALE_TOLERANCE)
+    return colored <= spread.size * PAGE_GRAYSCALE_MAX_COLOR_RATIO
+
+def is_bilevel(img):
+    """L 模式图片是否几乎只有黑白两色（纯线稿），中间调像素比例不超过 PAGE_BILEVEL_MAX_MIDTONE_RATIO。"""
+    pixels = np.asarray(img)
+    low, high = _BILEVEL_MIDTONE_RANGE
+    midtones = np.count_nonzero((pixels > low) & (pixels < high))
+    return midtones <= pixels.size * PAGE_BILEVEL_MAX_MIDTONE_RATIO
+
+def reduce_color_mode(img, allow_bilevel=PAGE_BILEVEL_ENABLED):
+    """
+    把实际为灰度的页面转换为 8 位 L 模式（开启 allow_bilevel 且为纯线稿时转换为 1 位模式），
+    否则原样返回。完全不透明的 Alpha 通道会被去掉；带真实透明度的图片不做处理。
+    """
+    if not PAGE_GRAYSCALE_DETECT or img.mode == '1':
+        return img
+    if img.mode == 'P':
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    if img.mode in ('LA', 'RGBA'):
+        if img.getchannel('A').getextrema()[0] != 255:
+            return img
+        img = img.convert(img.mode[:-1])
+    if img.mode == 'RGB':
+        if not is_grayscale(img):
+            return img
+        img = img.convert('L')
+    if img.mode == 'L' and allow_bilevel and is_bilevel(img):
+        img = img.convert('1', dither=Image.Dither.NONE)
+    return img
+
+def pdf_page_image(img):
+    """
+    返回嵌入 PDF 时使用的图片：灰度页面以 L（单通道 DCT）或 1 位（CCITT G4）嵌入，其余转换为 RGB。
+    """
+    img = reduce_color_mode(img)
+    if img.mode == '1' and not features.check('libtiff'):
+        # 没有 libtiff 时 Pillow 无法以 CCITT 编码 1 位图片
+        img = img.convert('L')
+    if img.mode not in ('1', 'L', 'RGB'):
+        img = img.convert('RGB')
+    return img
+
+def encode_page_image(img):
+    """按 PAGE_OUTPUT_FORMAT 编码 PIL 图片，返回 (字节, 扩展名)。灰度页面以 L/1 位模式保存。"""
+    buffer = io.BytesIO()
+    if _stores_grayscale():
+        # JPEG 不支持 1 位模式
+        img = reduce_color_mode(img, allow_bilevel=PAGE_BILEVEL_ENABLED and PAGE_OUTPUT_FORMAT == 'png')
+    if PAGE_OUTPUT_FORMAT == 'png':
+        img.save(buffer, format='PNG', compress_level=PAGE_PNG_COMPRESS_LEVEL, optimize=PAGE_PNG_OPTIMIZE)
+    elif PAGE_OUTPUT_FORMAT == 'webp':
+        # 无损模式下 quality 表示压缩力度
+        img.save(buffer, format='WEBP', lossless=PAGE_WEBP_LOSSLESS, quality=PAGE_WEBP_QUALITY, method=PAGE_WEBP_METHOD)
+    else:
+        if img.mode not in ('L', 'RGB', 'CMYK'):
+            img = img.convert('RGB')
+        img.save(buffer, format='JPEG', quality=PAGE_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue(), output_extension()
@@ -0,0 +1,142 @@
+import io
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from chapter_downloader.config import PIPELINE_ENCODE_WORKERS, PIPELINE_MAX_PENDING_PAGES, PAGE_KEEP_SOURCE_ENCODING
+from chapter_downloader.page_encoding import encode_page_image, needs_reencode
+from chapter_downloader.page_store import extension_for_content_type, extension_for_format, write_page_bytes
+from chapter_downloader.tracing import null_tracer
+
+
+logger = logging.getLogger(__name__)
+
+class CapturedPage:
+    """
+    捕获阶段的产物：浏览器线程拿到的原始字节，尚未解码或写盘。
+    crop_box 不为 None 时（整窗截图），编码阶段会先裁剪再编码。
+    source_url 为页面图片的地址（图片元素的 src），不知道时为 None。
+    """
+    def __init__(self, page_number, data, content_type=None, crop_box=None, source="screenshot", source_url=None):
+        self.page_number = page_number
+        self.data = data
+        self.content_type = content_type
+        self.crop_box = crop_box
+        self.source = source
+        self.source_url = source_url
+
+def encode_captured_page(page):
+    """
+    编码阶段：校验/解码、裁剪并按页面输出格式编码。
+    返回 (编码后的字节, 扩展名)，内容不是有效图片时抛出 ValueError。
+    """
+    if page.crop_box is not None:
+        with Image.open(io.BytesIO(page.data)) as img:
+            return encode_page_image(img.crop(page.crop_box))
+
+    # 先只校验完整性（不解码像素），已符合输出设置或需保留原始编码的页面直接写盘
+    try:
+        with Image.open(io.BytesIO(page.data)) as img:
+            image_format = img.format
+            image_mode = img.mode
+            img.verify()
+    except Exception as e:
+        raise ValueError(f"内容不是有效图片: {e}")
+    keep_original = page.source != "screenshot" and PAGE_KEEP_SOURCE_ENCODING
+    if keep_original or not needs_reencode(image_format, image_mode):
+        extension = extension_for_format(image_format) or extension_for_content_type(page.content_type)
+        if not extension:
+            raise ValueError(f"无法识别的图片格式: {image_format}")
+        return page.data, extension
+
+    with Image.open(io.BytesIO(page.data)) as img:
+        return encode_page_image(img)
+
+class PagePipeline:
+    """
+    捕获 → 编码 → 写盘 的分阶段流水线。
+    浏览器线程只负责 submit 原始字节；解码/裁剪/编码在线程池中进行，单独的写盘线程负责落盘并更新检查点。
+    同时在途的页面数有上限，超过时 submit 会阻塞，使内存占用保持平稳。
+    任一页面在后续阶段失败都会记录下来，由 close() 的返回值反映到章节的成功标志上。
+    编码和写盘的耗时记录到 tracer。
+    """
+    def __init__(self, output_dir, checkpoint=None, encode_workers=PIPELINE_ENCODE_WORKERS, max_pending=PIPELINE_MAX_PENDING_PAGES, tracer=null_tracer):
+        self.output_dir = output_dir
+        self.checkpoint = checkpoint
+        self.tracer = tracer
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._encoder = ThreadPoolExecutor(max_workers=max(1, encode_workers), thread_name_prefix="page-encode")
+        self._write_queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="page-writer", daemon=True)
+        self._errors = {}
+        self._errors_lock = threading.Lock()
+        self._closed = False
+        self._writer.start()
+
+    @property
+    def failed(self):
+        with self._errors_lock:
+            return bool(self._errors)
+
+    def failed_pages(self):
+        with self._errors_lock:
+            return sorted(self._errors)
+
+    def submit(self, captured_page):
+        """把一页交给流水线；在途页面已满时阻塞等待。"""
+        if self._closed:
+            raise RuntimeError("流水线已关闭。")
+        self._slots.acquire()
+        try:
+            self._encoder.submit(self._encode, captured_page)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def close(self):
+        """等待所有页面写盘完成并停止后台线程。所有页面都成功时返回 True。"""
+        if not self._closed:
+            self._closed = True
+            self._encoder.shutdown(wait=True)
+            self._write_queue.put(None)
+            self._writer.join()
+        failed_pages = self.failed_pages()
+        if failed_pages:
+            logger.error(f"流水线中以下页面处理失败: {failed_pages}")
+        return not failed_pages
+
+    def _record_error(self, page_number, message):
+        logger.error(f"第 {page_number} 页：{message}")
+        with self._errors_lock:
+            self._errors[page_number] = message
+
+    def _encode(self, captured_page):
+        try:
+            with self.tracer.span("encode", captured_page.page_number) as span:
+                data, extension = encode_captured_page(captured_page)
+                span["bytes"] = len(data)
+        except Exception as e:
+            self._record_error(captured_page.page_number, f"编码失败: {e}")
+            self._slots.release()
+            return
+        self._write_queue.put((captured_page.page_number, data, extension))
+
+    def _write_loop(self):
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                break
+            page_number, data, extension = item
+            try:
+                with self.tracer.span("write", page_number):
+                    path = write_page_bytes(self.output_dir, page_number, data, extension)
+                    if self.checkpoint is not None:
+                        self.checkpoint.record_page(page_number, path, verify=False)
+                logger.info(f"第 {page_number} 页：已写入 {path} ({len(data)} 字节)")
+            except Exception as e:
+                self._record_error(page_number, f"写入失败: {e}")
+            finally:
+                self._slots.release()
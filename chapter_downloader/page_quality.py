@@ -0,0 +1,88 @@
+import io
+import logging
+import sys
+
+import numpy as np
+from PIL import Image
+
+from chapter_downloader.config import (
+    BLANK_PIXEL_TOLERANCE, BLANK_UNIFORM_RATIO, BLANK_MIN_ENTROPY,
+    DUPLICATE_HASH_DISTANCE, KNOWN_PLACEHOLDER_HASHES, PLACEHOLDER_HASH_DISTANCE
+)
+
+
+logger = logging.getLogger(__name__)
+
+# 检测时把页面缩小到的最大边长，足够判断空白/重复，又不必解码全尺寸像素
+_ANALYSIS_SIZE = 256
+
+def load_analysis_pixels(data, crop_box=None):
+    """把页面字节解码为缩小后的灰度 uint8 数组（JPEG 直接按缩小尺寸解码）。"""
+    with Image.open(io.BytesIO(data)) as img:
+        if crop_box is not None:
+            img = img.crop(crop_box)
+        else:
+            img.draft('L', (_ANALYSIS_SIZE, _ANALYSIS_SIZE))
+        gray = img.convert('L')
+    gray.thumbnail((_ANALYSIS_SIZE, _ANALYSIS_SIZE))
+    return np.asarray(gray, dtype=np.uint8)
+
+def difference_hash(pixels):
+    """64 位差值哈希 (dHash)，内容相同的页面即使编码不同哈希也几乎一致。"""
+    small = np.asarray(Image.fromarray(pixels).resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+def hash_distance(a, b):
+    return bin(a ^ b).count('1')
+
+def histogram_entropy(pixels):
+    """灰度直方图的香农熵（比特），空白或纯色页面接近 0。"""
+    counts = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    probabilities = counts[counts > 0] / counts.sum()
+    return float(-(probabilities * np.log2(probabilities)).sum())
+
+def uniform_ratio(pixels):
+    """与中位灰度相差不超过容差的像素比例。"""
+    median = int(np.median(pixels))
+    return float((np.abs(pixels.astype(np.int16) - median) <= BLANK_PIXEL_TOLERANCE).mean())
+
+class PageQualityChecker:
+    """
+    判断捕获到的页面是否为半加载的灰块、全白/纯色画面、站点的防盗链占位图，
+    或与上一页完全相同（翻页没有生效）。每章使用一个实例，以记住上一页的哈希。
+    """
+    def __init__(self, placeholder_hashes=KNOWN_PLACEHOLDER_HASHES):
+        self.placeholder_hashes = [int(h, 16) for h in placeholder_hashes]
+        self.previous_hash = None
+
+    def inspect(self, captured_page):
+        """
+        返回 (问题类型, 哈希)。问题类型为 None 表示页面正常，
+        否则为 "blank" / "placeholder" / "duplicate" / "undecodable"。
+        """
+        try:
+            pixels = load_analysis_pixels(captured_page.data, captured_page.crop_box)
+        except Exception as e:
+            logger.warning(f"第 {captured_page.page_number} 页：无法解码页面用于检测: {e}")
+            return "undecodable", None
+
+        page_hash = difference_hash(pixels)
+        if any(hash_distance(page_hash, h) <= PLACEHOLDER_HASH_DISTANCE for h in self.placeholder_hashes):
+            return "placeholder", page_hash
+        if uniform_ratio(pixels) >= BLANK_UNIFORM_RATIO or histogram_entropy(pixels) < BLANK_MIN_ENTROPY:
+            return "blank", page_hash
+        if self.previous_hash is not None and hash_distance(page_hash, self.previous_hash) <= DUPLICATE_HASH_DISTANCE:
+            return "duplicate", page_hash
+        return None, page_hash
+
+    def accept(self, page_hash):
+        """记录已接受页面的哈希，用于判断下一页是否重复。"""
+        self.previous_hash = page_hash
+
+if __name__ == "__main__":
+    # 打印图片的哈希，便于把站点的占位图加入 KNOWN_PLACEHOLDER_HASHES
+    for image_path in sys.argv[1:]:
+        with open(image_path, 'rb') as f:
+            pixels = load_analysis_pixels(f.read())
+        print(f"{difference_hash(pixels):016x}  entropy={histogram_entropy(pixels):.2f}  uniform={uniform_ratio(pixels):.3f}  {image_path}")
@@ -0,0 +1,83 @@
+import os
+import re
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# 章节目录中可能出现的页面图片格式（截图为 PNG，直接下载的原图通常为 JPEG/WebP）
+PAGE_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp')
+
+# Pillow 的格式名 / Content-Type 到文件扩展名的映射
+_EXTENSION_BY_FORMAT = {
+    'PNG': '.png',
+    'JPEG': '.jpg',
+    'WEBP': '.webp',
+    'GIF': '.gif',
+    'BMP': '.bmp',
+}
+_EXTENSION_BY_CONTENT_TYPE = {
+    'image/png': '.png',
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/webp': '.webp',
+    'image/gif': '.gif',
+    'image/bmp': '.bmp',
+}
+
+def extension_for_format(image_format):
+    """根据 Pillow 格式名返回扩展名，未知格式返回 None。"""
+    if not image_format:
+        return None
+    return _EXTENSION_BY_FORMAT.get(image_format.upper())
+
+def extension_for_content_type(content_type):
+    """根据 HTTP Content-Type 返回扩展名，未知类型返回 None。"""
+    if not content_type:
+        return None
+    return _EXTENSION_BY_CONTENT_TYPE.get(content_type.split(';')[0].strip().lower())
+
+def page_number_from_path(path):
+    """从 '12.png' 这样的文件名中取出页码，不是页面文件时返回 None。"""
+    name, ext = os.path.splitext(os.path.basename(path))
+    if ext.lower() not in PAGE_IMAGE_EXTENSIONS or not re.fullmatch(r'\d+', name):
+        return None
+    return int(name)
+
+def list_page_images(chapter_dir):
+    """
+    返回章节目录中所有页面图片的路径，按页码排序。
+    同一页码存在多个格式的文件时只保留最近写入的一个。
+    """
+    if not os.path.isdir(chapter_dir):
+        return []
+    pages = {}
+    for entry in os.listdir(chapter_dir):
+        page_number = page_number_from_path(entry)
+        if page_number is None:
+            continue
+        path = os.path.join(chapter_dir, entry)
+        previous = pages.get(page_number)
+        if previous is None or os.path.getmtime(path) > os.path.getmtime(previous):
+            pages[page_number] = path
+    return [pages[number] for number in sorted(pages)]
+
+def remove_page_files(chapter_dir, page_number, keep_path=None):
+    """删除某一页所有格式的旧文件（keep_path 除外），避免同一页在 PDF 中出现两次。"""
+    for ext in PAGE_IMAGE_EXTENSIONS:
+        path = os.path.join(chapter_dir, f"{page_number}{ext}")
+        if path != keep_path and os.path.exists(path):
+            os.remove(path)
+
+def write_page_bytes(chapter_dir, page_number, data, extension):
+    """
+    将已编码的页面图片原子地写入 '{page_number}{extension}'，并删除该页其他格式的旧文件。
+    返回写入的路径。
+    """
+    final_path = os.path.join(chapter_dir, f"{page_number}{extension}")
+    temp_path = final_path + ".part"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, final_path)
+    remove_page_files(chapter_dir, page_number, keep_path=final_path)
+    return final_path
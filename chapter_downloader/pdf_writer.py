@@ -0,0 +1,235 @@
+import io
+import logging
+import os
+import struct
+import zlib
+
+from PIL import Image, features
+
+from chapter_downloader.config import PDF_JPEG_QUALITY, PDF_RESOLUTION
+
+
+logger = logging.getLogger(__name__)
+
+_PDF_HEADER = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# 对象号 1 和 2 固定为 Catalog 和 Pages，在所有页面写完后才写出
+_CATALOG_ID = 1
+_PAGES_ID = 2
+# TIFF 标签：StripOffsets / StripByteCounts
+_TIFF_STRIP_OFFSETS = 273
+_TIFF_STRIP_BYTE_COUNTS = 279
+
+def _pdf_text(text):
+    """PDF 文本字符串：UTF-16BE（带 BOM）的十六进制形式，可以包含任意字符。"""
+    return '<FEFF' + text.encode('utf-16-be').hex().upper() + '>'
+
+def _ccitt_g4(img):
+    """把 1 位图片编码为 CCITT G4 数据（借助 libtiff 写出单条带 TIFF，再取出条带字节）。"""
+    buffer = io.BytesIO()
+    img.save(buffer, format='TIFF', compression='group4', strip_size=(img.width + 7) // 8 * img.height)
+    buffer.seek(0)
+    with Image.open(buffer) as tiff:
+        offsets = tiff.tag_v2[_TIFF_STRIP_OFFSETS]
+        counts = tiff.tag_v2[_TIFF_STRIP_BYTE_COUNTS]
+    if len(offsets) != 1:
+        raise ValueError(f"G4 编码得到 {len(offsets)} 个条带")
+    data = buffer.getvalue()
+    return data[offsets[0]:offsets[0] + counts[0]]
+
+def encode_pdf_image(img):
+    """
+    把一页图片编码为 PDF 图像 XObject。
+    返回 (图像字典条目, 流数据)；只接受 pdf_page_image 产生的 1 / L / RGB 模式。
+    """
+    width, height = img.size
+    entries = [f"/Width {width}", f"/Height {height}"]
+    if img.mode == '1':
+        entries += ["/ColorSpace /DeviceGray", "/BitsPerComponent 1"]
+        if features.check('libtiff'):
+            # Pillow 以 MinIsBlack 写出 1 位 TIFF，G4 数据中的“白色”行程实际为黑色，解码参数与 Pillow 的 PDF 插件相同
+            entries += [
+                "/Filter /CCITTFaxDecode",
+                f"/DecodeParms << /K -1 /Columns {width} /Rows {height} /BlackIs1 true >>"
+            ]
+            return entries, _ccitt_g4(img)
+        entries.append("/Filter /FlateDecode")
+        return entries, zlib.compress(img.tobytes())
+    if img.mode not in ('L', 'RGB'):
+        raise ValueError(f"不支持嵌入 PDF 的图片模式: {img.mode}")
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=PDF_JPEG_QUALITY)
+    color_space = "/DeviceGray" if img.mode == 'L' else "/DeviceRGB"
+    entries += [f"/ColorSpace {color_space}", "/BitsPerComponent 8", "/Filter /DCTDecode"]
+    return entries, buffer.getvalue()
+
+def _jpeg_passthrough(data):
+    """JPEG 文件本身就是 DCTDecode 流；Pillow 只读取文件头取得尺寸和颜色模式，不解码像素。"""
+    with Image.open(io.BytesIO(data)) as img:
+        if img.format != 'JPEG' or img.mode not in ('L', 'RGB'):
+            # CMYK JPEG 的反相约定因编码器而异，交给解码路径处理
+            return None
+        width, height = img.size
+        color_space = "/DeviceGray" if img.mode == 'L' else "/DeviceRGB"
+    entries = [f"/Width {width}", f"/Height {height}", f"/ColorSpace {color_space}", "/BitsPerComponent 8", "/Filter /DCTDecode"]
+    return width, height, entries, data
+
+def _png_passthrough(data):
+    """
+    PNG 的 IDAT 数据是带逐行预测的 zlib 流，拼接后以 FlateDecode + Predictor 15 直接嵌入。
+    只处理非隔行、无透明度的灰度（1/2/4/8 位）、8 位 RGB 和调色板图片。
+    """
+    header = None
+    palette = None
+    idat = []
+    position = len(_PNG_SIGNATURE)
+    while position + 8 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        position += 12 + length
+        if chunk_type == b'IHDR':
+            header = struct.unpack('>IIBBBBB', body)
+        elif chunk_type == b'PLTE':
+            palette = body
+        elif chunk_type == b'tRNS':
+            return None
+        elif chunk_type == b'IDAT':
+            idat.append(body)
+        elif chunk_type == b'IEND':
+            break
+    if header is None or not idat:
+        return None
+
+    width, height, bit_depth, color_type, compression, filter_method, interlace = header
+    if compression or filter_method or interlace:
+        return None
+    if color_type == 0 and bit_depth in (1, 2, 4, 8):
+        colors, color_space = 1, "/DeviceGray"
+    elif color_type == 2 and bit_depth == 8:
+        colors, color_space = 3, "/DeviceRGB"
+    elif color_type == 3 and palette:
+        colors, color_space = 1, f"[/Indexed /DeviceRGB {len(palette) // 3 - 1} <{palette.hex().upper()}>]"
+    else:
+        return None
+    entries = [
+        f"/Width {width}", f"/Height {height}", f"/ColorSpace {color_space}", f"/BitsPerComponent {bit_depth}",
+        "/Filter /FlateDecode",
+        f"/DecodeParms << /Predictor 15 /Colors {colors} /BitsPerComponent {bit_depth} /Columns {width} >>"
+    ]
+    return width, height, entries, b''.join(idat)
+
+def passthrough_pdf_image(data):
+    """
+    不解码像素、直接把已压缩的页面文件嵌入 PDF：JPEG 作为 DCT 流，PNG 的 IDAT 作为 Flate 流。
+    返回 (宽, 高, 图像字典条目, 流数据)，无法直接嵌入的格式（WebP、带透明度的 PNG 等）返回 None。
+    """
+    if data.startswith(_PNG_SIGNATURE):
+        return _png_passthrough(data)
+    if data.startswith(b'\xff\xd8'):
+        return _jpeg_passthrough(data)
+    return None
+
+class StreamingPdfWriter:
+    """
+    逐页追加的 PDF 写入器：每页的图像在 add_page 时立即编码并写入文件，
+    内存中只保留各对象的文件偏移，所以峰值内存只与一页相当，与章节页数无关。
+    先写入 <路径>.tmp，close() 写出页面树和交叉引用表后才替换为目标文件；
+    出错时调用 abort()（或在 with 块中抛出异常）会删除未完成的文件。
+    """
+    def __init__(self, output_path, resolution=PDF_RESOLUTION, title=None):
+        self.output_path = output_path
+        self.resolution = resolution
+        self.title = title if title is not None else os.path.splitext(os.path.basename(output_path))[0]
+        self._temp_path = output_path + ".tmp"
+        self._file = open(self._temp_path, 'wb')
+        self._file.write(_PDF_HEADER)
+        self._offsets = {}
+        self._next_id = _PAGES_ID + 1
+        self._page_ids = []
+
+    @property
+    def page_count(self):
+        return len(self._page_ids)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def _allocate_id(self):
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def _write_object(self, object_id, body):
+        self._offsets[object_id] = self._file.tell()
+        self._file.write(f"{object_id} 0 obj\n{body}\nendobj\n".encode('ascii'))
+
+    def _write_stream(self, object_id, entries, stream):
+        self._offsets[object_id] = self._file.tell()
+        dictionary = " ".join(list(entries) + [f"/Length {len(stream)}"])
+        self._file.write(f"{object_id} 0 obj\n<< {dictionary} >>\nstream\n".encode('ascii'))
+        self._file.write(stream)
+        self._file.write(b"\nendstream\nendobj\n")
+
+    def add_image_page(self, width, height, image_entries, image_stream):
+        """追加一页已编码的图像（image_entries 为图像字典条目，不含 /Type、/Subtype 和 /Length）。"""
+        image_id = self._allocate_id()
+        self._write_stream(image_id, ["/Type /XObject", "/Subtype /Image"] + list(image_entries), image_stream)
+
+        page_width = width * 72.0 / self.resolution
+        page_height = height * 72.0 / self.resolution
+        contents = f"q {page_width:.4f} 0 0 {page_height:.4f} 0 0 cm /Im0 Do Q\n".encode('ascii')
+        contents_id = self._allocate_id()
+        self._write_stream(contents_id, [], contents)
+
+        page_id = self._allocate_id()
+        self._write_object(page_id, (
+            f"<< /Type /Page /Parent {_PAGES_ID} 0 R /MediaBox [0 0 {page_width:.4f} {page_height:.4f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {contents_id} 0 R >>"
+        ))
+        self._page_ids.append(page_id)
+
+    def add_page(self, img):
+        """编码并追加一页（1 / L / RGB 模式的 PIL 图片），调用方随后即可释放该图片。"""
+        entries, stream = encode_pdf_image(img)
+        self.add_image_page(img.width, img.height, entries, stream)
+
+    def close(self):
+        """写出页面树、文档信息和交叉引用表，并把临时文件替换为目标文件。"""
+        if self._file is None:
+            return
+        if not self._page_ids:
+            self.abort()
+            raise ValueError("PDF 中没有任何页面")
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_object(_PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>")
+        self._write_object(_CATALOG_ID, f"<< /Type /Catalog /Pages {_PAGES_ID} 0 R >>")
+        info_id = self._allocate_id()
+        self._write_object(info_id, f"<< /Title {_pdf_text(self.title)} >>")
+
+        xref_offset = self._file.tell()
+        lines = [f"xref\n0 {self._next_id}\n", "0000000000 65535 f \n"]
+        lines.extend(f"{self._offsets[object_id]:010d} 00000 n \n" for object_id in range(1, self._next_id))
+        lines.append(f"trailer\n<< /Size {self._next_id} /Root {_CATALOG_ID} 0 R /Info {info_id} 0 R >>\n")
+        lines.append(f"startxref\n{xref_offset}\n%%EOF\n")
+        self._file.write("".join(lines).encode('ascii'))
+        self._file.close()
+        self._file = None
+        os.replace(self._temp_path, self.output_path)
+
+    def abort(self):
+        """放弃写入并删除临时文件。"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        try:
+            os.remove(self._temp_path)
+        except OSError as e:
+            logger.warning(f"无法删除未完成的 PDF 文件 '{self._temp_path}': {e}")
@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+
+from chapter_downloader.config import BLOCKING_PROFILES, BLOCKING_LEARNED_FILE
+
+
+logger = logging.getLogger(__name__)
+
+# 资源类型到 URL 通配符的映射（setBlockedURLs 只能按 URL 匹配，资源类型按文件后缀近似）
+_RESOURCE_TYPE_PATTERNS = {
+    "font": ("*.woff*", "*.ttf*", "*.otf*", "*.eot*"),
+    "media": ("*.mp4*", "*.webm*", "*.mp3*", "*.m3u8*", "*.ogg*"),
+    "stylesheet": ("*.css*",)
+}
+
+def _host_of(url):
+    try:
+        return (urlsplit(url).hostname or "").lower()
+    except ValueError:
+        return ""
+
+def _matches_domain(host, domains):
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+def _domain_patterns(domain):
+    return (f"*://{domain}/*", f"*://*.{domain}/*")
+
+class BlockingProfile:
+    """
+    一个站点的请求拦截规则，编译为 Network.setBlockedURLs 的通配符列表。
+    block_third_party 开启时，章节中放行过的第三方主机（完整主机名，不归并为上级域名）会加入拦截列表
+    （并保存到磁盘），从下一章开始生效；提供过页面图片的主机不会被学习。
+    allow_domains_only 开启时，支持按请求拦截的后端（playwright）拦截 allow_domains 之外的全部非图片请求。
+    """
+    def __init__(self, name, hosts=(), allow_domains=(), block_domains=(), block_resource_types=(),
+                 block_url_patterns=(), block_third_party=False, allow_domains_only=False,
+                 learned_file=BLOCKING_LEARNED_FILE):
+        self.name = name
+        self.hosts = tuple(hosts)
+        self.allow_domains = tuple(allow_domains)
+        self.block_domains = tuple(block_domains)
+        self.block_resource_types = tuple(block_resource_types)
+        self.block_url_patterns = tuple(block_url_patterns)
+        self.block_third_party = block_third_party
+        self.allow_domains_only = allow_domains_only and bool(self.allow_domains)
+        self.learned_file = learned_file
+        self.learned_domains = set()
+        self._lock = threading.Lock()
+        if self.block_third_party:
+            self._load_learned()
+
+    def applies_to(self, url):
+        return _matches_domain(_host_of(url), self.hosts)
+
+    def is_allowed(self, url):
+        """URL 的主机是否在 allow_domains 中（没有主机的 data:/blob: 地址总是允许）。"""
+        host = _host_of(url)
+        return not host or _matches_domain(host, self.allow_domains)
+
+    def url_patterns(self):
+        """当前需要拦截的 URL 通配符列表。"""
+        with self._lock:
+            learned_hosts = sorted(self.learned_domains - set(self.block_domains))
+        patterns = []
+        for domain in self.block_domains:
+            patterns.extend(_domain_patterns(domain))
+        # 学到的是完整主机名，只拦截该主机本身
+        patterns.extend(f"*://{host}/*" for host in learned_hosts)
+        for resource_type in self.block_resource_types:
+            patterns.extend(_RESOURCE_TYPE_PATTERNS.get(resource_type, ()))
+        patterns.extend(self.block_url_patterns)
+        return patterns
+
+    def start_chapter(self):
+        """返回记录本章命中/未命中情况的 BlockingStats，由调用方把它的 observe 注册到 NetworkResponseLog。"""
+        return BlockingStats(self)
+
+    def learn(self, host):
+        """把放行过的第三方主机加入拦截列表，返回是否为新主机。"""
+        if not self.block_third_party or _matches_domain(host, self.allow_domains):
+            return False
+        with self._lock:
+            if host in self.learned_domains:
+                return False
+            self.learned_domains.add(host)
+        logger.info(f"拦截规则 '{self.name}'：新增拦截第三方主机 {host}")
+        return True
+
+    def _load_learned(self):
+        if not os.path.exists(self.learned_file):
+            return
+        try:
+            with open(self.learned_file, 'r', encoding='utf-8') as f:
+                self.learned_domains = set(json.load(f).get(self.name, []))
+        except Exception as e:
+            logger.warning(f"读取已学习的拦截域名 '{self.learned_file}' 失败: {e}")
+
+    def save_learned(self):
+        # 多个工作进程可能同时写，先合并磁盘上已有的内容
+        try:
+            state = {}
+            if os.path.exists(self.learned_file):
+                with open(self.learned_file, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            with self._lock:
+                self.learned_domains |= set(state.get(self.name, []))
+                state[self.name] = sorted(self.learned_domains)
+            os.makedirs(os.path.dirname(self.learned_file), exist_ok=True)
+            temp_path = f"{self.learned_file}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.learned_file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"保存已学习的拦截域名 '{self.learned_file}' 失败: {e}")
+
+class BlockingStats:
+    """
+    一章内的拦截统计：命中为被拦截的请求，未命中为放行的第三方请求（不在 allow_domains 中）。
+    observe 作为 NetworkResponseLog 的监听器接收 CDP 网络事件；捕获到的页面通过 mark_required 登记其图片地址，
+    这些主机在章节结束学习第三方主机时被排除。
+    """
+    def __init__(self, profile):
+        self.profile = profile
+        self.hits = Counter()   # (资源类型, 主机) -> 请求数
+        self.misses = Counter()
+        self._pending = {}
+        self._required_hosts = set()
+
+    def observe(self, method, params):
+        if method == 'Network.requestWillBeSent':
+            host = _host_of(params['request']['url'])
+            if host and not _matches_domain(host, self.profile.allow_domains):
+                self._pending[params['requestId']] = (params.get('type', 'Other'), host)
+        elif method == 'Network.loadingFailed':
+            request = self._pending.pop(params['requestId'], None)
+            if request is not None and params.get('blockedReason'):
+                self.hits[request] += 1
+        elif method == 'Network.loadingFinished':
+            request = self._pending.pop(params['requestId'], None)
+            if request is not None:
+                self.misses[request] += 1
+
+    def mark_required(self, url):
+        """登记提供页面图片的地址（#mangaFile 的 src 或读取过响应体的请求），其主机不会被学习为拦截对象。"""
+        host = _host_of(url) if url else ""
+        if host:
+            self._required_hosts.add(host)
+
+    def finish(self):
+        """输出本章的拦截统计，并学习、保存本章放行过的第三方主机。"""
+        name = self.profile.name
+        if self.hits:
+            details = ", ".join(f"{host}[{resource_type}]×{count}" for (resource_type, host), count in self.hits.most_common(10))
+            logger.info(f"拦截规则 '{name}'：本章拦截 {sum(self.hits.values())} 个请求: {details}")
+        if self.misses:
+            details = ", ".join(f"{host}[{resource_type}]×{count}" for (resource_type, host), count in self.misses.most_common(10))
+            logger.info(f"拦截规则 '{name}'：本章放行 {sum(self.misses.values())} 个第三方请求: {details}")
+        # 学习放到章节结束时进行，图片主机的请求可能早于对应页面被捕获
+        learned = False
+        for host in {host for _, host in self.misses} - self._required_hosts:
+            if self.profile.learn(host):
+                learned = True
+        if learned:
+            self.profile.save_learned()
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+def blocking_profile_for_url(url):
+    """返回适用于该 URL 的拦截规则（同一进程内共享），没有配置时返回 None。"""
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            _profiles = [BlockingProfile(name, **options) for name, options in BLOCKING_PROFILES.items()]
+    for profile in _profiles:
+        if profile.applies_to(url):
+            return profile
+    return None
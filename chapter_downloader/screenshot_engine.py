@@ -1,19 +1,25 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.edge.service import Service as EdgeService
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException, ElementClickInterceptedException
 from PIL import Image
-import time
 import os
-import re # 用于从URL提取数字
 import logging
 import io # 用于 BytesIO
-import shutil # 用于检查浏览器可执行文件
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from chapter_downloader.config import (
+    PAGE_CAPTURE_STRATEGIES, SCREENSHOT_USE_CDP_CLIP, SCREENSHOT_TILED_CAPTURE, SCREENSHOT_TILE_MIN_PAGE_HEIGHT,
+    PAGE_NAVIGATION_MODE, PAGE_QUALITY_CHECK, PAGE_RECAPTURE_ATTEMPTS, BLOCKING_STATS,
+    CHAPTER_SPLIT_SESSIONS, CHAPTER_SPLIT_MIN_PAGES
+)
+from chapter_downloader.backends import SessionError, SessionTimeout, create_capture_backend
+from chapter_downloader.pacing import default_pacing
+from chapter_downloader.image_source import fetch_page_from_image_source
+from chapter_downloader.request_blocking import blocking_profile_for_url
+from chapter_downloader.page_pipeline import CapturedPage, PagePipeline
+from chapter_downloader.page_encoding import screenshot_capture_format
+from chapter_downloader.tiled_capture import capture_tiled
+from chapter_downloader.checkpoint import ChapterCheckpoint
+from chapter_downloader.page_quality import PageQualityChecker
+from chapter_downloader.tracing import null_tracer, open_chapter_tracer
 
 # 配置日志记录
 logging.basicConfig(
@@ -25,395 +31,581 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def detect_browsers():
+def capture_single_page_image(
+    session,
+    image_id,
+    vertical_offset_compensation,
+    page_number,
+    quality_checker=None,
+    tracer=null_tracer
+):
     """
-    检测系统中可用的浏览器
-    返回: {'chrome': path_or_none, 'edge': path_or_none}
+    捕获当前显示的页面（流水线的捕获阶段）。
+    传入 quality_checker 时会检测空白/占位图/重复页面，并在 PAGE_RECAPTURE_ATTEMPTS 次内重新捕获。
+    刷新后仍与上一页相同、且阅读器确认停留在本页时，按内容相同的相邻页面保存。
+    各阶段的耗时记录到 tracer。
+    成功时返回尚未写盘的 CapturedPage，失败返回 None。
     """
-    browsers = {'chrome': None, 'edge': None}
-
-    # 常见的浏览器路径 (Windows)
-    possible_paths = {
-        'chrome': [
-            r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-            r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
-            os.path.expanduser(r"~\AppData\Local\Google\Chrome\Application\chrome.exe")
-        ],
-        'edge': [
-            r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe",
-            r"C:\Program Files\Microsoft\Edge\Application\msedge.exe",
-            os.path.expanduser(r"~\AppData\Local\Microsoft\Edge\Application\msedge.exe")
-        ]
-    }
-
-    for browser, paths in possible_paths.items():
-        for path in paths:
-            if os.path.exists(path):
-                browsers[browser] = path
-                break
-
-    return browsers
+    captured_page = _capture_page_once(session, image_id, vertical_offset_compensation, page_number, tracer)
+    if not captured_page or quality_checker is None:
+        return captured_page
+
+    blank_hashes = []
+    reloaded = False
+    for attempt in range(PAGE_RECAPTURE_ATTEMPTS + 1):
+        with tracer.span("quality_check", page_number) as span:
+            problem, page_hash = quality_checker.inspect(captured_page)
+            span["problem"] = problem
+        if problem is None:
+            quality_checker.accept(page_hash)
+            return captured_page
+        if problem == "blank":
+            blank_hashes.append(page_hash)
+        # 刷新后仍与上一页相同，而阅读器确实显示本页时，说明相邻两页的内容本来就相同（例如重复的过渡页）
+        if problem == "duplicate" and reloaded and session.read_page_state()[0] == page_number:
+            logger.warning(f"第 {page_number} 页：刷新后仍与上一页相同，阅读器确认位于第 {page_number} 页，按内容相同的页面保存。")
+            quality_checker.accept(page_hash)
+            return captured_page
+        if attempt == PAGE_RECAPTURE_ATTEMPTS:
+            break
+
+        logger.warning(f"第 {page_number} 页：检测到异常页面 ({problem})，第 {attempt + 1}/{PAGE_RECAPTURE_ATTEMPTS} 次重新捕获。")
+        # 第一次直接重新捕获；之后（以及最后一次）先刷新页面，保证重复页面至少在刷新后检测过一次
+        if attempt > 0 or attempt == PAGE_RECAPTURE_ATTEMPTS - 1:
+            with tracer.span("reload", page_number):
+                reloaded = reload_current_page(session, image_id, page_number)
+            if not reloaded:
+                return None
+        captured_page = _capture_page_once(session, image_id, vertical_offset_compensation, page_number, tracer)
+        if not captured_page:
+            return None
+
+    # 每次重新捕获都得到完全相同的空白画面时，认为这一页本身就是空白页
+    if len(blank_hashes) == PAGE_RECAPTURE_ATTEMPTS + 1 and len(set(blank_hashes)) == 1:
+        logger.warning(f"第 {page_number} 页：多次捕获均为相同的空白画面，按空白页保存。")
+        quality_checker.accept(blank_hashes[-1])
+        return captured_page
+
+    logger.error(f"第 {page_number} 页：重新捕获 {PAGE_RECAPTURE_ATTEMPTS} 次后页面仍异常 ({problem})。")
+    return None
+
+def is_chapter_end(session, page_number):
+    """page_number 是否确实是最后一页：阅读器的总页数不大于它，或“下一页”已被禁用。"""
+    _, total_pages = session.read_page_state()
+    if total_pages and page_number >= total_pages:
+        return True
+    return session.is_last_page()
+
+def reload_current_page(session, image_id, page_number):
+    """刷新阅读器并确认仍停留在 page_number 页（URL 中带有 #p=N）。"""
+    logger.info(f"第 {page_number} 页：刷新页面后重新捕获。")
+    session.reload(image_id)
+    current_page, _ = session.read_page_state()
+    if current_page is not None and current_page != page_number:
+        logger.warning(f"刷新后阅读器显示第 {current_page} 页，而不是第 {page_number} 页。")
+        return False
+    return True
 
-# 全局变量存储用户选择的浏览器，避免重复询问
-_selected_browser = None
+# 不经截图、直接取得页面原图的捕获方式（按 PAGE_CAPTURE_STRATEGIES 中的顺序尝试）
+_DIRECT_PAGE_FETCHERS = {
+    "network": lambda session, probe, page_number: session.fetch_network_page(probe, page_number),
+    "source": fetch_page_from_image_source
+}
 
-def select_browser():
+def probe_page_image(session, image_id, page_number, isolate=False):
     """
-    检测并选择要使用的浏览器
-    记住用户的选择，避免重复询问
-    返回: ('chrome' 或 'edge', driver_manager)
+    通过一次脚本调用等待图片就绪并取得页面几何信息（见 reader_scripts.PROBE_PAGE_JS）。
+    返回字典；等待超时返回 None。字典中 ready 为 False 表示图片加载失败或尺寸无效。
     """
-    global _selected_browser
-    from metadata.utils import get_user_input
-
-    # 如果已经选择过，直接返回
-    if _selected_browser is not None:
-        return _selected_browser, None
-
-    browsers = detect_browsers()
-    available_browsers = {k: v for k, v in browsers.items() if v is not None}
-
-    if not available_browsers:
-        logger.error("未检测到 Chrome 或 Edge 浏览器。请安装其中一个浏览器后重试。")
-        logger.info("下载链接：")
-        logger.info("- Chrome: https://www.google.com/chrome/")
-        logger.info("- Edge: https://www.microsoft.com/en-us/edge")
-        return None, None
-
-    if len(available_browsers) == 1:
-        browser = list(available_browsers.keys())[0]
-        logger.info(f"检测到唯一可用的浏览器: {browser.capitalize()}")
-        _selected_browser = browser
-        return browser, None
-
-    # 两个浏览器都可用，让用户选择（只在第一次运行时）
-    logger.info("检测到多个可用浏览器:")
-    for i, (browser, path) in enumerate(available_browsers.items(), 1):
-        logger.info(f"{i}. {browser.capitalize()} ({path})")
-
-    while True:
-        choice = get_user_input("请选择要使用的浏览器 (输入对应的编号 1 或 2): ", valid_inputs=['1', '2'])
-        try:
-            choice_idx = int(choice) - 1
-            if 0 <= choice_idx < len(available_browsers):
-                selected_browser = list(available_browsers.keys())[choice_idx]
-                logger.info(f"已选择: {selected_browser.capitalize()}")
-                _selected_browser = selected_browser  # 记住选择
-                return selected_browser, None
-        except ValueError:
-            continue
+    logger.info(f"第 {page_number} 页：等待图片加载并解码完成{'（隔离元素）' if isolate else ''}。")
+    probe = session.probe_page(image_id, page_number, isolate)
+    if probe is None:
+        logger.warning(f"第 {page_number} 页：等待图片加载超时。")
+        return None
+    if not probe['ready']:
+        logger.warning(f"第 {page_number} 页：图片加载失败或尺寸无效。截图可能不完整。")
+    if isolate and not probe['isolated']:
+        logger.warning(f"第 {page_number} 页：JS隔离失败，已改为滚动到图片。")
+    return probe
+
+def _capture_page_once(session, image_id, vertical_offset_compensation, page_number, tracer=null_tracer):
+    try:
+        probe = None
+        direct_strategies = [name for name in PAGE_CAPTURE_STRATEGIES if name in _DIRECT_PAGE_FETCHERS]
+        if direct_strategies:
+            # 直接取得原图不需要隔离元素或调整窗口，只需等待图片加载完成以拿到最终的 src
+            with tracer.span("probe", page_number):
+                probe = probe_page_image(session, image_id, page_number)
+            if probe and probe['ready']:
+                for strategy in direct_strategies:
+                    try:
+                        with tracer.span(f"fetch_{strategy}", page_number) as span:
+                            captured_page = _DIRECT_PAGE_FETCHERS[strategy](session, probe, page_number)
+                            span["bytes"] = len(captured_page.data) if captured_page else 0
+                        if captured_page:
+                            return captured_page
+                    except Exception as e:
+                        logger.warning(f"第 {page_number} 页：通过 {strategy} 方式取得原图时出错: {e}")
+            if "screenshot" not in PAGE_CAPTURE_STRATEGIES:
+                logger.error(f"第 {page_number} 页：未能直接取得原图，且未启用截图回退。")
+                return None
+            logger.info(f"第 {page_number} 页：未能直接取得原图，回退到截图。")
+
+        # 隔离元素、等待解码和重新布局、测量位置在同一次调用中完成
+        with tracer.span("probe_isolated", page_number):
+            probe = probe_page_image(session, image_id, page_number, isolate=True)
+        if probe is None:
+            return None
+        rect = probe['rect']
+        logger.info(f"第 {page_number} 页：图片位置与尺寸: {rect}")
+        if rect['width'] == 0 or rect['height'] == 0:
+            logger.error(f"第 {page_number} 页：无效的图片尺寸: {rect}。跳过此页。")
+            return None
+
+        if SCREENSHOT_TILED_CAPTURE and rect['height'] > SCREENSHOT_TILE_MIN_PAGE_HEIGHT:
+            try:
+                with tracer.span("screenshot_tiles", page_number) as span:
+                    captured_page = capture_tiled(session, probe, vertical_offset_compensation, page_number)
+                    span["bytes"] = len(captured_page.data) if captured_page else 0
+                if captured_page:
+                    return captured_page
+                logger.warning(f"第 {page_number} 页：分块截图失败，回退到单次截图。")
+            except SessionError as e:
+                logger.warning(f"第 {page_number} 页：分块截图失败，回退到单次截图: {e}")
+
+        if SCREENSHOT_USE_CDP_CLIP:
+            try:
+                screenshot_format, screenshot_quality = screenshot_capture_format()
+                with tracer.span("screenshot_clip", page_number) as span:
+                    screenshot_bytes = session.capture_clip(
+                        rect, vertical_offset_compensation, screenshot_format, screenshot_quality
+                    )
+                    span["bytes"] = len(screenshot_bytes) if screenshot_bytes else 0
+                if screenshot_bytes:
+                    logger.info(f"第 {page_number} 页：已获取元素截图 ({len(screenshot_bytes)} 字节)")
+                    return CapturedPage(
+                        page_number, screenshot_bytes, content_type=f"image/{screenshot_format}", source_url=probe.get('src')
+                    )
+                logger.warning(f"第 {page_number} 页：CDP 元素截图返回空结果，回退到整窗截图。")
+            except SessionError as e:
+                logger.warning(f"第 {page_number} 页：CDP 元素截图失败，回退到整窗截图: {e}")
+
+        return capture_full_window_crop(session, image_id, probe, vertical_offset_compensation, page_number, tracer)
+
+    except SessionTimeout:
+        logger.error(f"第 {page_number} 页：图片捕获过程中超时。", exc_info=True)
+        return None
+    except Exception as e:
+        logger.error(f"第 {page_number} 页：捕获图片时发生错误: {e}", exc_info=True)
+        return None
 
-def isolate_element_js(driver, element_id):
-    script = """
-        var targetElement = document.getElementById(arguments[0]);
-        if (!targetElement) {
-            console.error('目标元素 ' + arguments[0] + ' 在隔离时未找到。');
-            return false;
-        }
-        var bodyChildren = document.body.children;
-        for (var i = 0; i < bodyChildren.length; i++) {
-            bodyChildren[i].style.setProperty('display', 'none', 'important');
-        }
-        var current = targetElement;
-        var pathElements = [];
-        while (current && current !== document.body) {
-            pathElements.push(current);
-            current = current.parentElement;
-        }
-        pathElements.forEach(function(el) {
-            el.style.setProperty('display', '', '');
-            el.style.setProperty('visibility', 'visible', 'important');
-            if (el.parentElement) {
-                 el.parentElement.style.overflow = 'visible';
-            }
-        });
-        document.body.style.setProperty('display', '', '');
-        document.body.style.setProperty('visibility', 'visible', 'important');
-        document.body.style.overflow = 'visible';
-        if (document.documentElement) {
-            document.documentElement.style.setProperty('display', '', '');
-            document.documentElement.style.setProperty('visibility', 'visible', 'important');
-            document.documentElement.style.overflow = 'visible';
-        }
-        targetElement.scrollIntoView({block: 'center', inline: 'center'});
-        return true;
+def capture_full_window_crop(session, image_id, probe, vertical_offset_compensation, page_number, tracer=null_tracer):
+    """
+    旧的截图方式：把窗口放大到能容纳整个图片，截取整个窗口，由流水线的编码阶段裁剪出图片区域。
+    仅在浏览器不支持 CDP 元素截图时使用。probe 为 probe_page_image 的结果。
+    """
+    rect = probe['rect']
+    element_bottom_css = rect['y'] + rect['height']
+    
+    page_height_to_set = max(probe['docHeight'], element_bottom_css + 200, 3000)
+    page_width_to_set = max(probe['docWidth'], probe['windowWidth'], rect['x'] + rect['width'] + 100)
+
+    if probe['windowWidth'] != page_width_to_set or probe['windowHeight'] != page_height_to_set:
+        logger.info(f"第 {page_number} 页：调整窗口大小为 {page_width_to_set}x{page_height_to_set}")
+        with tracer.span("resize", page_number):
+            session.set_window_size(page_width_to_set, page_height_to_set)
+            # 重新测量（窗口变化后布局可能改变），同时等待新尺寸下的绘制完成
+            probe = probe_page_image(session, image_id, page_number)
+        if probe is None:
+            return None
+        rect = probe['rect']
+
+    dpr = float(probe['dpr']) if probe['dpr'] else 1.0
+    logger.info(f"第 {page_number} 页：设备像素比 (DPR): {dpr}")
+
+    logger.info(f"第 {page_number} 页：正在进行截图。")
+    with tracer.span("screenshot_window", page_number) as span:
+        screenshot_bytes = session.screenshot_window()
+        span["bytes"] = len(screenshot_bytes)
+    with Image.open(io.BytesIO(screenshot_bytes)) as img:
+        screenshot_width, screenshot_height = img.size # 只读取文件头，不解码像素
+    logger.info(f"第 {page_number} 页：完整截图尺寸 (物理像素): {screenshot_width}x{screenshot_height}")
+
+    compensated_top_css = rect['y'] - vertical_offset_compensation
+    left_phys = int(rect['x'] * dpr)
+    top_phys = int(compensated_top_css * dpr)
+    right_phys = int((rect['x'] + rect['width']) * dpr)
+    bottom_phys = int((compensated_top_css + rect['height']) * dpr)
+
+    crop_left = max(0, left_phys)
+    crop_top = max(0, top_phys)
+    crop_right = min(screenshot_width, right_phys)
+    crop_bottom = min(screenshot_height, bottom_phys)
+
+    if crop_left >= crop_right or crop_top >= crop_bottom:
+        logger.error(f"第 {page_number} 页：无效的裁剪区域: 左{crop_left} 上{crop_top} 右{crop_right} 下{crop_bottom}。跳过裁剪。")
+        return None
+
+    logger.info(f"第 {page_number} 页：裁剪区域: 左{crop_left} 上{crop_top} 右{crop_right} 下{crop_bottom}")
+    return CapturedPage(
+        page_number, screenshot_bytes, crop_box=(crop_left, crop_top, crop_right, crop_bottom), source_url=probe.get('src')
+    )
+
+def open_chapter_at_page(session, start_url, image_id, page_number):
+    """
+    打开章节并定位到指定页面（通过 manhuagui 的 #p=N 页面片段）。
+    返回实际所在的页码；阅读器没有跳到目标页时从第 1 页开始。
+    """
+    if page_number > 1:
+        target_url = f"{start_url.split('#')[0]}#p={page_number}"
+        logger.info(f"根据检查点从第 {page_number} 页继续: {target_url}")
+    else:
+        target_url = start_url
+        logger.info(f"正在访问起始URL: {start_url}")
+    session.navigate(target_url, image_id)
+    logger.info("初始页面已加载。")
+
+    if page_number > 1:
+        current_page, _ = session.read_page_state()
+        if current_page != page_number:
+            logger.warning(f"阅读器未跳转到第 {page_number} 页 (当前: {current_page})，从第 1 页开始。")
+            session.navigate(start_url, image_id)
+            return 1
+    return page_number
+
+def go_to_page(session, image_id, page_number, tracer=null_tracer):
+    """
+    直接跳转到章节的第 page_number 页并等待新图片出现。
+    跳转后阅读器显示的页码与目标不符或等待超时时返回 False，调用方应回退到点击“下一页”。
     """
     try:
-        success = driver.execute_script(script, element_id)
-        if success:
-            logger.info(f"已尝试通过JavaScript隔离元素 '{element_id}' 并将其滚动到视图中。")
-        else:
-            logger.warning(f"JavaScript隔离元素 '{element_id}' 失败：脚本返回false。")
-        return success
-    except Exception as e:
-        logger.error(f"执行JavaScript隔离元素 '{element_id}' 时出错: {e}", exc_info=True)
+        with tracer.span("goto", page_number):
+            method = session.jump_to_page(image_id, page_number)
+    except SessionTimeout:
+        logger.warning(f"跳转到第 {page_number} 页后等待新图片超时。")
+        return False
+    except SessionError as e:
+        logger.warning(f"跳转到第 {page_number} 页时出错: {e}")
         return False
 
-def capture_single_page_image(
-    driver,
-    wait,
-    image_id,
-    vertical_offset_compensation,
-    output_dir,
-    page_number
+    current_page, _ = session.read_page_state()
+    if current_page is not None and current_page != page_number:
+        logger.warning(f"通过 {method} 跳转后阅读器显示第 {current_page} 页，而不是第 {page_number} 页。")
+        return False
+    logger.info(f"已通过 {method} 跳转到第 {page_number} 页。")
+    return True
+
+def _plan_page_slices(missing_pages, slice_count):
+    """把待捕获的页码按顺序分成 slice_count 段连续的区间 [(首页, 末页), ...]，各段页数尽量相等。"""
+    slices = []
+    base, extra = divmod(len(missing_pages), slice_count)
+    index = 0
+    for i in range(slice_count):
+        size = base + (1 if i < extra else 0)
+        if size == 0:
+            continue
+        slices.append((missing_pages[index], missing_pages[index + size - 1]))
+        index += size
+    return slices
+
+def _capture_page_slice(
+    session, image_id, vertical_offset_compensation, first_page, last_page,
+    checkpoint, pipeline, pacing, tracer, stop_event, blocking_stats=None
 ):
-    try:
-        logger.info(f"第 {page_number} 页：等待图片元素 '{image_id}' 存在且可见。")
-        image_element = wait.until(EC.visibility_of_element_located((By.ID, image_id)))
-        
-        if not isolate_element_js(driver, image_id):
-            logger.warning(f"第 {page_number} 页：JS隔离失败。尝试手动滚动。")
-            driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'center'});", image_element)
-            time.sleep(0.5)
+    """
+    在已显示 first_page 的会话中按页码跳转，捕获 first_page..last_page 中检查点里缺少的页面。
+    返回 (是否成功, 捕获的页数)；stop_event 被设置（其他段已失败）时提前停止。
+    blocking_stats 为该会话的拦截统计（只有章节的主会话有），捕获到的页面图片地址会登记到其中。
+    """
+    quality_checker = PageQualityChecker() if PAGE_QUALITY_CHECK else None # 重复页检测只与本段的上一页比较
+    current_page_number = first_page
+    pages_processed = 0
+    while not stop_event.is_set():
+        if not checkpoint.is_page_done(current_page_number):
+            logger.info(f"--- 正在处理第 {current_page_number} 页 (本段 {first_page}-{last_page}) ---")
+            captured_page = capture_single_page_image(
+                session, image_id, vertical_offset_compensation, current_page_number, quality_checker, tracer
+            )
+            if not captured_page:
+                logger.warning(f"捕获第 {current_page_number} 页图片失败。停止第 {first_page}-{last_page} 段。")
+                return False, pages_processed
+            if blocking_stats is not None:
+                blocking_stats.mark_required(captured_page.source_url)
+            with tracer.span("pipeline_wait", current_page_number):
+                pipeline.submit(captured_page)
+            if pipeline.failed:
+                return False, pages_processed
+            pages_processed += 1
+            with tracer.span("pacing", current_page_number):
+                pacing.after_page(pages_processed)
+
+        next_page_number = current_page_number + 1
+        while next_page_number <= last_page and checkpoint.is_page_done(next_page_number):
+            next_page_number += 1
+        if next_page_number > last_page:
+            return True, pages_processed
+        if go_to_page(session, image_id, next_page_number, tracer):
+            current_page_number = next_page_number
+        elif session.click_next_page(image_id, tracer):
+            current_page_number += 1
         else:
-            time.sleep(1.5) 
-
-        logger.info(f"第 {page_number} 页：等待图片完全加载 (complete, naturalWidth > 0, clientRects存在)。")
-        try:
-            wait.until(lambda d: d.execute_script(
-                "return arguments[0].complete && typeof arguments[0].naturalWidth != 'undefined' && arguments[0].naturalWidth > 0 && arguments[0].getClientRects().length > 0",
-                image_element
-            ))
-            logger.info(f"第 {page_number} 页：图片已完全加载。")
-        except TimeoutException:
-            logger.warning(f"第 {page_number} 页：等待图片加载超时。截图可能不完整。")
-        
-        try:
-            image_element = driver.find_element(By.ID, image_id)
-            location_css = image_element.location
-            size_css = image_element.size
-            logger.info(f"第 {page_number} 页：图片CSS位置: {location_css}, 尺寸: {size_css}")
-        except NoSuchElementException:
-            logger.error(f"第 {page_number} 页：在获取最终位置前，图片元素 '{image_id}' 消失。")
-            return False
+            logger.warning(f"无法从第 {current_page_number} 页翻到下一页。停止第 {first_page}-{last_page} 段。")
+            return False, pages_processed
+    return False, pages_processed
 
-        if not size_css or size_css['width'] == 0 or size_css['height'] == 0:
-            logger.error(f"第 {page_number} 页：无效的图片尺寸: {size_css}。跳过此页。")
-            return False
-
-        doc_scroll_height = driver.execute_script("return document.documentElement.scrollHeight;")
-        doc_scroll_width = driver.execute_script("return document.documentElement.scrollWidth;")
-        element_bottom_css = location_css['y'] + size_css['height']
-        
-        page_height_to_set = max(doc_scroll_height, element_bottom_css + 200, 3000)
-        initial_window_width = driver.get_window_size().get('width', 1920)
-        page_width_to_set = max(doc_scroll_width, initial_window_width, location_css['x'] + size_css['width'] + 100)
-
-        current_window_size = driver.get_window_size()
-        if current_window_size['width'] != page_width_to_set or current_window_size['height'] != page_height_to_set:
-            logger.info(f"第 {page_number} 页：调整窗口大小为 {page_width_to_set}x{page_height_to_set}")
-            driver.set_window_size(page_width_to_set, page_height_to_set)
-            time.sleep(2)
-        
-        final_cropped_path = os.path.join(output_dir, f"{page_number}.png")
-
-        image_element = driver.find_element(By.ID, image_id)
-        location_css = image_element.location
-        size_css = image_element.size
-
-        dpr_script_output = driver.execute_script('return window.devicePixelRatio')
-        dpr = float(dpr_script_output) if dpr_script_output else 1.0
-        logger.info(f"第 {page_number} 页：设备像素比 (DPR): {dpr}")
-
-        logger.info(f"第 {page_number} 页：正在进行截图。")
-        screenshot_bytes = driver.get_screenshot_as_png()
-        img = Image.open(io.BytesIO(screenshot_bytes))
-        logger.info(f"第 {page_number} 页：完整截图尺寸 (物理像素): {img.width}x{img.height}")
-
-        compensated_top_css = location_css['y'] - vertical_offset_compensation
-        left_phys = int(location_css['x'] * dpr)
-        top_phys = int(compensated_top_css * dpr)
-        right_phys = int((location_css['x'] + size_css['width']) * dpr)
-        bottom_phys = int((compensated_top_css + size_css['height']) * dpr)
-
-        crop_left = max(0, left_phys)
-        crop_top = max(0, top_phys)
-        crop_right = min(img.width, right_phys)
-        crop_bottom = min(img.height, bottom_phys)
-
-        if crop_left >= crop_right or crop_top >= crop_bottom:
-            logger.error(f"第 {page_number} 页：无效的裁剪区域: 左{crop_left} 上{crop_top} 右{crop_right} 下{crop_bottom}。跳过裁剪。")
+def _capture_extra_slice(
+    backend, session, start_url, image_id, vertical_offset_compensation, page_slice,
+    checkpoint, pipeline, pacing, tracer, stop_event
+):
+    """在额外借来的会话中打开章节、跳到本段第一页并捕获本段，结束后归还会话。"""
+    first_page, last_page = page_slice
+    healthy = True
+    pages_processed = 0
+    try:
+        with tracer.span("open_chapter", first_page):
+            opened_page = open_chapter_at_page(session, start_url, image_id, first_page)
+        if opened_page != first_page and not go_to_page(session, image_id, first_page, tracer):
+            logger.warning(f"无法跳转到第 {first_page} 页，第 {first_page}-{last_page} 段未捕获。")
             return False
-
-        logger.info(f"第 {page_number} 页：裁剪区域: 左{crop_left} 上{crop_top} 右{crop_right} 下{crop_bottom}")
-        cropped_img = img.crop((crop_left, crop_top, crop_right, crop_bottom))
-        cropped_img.save(final_cropped_path)
-        logger.info(f"第 {page_number} 页：已保存裁剪后的图片到 {final_cropped_path}")
-        return True
-
-    except NoSuchElementException:
-        logger.error(f"第 {page_number} 页：图片元素 '{image_id}' 未找到。", exc_info=True)
-        return False
-    except TimeoutException:
-        logger.error(f"第 {page_number} 页：图片捕获过程中超时。", exc_info=True)
+        succeeded, pages_processed = _capture_page_slice(
+            session, image_id, vertical_offset_compensation, first_page, last_page,
+            checkpoint, pipeline, pacing, tracer, stop_event
+        )
+        return succeeded
+    except SessionError as e:
+        logger.error(f"第 {first_page}-{last_page} 段捕获过程中发生浏览器错误: {e}")
+        healthy = False
         return False
     except Exception as e:
-        logger.error(f"第 {page_number} 页：捕获图片时发生错误: {e}", exc_info=True)
+        logger.error(f"第 {first_page}-{last_page} 段捕获过程中发生意外错误: {e}", exc_info=True)
         return False
+    finally:
+        backend.release_session(session, pages_captured=pages_processed, healthy=healthy)
 
-def click_next_page_button(driver, wait, image_id_to_staleness_check):
-    next_page_button = None
-    try:
-        next_page_buttons = driver.find_elements(By.XPATH, "//div[@id='pagination']//a[contains(@class, 'next') and (contains(text(), '下一页') or contains(@href, 'SMH.utils.goPage'))]")
-        for btn in next_page_buttons:
-            onclick_value = btn.get_attribute("onclick")
-            is_next_chapter_button = False
-            if onclick_value and "nextC" in onclick_value:
-                is_next_chapter_button = True
-            if "下一章" not in btn.text and not is_next_chapter_button:
-                next_page_button = btn
-                break
-        
-        if not next_page_button:
-            logger.info("未找到“下一页”按钮（不是 'a' 标签或不符合条件）。假定已到章节末尾。")
-            return False
-
-        # 主 try 块，用于处理点击和导航操作
-        logger.info("正在将“下一页”按钮滚动到视图中。")
-        driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'center'});", next_page_button)
-        time.sleep(0.2) 
-
-        old_image_element = driver.find_element(By.ID, image_id_to_staleness_check)
-
-        if not next_page_button.is_displayed():
-            logger.warning("“下一页”按钮找到但在滚动后未显示。尝试使用 JavaScript 点击作为后备。")
-            driver.execute_script("arguments[0].click();", next_page_button)
-        else:
-            logger.info("“下一页”按钮已显示。等待其变为可点击状态并尝试点击。")
-            try:
-                WebDriverWait(driver, 10).until(EC.element_to_be_clickable(next_page_button))
-                next_page_button.click()
-            except ElementClickInterceptedException:
-                logger.warning("点击“下一页”按钮时发生 ElementClickInterceptedException，尝试使用 JavaScript 点击。")
-                driver.execute_script("arguments[0].click();", next_page_button)
-            except TimeoutException: 
-                logger.warning("等待“下一页”按钮变为可点击状态超时，尝试使用 JavaScript 点击。")
-                driver.execute_script("arguments[0].click();", next_page_button)
-        
-        logger.info("等待页面导航（旧图片元素变为陈旧状态）...")
-        wait.until(EC.staleness_of(old_image_element))
-        
-        logger.info(f"等待新图片 '{image_id_to_staleness_check}' 在导航后可见...")
-        wait.until(EC.visibility_of_element_located((By.ID, image_id_to_staleness_check)))
-        
-        logger.info("成功导航到下一页。")
-        time.sleep(0.5) 
-        return True
-
-    except NoSuchElementException as nse: 
-        logger.error(f"在下一页点击/等待逻辑中发生 NoSuchElementException: {nse}", exc_info=True)
-        return False
-    except TimeoutException: 
-        logger.warning("等待页面导航超时（陈旧状态或新图片可见性）。可能是章节末尾或加载缓慢。")
-        try: 
-            if driver.find_element(By.XPATH, "//div[@id='pagination']//span[contains(@class, 'disabled') and (contains(text(), '下一页'))]").is_displayed():
-                logger.info("通过查找已禁用的“下一页”span确认已到章节末尾。")
-        except NoSuchElementException:
-            logger.info("超时后未找到已禁用的“下一页”span。")
-        return False 
-    except Exception as e: 
-        logger.error(f"点击“下一页”或等待导航时发生意外错误: {e}", exc_info=True)
-        return False
+def _capture_chapter_split(
+    backend, session, start_url, image_id, urls_to_block, blocking_profile, vertical_offset_compensation,
+    current_page_number, total_pages, checkpoint, pipeline, pacing, tracer, blocking_stats=None
+):
+    """
+    把本章剩余的页面分段，由当前会话和额外借到的会话并行捕获。
+    页数不足 CHAPTER_SPLIT_MIN_PAGES 或借不到额外会话时返回 None（调用方按顺序捕获）；
+    否则返回 (是否所有段都成功, 当前会话捕获的页数)。
+    """
+    missing_pages = [n for n in range(current_page_number, total_pages + 1) if not checkpoint.is_page_done(n)]
+    if len(missing_pages) < max(2, CHAPTER_SPLIT_MIN_PAGES):
+        return None
+    extra_sessions = []
+    for _ in range(min(CHAPTER_SPLIT_SESSIONS, len(missing_pages)) - 1):
+        extra_session = backend.open_session(urls_to_block, blocking_profile, wait=False)
+        if extra_session is None:
+            break
+        extra_sessions.append(extra_session)
+    if not extra_sessions:
+        logger.info("没有空闲的浏览器会话，本章按顺序捕获。")
+        return None
+
+    slices = _plan_page_slices(missing_pages, len(extra_sessions) + 1)
+    logger.info(f"本章剩余 {len(missing_pages)} 页，分为 {len(slices)} 段并行捕获: {slices}")
+    stop_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(extra_sessions), thread_name_prefix="page-slice") as executor:
+        futures = [
+            executor.submit(
+                _capture_extra_slice, backend, extra_session, start_url, image_id, vertical_offset_compensation,
+                page_slice, checkpoint, pipeline, pacing, tracer, stop_event
+            )
+            for extra_session, page_slice in zip(extra_sessions, slices[1:])
+        ]
+        # 当前会话已经停在第一段的第一页
+        try:
+            first_page, last_page = slices[0]
+            succeeded, pages_processed = _capture_page_slice(
+                session, image_id, vertical_offset_compensation, first_page, last_page,
+                checkpoint, pipeline, pacing, tracer, stop_event, blocking_stats
+            )
+        except BaseException:
+            stop_event.set()
+            raise
+        if not succeeded:
+            stop_event.set()
+        for future in futures:
+            if not future.result():
+                stop_event.set()
+                succeeded = False
+    return succeeded, pages_processed
 
 def capture_chapter_images(
     start_url,
     image_id,
     urls_to_block,
     vertical_offset_compensation,
-    base_output_dir="manga_chapters"
+    base_output_dir="manga_chapters",
+    backend=None,
+    pacing=None
 ):
-    # 检测并选择浏览器
-    selected_browser, _ = select_browser()
-    if not selected_browser:
-        return False
-
-    # 根据选择的浏览器设置选项
-    if selected_browser == 'chrome':
-        options = webdriver.ChromeOptions()
-        service = ChromeService(ChromeDriverManager().install())
-        driver_class = webdriver.Chrome
-    else:  # edge
-        options = webdriver.ChromeOptions()  # Edge 使用相同的选项
-        service = EdgeService(EdgeChromiumDriverManager().install())
-        driver_class = webdriver.ChromiumEdge  # 或者 webdriver.Edge
-
-    options.add_argument("--headless=new")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--force-device-scale-factor=1")
-    initial_window_width = 1920
-    initial_window_height = 1080
-    options.add_argument(f"--window-size={initial_window_width},{initial_window_height}")
-
-    driver = None
+    """
+    逐页捕获一个章节的图片。
+    如果传入 backend（见 backends.CaptureBackend），则从中借用会话并在结束后归还；
+    否则按 CAPTURE_BACKEND 为本章节单独创建后端并在结束后关闭。
+    pacing 为页面之间的限速策略，默认使用 pacing.default_pacing。
+    站点配置了拦截规则（BLOCKING_PROFILES）时，按规则生成 URL 拦截列表，urls_to_block 作为补充。
+    """
+    pacing = pacing or default_pacing
+    chapter_output_dir = base_output_dir # 直接使用 base_output_dir
+    os.makedirs(chapter_output_dir, exist_ok=True)
+    logger.info(f"图片输出目录: {chapter_output_dir}") # 更新日志信息
+
+    # 页面级检查点：重试或重新运行时跳过已保存并校验过的页面
+    checkpoint = ChapterCheckpoint(chapter_output_dir, start_url)
+    if checkpoint.is_complete():
+        logger.info(f"检查点显示本章 {checkpoint.total_pages} 页均已保存，无需重新捕获。")
+        return True
+    start_page = checkpoint.first_missing_page()
+    tracer = open_chapter_tracer(chapter_output_dir, os.path.basename(os.path.normpath(chapter_output_dir)))
+    pipeline = PagePipeline(chapter_output_dir, checkpoint, tracer=tracer)
+    quality_checker = PageQualityChecker() if PAGE_QUALITY_CHECK else None
+
+    blocking_profile = blocking_profile_for_url(start_url)
+    if blocking_profile is not None:
+        urls_to_block = list(dict.fromkeys(blocking_profile.url_patterns() + list(urls_to_block or [])))
+    blocking_stats = None
+
+    owns_backend = backend is None
+    session = None
+    session_healthy = True
     chapter_fully_captured = True # 初始化成功标志
+    pages_processed = 0
     try:
-        logger.info(f"正在初始化{selected_browser.capitalize()}驱动程序以捕获章节...")
-        driver = driver_class(service=service, options=options)
-        wait = WebDriverWait(driver, 60) 
-
-        if urls_to_block:
-            logger.info(f"正在设置URL拦截: {urls_to_block}")
-            driver.execute_cdp_cmd('Network.enable', {})
-            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': urls_to_block})
-
-        logger.info(f"正在访问起始URL: {start_url}")
-        driver.get(start_url)
-        wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        logger.info("初始页面已加载。")
-
-        match = re.search(r'/(\d+)\.html$', start_url)
-        chapter_id_str = match.group(1) if match else "未知章节"
-        chapter_output_dir = base_output_dir # 直接使用 base_output_dir
-        os.makedirs(chapter_output_dir, exist_ok=True)
-        logger.info(f"图片输出目录: {chapter_output_dir}") # 更新日志信息
-
-        current_page_number = 1
+        if owns_backend:
+            backend = create_capture_backend(pool_size=1)
+        with tracer.span("acquire_driver"):
+            session = backend.open_session(urls_to_block, blocking_profile)
+        if blocking_profile is not None and BLOCKING_STATS:
+            blocking_stats = blocking_profile.start_chapter()
+            session.add_network_listener(blocking_stats.observe)
+
+        with tracer.span("open_chapter", start_page):
+            current_page_number = open_chapter_at_page(session, start_url, image_id, start_page)
         max_pages_to_try = 1000
 
-        while current_page_number <= max_pages_to_try:
-            logger.info(f"--- 正在处理第 {current_page_number} 页 ---")
-            
-            if not capture_single_page_image(
-                driver,
-                wait,
-                image_id,
-                vertical_offset_compensation,
-                chapter_output_dir,
-                current_page_number
-            ):
-                logger.warning(f"捕获第 {current_page_number} 页图片失败。停止此章节处理。")
-                chapter_fully_captured = False # 标记章节未完全捕获
-                break
-            
-            time.sleep(1)
-
-            if not click_next_page_button(driver, wait, image_id):
-                logger.info(f"在第 {current_page_number} 页后无法导航到下一页。假定已到章节末尾。")
+        # 总页数只读取一次；读得到时直接按页码跳转，读不到时使用“下一页”按钮
+        _, total_pages = session.read_page_state()
+        direct_navigation = PAGE_NAVIGATION_MODE == "direct" and bool(total_pages)
+        if direct_navigation:
+            logger.info(f"本章共 {total_pages} 页，使用页码直接跳转。")
+            max_pages_to_try = total_pages
+        elif PAGE_NAVIGATION_MODE == "direct":
+            logger.info("无法读取本章总页数，使用“下一页”按钮翻页。")
+
+        # 长章节可以分段由多个会话并行捕获，其余情况按顺序逐页捕获
+        split_result = None
+        if direct_navigation and CHAPTER_SPLIT_SESSIONS > 1:
+            split_result = _capture_chapter_split(
+                backend, session, start_url, image_id, urls_to_block, blocking_profile, vertical_offset_compensation,
+                current_page_number, total_pages, checkpoint, pipeline, pacing, tracer, blocking_stats
+            )
+        if split_result is not None:
+            slices_succeeded, pages_processed = split_result
+            if slices_succeeded:
+                logger.info(f"所有分段均已捕获 (共 {total_pages} 页)。")
+                checkpoint.mark_finished(total_pages)
+            else:
+                chapter_fully_captured = False
+
+        while split_result is None and current_page_number <= max_pages_to_try:
+            if checkpoint.is_page_done(current_page_number):
+                logger.info(f"--- 第 {current_page_number} 页已在检查点中，跳过捕获 ---")
+            else:
+                logger.info(f"--- 正在处理第 {current_page_number} 页 ---")
+                captured_page = capture_single_page_image(
+                    session,
+                    image_id,
+                    vertical_offset_compensation,
+                    current_page_number,
+                    quality_checker,
+                    tracer
+                )
+                if not captured_page:
+                    logger.warning(f"捕获第 {current_page_number} 页图片失败。停止此章节处理。")
+                    chapter_fully_captured = False # 标记章节未完全捕获
+                    break
+                if blocking_stats is not None:
+                    blocking_stats.mark_required(captured_page.source_url)
+                # 解码/编码和写盘交给流水线，浏览器继续翻页
+                with tracer.span("pipeline_wait", current_page_number):
+                    pipeline.submit(captured_page)
+                if pipeline.failed:
+                    logger.warning(f"流水线中有页面处理失败 {pipeline.failed_pages()}。停止此章节处理。")
+                    chapter_fully_captured = False
+                    break
+                pages_processed += 1
+                with tracer.span("pacing", current_page_number):
+                    pacing.after_page(pages_processed)
+
+            if direct_navigation:
+                if current_page_number >= total_pages:
+                    logger.info(f"已到达最后一页 (共 {total_pages} 页)。")
+                    checkpoint.mark_finished(total_pages)
+                    break
+                # 检查点中已保存的页面不必经过，直接跳到下一个需要捕获的页面
+                next_page_number = current_page_number + 1
+                while next_page_number < total_pages and checkpoint.is_page_done(next_page_number):
+                    next_page_number += 1
+                if go_to_page(session, image_id, next_page_number, tracer):
+                    current_page_number = next_page_number
+                    continue
+                logger.warning(f"直接跳转到第 {next_page_number} 页失败，改用“下一页”按钮翻页。")
+                direct_navigation = False
+                displayed_page, _ = session.read_page_state()
+                if displayed_page:
+                    current_page_number = displayed_page
+
+            if not session.click_next_page(image_id, tracer):
+                # 只有确认到了章节末尾才把结束页写入检查点，点击超时等临时失败让本次尝试失败，重试时从检查点继续
+                if is_chapter_end(session, current_page_number):
+                    logger.info(f"在第 {current_page_number} 页后没有下一页，已到章节末尾。")
+                    checkpoint.mark_finished(current_page_number)
+                else:
+                    logger.warning(f"在第 {current_page_number} 页后无法导航到下一页，且无法确认已到章节末尾。停止此章节处理。")
+                    chapter_fully_captured = False
                 break
             
             current_page_number += 1
 
-            if current_page_number % 30 == 0:
-                logger.info(f"已处理 {current_page_number} 页，暂停10秒。")
-                time.sleep(10)
-
             if current_page_number > max_pages_to_try:
                 logger.warning(f"已达到最大尝试页数 ({max_pages_to_try})。停止处理。")
                 break
+
+        # 等待流水线把所有已捕获的页面写盘，任何页面失败都使本章失败
+        if not pipeline.close():
+            chapter_fully_captured = False
+        if chapter_fully_captured and checkpoint.first_missing_page() is not None:
+            logger.warning(f"章节结束时仍有未保存的页面 (第 {checkpoint.first_missing_page()} 页)。")
+            chapter_fully_captured = False
         
         logger.info(f"章节捕获尝试完成。图片保存在 {chapter_output_dir}")
 
-    except WebDriverException as e_wd:
-        logger.error(f"章节捕获过程中发生WebDriver错误: {e_wd}", exc_info=True)
-        chapter_fully_captured = False # 确保在WebDriver初始化或使用中出错时标记失败
+    except SessionError as e_session:
+        logger.error(f"章节捕获过程中发生浏览器错误: {e_session}", exc_info=True)
+        chapter_fully_captured = False # 确保在浏览器启动或使用中出错时标记失败
+        session_healthy = False
     except Exception as e:
         logger.error(f"章节捕获过程中发生意外错误: {e}", exc_info=True)
         chapter_fully_captured = False # 确保在其他意外错误时标记失败
     finally:
-        if driver:
-            driver.quit()
+        if not pipeline.close():
+            chapter_fully_captured = False
+        tracer.close()
+        if blocking_stats is not None:
+            try:
+                session.flush_network_events()
+            except SessionError as e:
+                logger.warning(f"读取网络事件失败，拦截统计可能不完整: {e}")
+            session.remove_network_listener(blocking_stats.observe)
+            blocking_stats.finish()
+        if session is not None:
+            backend.release_session(session, pages_captured=pages_processed, healthy=session_healthy)
+        if owns_backend and backend is not None:
+            backend.close()
             logger.info("浏览器已关闭。")
     return chapter_fully_captured # 返回捕获状态
 
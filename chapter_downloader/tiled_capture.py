@@ -0,0 +1,110 @@
+import io
+import logging
+import math
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from chapter_downloader.config import SCREENSHOT_TILE_HEIGHT, PAGE_PNG_COMPRESS_LEVEL
+from chapter_downloader.page_pipeline import CapturedPage
+
+
+logger = logging.getLogger(__name__)
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_FILTER_UP = 2
+
+def _png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff)
+
+class StreamingPngEncoder:
+    """
+    按从上到下的顺序逐块追加像素行的 RGB PNG 编码器。
+    每块在追加时就完成滤波和压缩，之后即可丢弃，内存占用只与一块的大小相当（另加压缩后的输出）。
+    总高度在 finish 时才确定。
+    """
+    def __init__(self, width, compress_level=PAGE_PNG_COMPRESS_LEVEL):
+        self.width = width
+        self.height = 0
+        self._compressor = zlib.compressobj(compress_level)
+        self._previous_row = np.zeros((width, 3), dtype=np.uint8)
+        self._idat = []
+
+    def append_rows(self, rows):
+        """rows 为 (行数, width, 3) 的 uint8 数组。"""
+        if rows.shape[1:] != (self.width, 3):
+            raise ValueError(f"像素块尺寸 {rows.shape} 与图片宽度 {self.width} 不符")
+        # Up 滤波：每行减去上一行（按字节取模），漫画页面的压缩率明显好于不滤波
+        previous = np.concatenate((self._previous_row[np.newaxis], rows[:-1]))
+        filtered = np.empty((rows.shape[0], self.width * 3 + 1), dtype=np.uint8)
+        filtered[:, 0] = _PNG_FILTER_UP
+        filtered[:, 1:] = (rows - previous).reshape(rows.shape[0], -1)
+        self._previous_row = rows[-1].copy()
+        compressed = self._compressor.compress(filtered.tobytes())
+        if compressed:
+            self._idat.append(compressed)
+        self.height += rows.shape[0]
+
+    def finish(self):
+        """返回完整的 PNG 字节。"""
+        self._idat.append(self._compressor.flush())
+        header = struct.pack('>IIBBBBB', self.width, self.height, 8, 2, 0, 0, 0)
+        chunks = [_PNG_SIGNATURE, _png_chunk(b'IHDR', header)]
+        chunks.extend(_png_chunk(b'IDAT', data) for data in self._idat if data)
+        chunks.append(_png_chunk(b'IEND', b''))
+        return b''.join(chunks)
+
+def _fit_width(pixels, width):
+    """DPR 取整可能使各块宽度相差一两个像素，裁掉多余的列或重复最右一列补齐。"""
+    if pixels.shape[1] > width:
+        return pixels[:, :width]
+    if pixels.shape[1] < width:
+        return np.pad(pixels, ((0, 0), (0, width - pixels.shape[1]), (0, 0)), mode='edge')
+    return pixels
+
+def capture_tiled(session, probe, vertical_offset_compensation, page_number):
+    """
+    分块截取高于视口的页面：把视口逐块滚动到图片上，每块只截取视口内的区域（不放大截图表面），
+    解码后立即追加到流式 PNG 编码器。probe 为 probe_page_image 的结果（图片已隔离）。
+    返回 PNG 格式的 CapturedPage，截图为空或图片宽于视口时返回 None（调用方回退到单次截图）；浏览器错误由调用方处理。
+    """
+    rect = probe['rect']
+    # 块只按高度切分，宽于视口的图片右侧会落在视口之外而被截掉
+    viewport_width = probe.get('viewportWidth')
+    if viewport_width and rect['width'] > viewport_width:
+        logger.info(f"第 {page_number} 页：图片宽度 {rect['width']:.0f}px 超过视口宽度 {viewport_width}px，不使用分块截图。")
+        return None
+    viewport_height = int(probe.get('viewportHeight') or SCREENSHOT_TILE_HEIGHT)
+    tile_height = max(1, min(SCREENSHOT_TILE_HEIGHT, viewport_height))
+    # 块边界取整数 CSS 像素，相邻两块之间不会重叠或漏行
+    top = math.floor(max(0, rect['y'] - vertical_offset_compensation))
+    bottom = math.ceil(max(0, rect['y'] - vertical_offset_compensation) + rect['height'])
+    logger.info(f"第 {page_number} 页：图片高度 {rect['height']:.0f}px，按每块 {tile_height}px 分块截图。")
+
+    encoder = None
+    tile_count = 0
+    y = top
+    while y < bottom:
+        height = min(tile_height, bottom - y)
+        session.scroll_to(rect['x'], y)
+        tile_bytes = session.capture_clip(
+            {'x': rect['x'], 'y': y, 'width': rect['width'], 'height': height}, 0, 'png', None, beyond_viewport=False
+        )
+        if not tile_bytes:
+            logger.warning(f"第 {page_number} 页：第 {tile_count + 1} 块截图为空。")
+            return None
+        with Image.open(io.BytesIO(tile_bytes)) as tile:
+            pixels = np.asarray(tile.convert('RGB'))
+        if encoder is None:
+            encoder = StreamingPngEncoder(pixels.shape[1])
+        encoder.append_rows(_fit_width(pixels, encoder.width))
+        tile_count += 1
+        y += height
+
+    if encoder is None:
+        return None
+    data = encoder.finish()
+    logger.info(f"第 {page_number} 页：已拼接 {tile_count} 块截图 ({encoder.width}x{encoder.height}，{len(data)} 字节)")
+    return CapturedPage(page_number, data, content_type="image/png", source_url=probe.get('src'))
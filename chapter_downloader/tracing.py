@@ -0,0 +1,166 @@
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from chapter_downloader.config import TRACE_ENABLED, TRACE_FILENAME
+
+
+logger = logging.getLogger(__name__)
+
+# 一次运行的标识。主进程导入时生成并放进环境变量，工作进程继承同一个值，
+# 汇总时即可只统计最近一次运行
+_RUN_ID_ENV = "COMIC_CAPTURE_TRACE_RUN"
+RUN_ID = os.environ.setdefault(_RUN_ID_ENV, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+
+class PageTracer:
+    """
+    把捕获各阶段的耗时以 JSONL 追加写入章节目录中的追踪文件，每行一个 span：
+    {"run": ..., "chapter": ..., "phase": "probe", "page": 3, "ms": 12.5, "ok": true, ...}
+    可以在浏览器线程和流水线线程中同时使用。
+    """
+    def __init__(self, path, chapter=None):
+        self.path = path
+        self.chapter = chapter
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    @contextmanager
+    def span(self, phase, page=None):
+        """
+        计时一个阶段。with 块中可以往产出的字典里添加额外字段（例如字节数）。
+        块内抛出异常时该 span 记为 ok=false，异常照常向外传播。
+        """
+        record = {}
+        ok = True
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._write({
+                "run": RUN_ID,
+                "chapter": self.chapter,
+                "phase": phase,
+                "page": page,
+                "ms": round(elapsed_ms, 3),
+                "ok": ok,
+                **record
+            })
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(line + "\n")
+                self._file.flush()
+            except OSError as e:
+                logger.warning(f"写入追踪文件 '{self.path}' 失败: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class NullTracer:
+    """关闭追踪时使用，span 不做任何事。"""
+    @contextmanager
+    def span(self, phase, page=None):
+        yield {}
+
+    def close(self):
+        pass
+
+null_tracer = NullTracer()
+
+def open_chapter_tracer(chapter_dir, chapter=None):
+    """为章节打开追踪文件；TRACE_ENABLED 关闭或文件无法打开时返回 null_tracer。"""
+    if not TRACE_ENABLED:
+        return null_tracer
+    path = os.path.join(chapter_dir, TRACE_FILENAME)
+    try:
+        return PageTracer(path, chapter)
+    except OSError as e:
+        logger.warning(f"无法打开追踪文件 '{path}'，本章不记录耗时: {e}")
+        return null_tracer
+
+def find_trace_files(paths):
+    """在给定的文件或目录（递归）中查找追踪文件。"""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for directory, _, filenames in os.walk(path):
+            if TRACE_FILENAME in filenames:
+                yield os.path.join(directory, TRACE_FILENAME)
+
+def load_spans(trace_files):
+    spans = []
+    for trace_file in trace_files:
+        with open(trace_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    spans.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # 进程被中断时最后一行可能不完整
+                    logger.warning(f"跳过追踪文件 '{trace_file}' 中无法解析的行。")
+    return spans
+
+def percentile(sorted_values, fraction):
+    """最近秩法求百分位数，sorted_values 需已排序且非空。"""
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize_spans(spans):
+    """按阶段汇总耗时，返回 [(阶段, 次数, 失败次数, p50, p95, 最大, 总计毫秒)]，按总耗时降序。"""
+    durations = defaultdict(list)
+    failures = defaultdict(int)
+    for span in spans:
+        durations[span["phase"]].append(span["ms"])
+        if not span.get("ok", True):
+            failures[span["phase"]] += 1
+    rows = []
+    for phase, values in durations.items():
+        values.sort()
+        rows.append((
+            phase, len(values), failures[phase],
+            percentile(values, 0.50), percentile(values, 0.95), values[-1], sum(values)
+        ))
+    rows.sort(key=lambda row: row[6], reverse=True)
+    return rows
+
+def print_trace_summary(paths, run="latest"):
+    spans = load_spans(find_trace_files(paths))
+    if not spans:
+        print("没有找到追踪记录。")
+        return
+    if run == "latest":
+        run = max(span.get("run", "") for span in spans)
+    if run != "all":
+        spans = [span for span in spans if span.get("run") == run]
+    chapters = {span.get("chapter") for span in spans}
+    print(f"运行: {run}  章节数: {len(chapters)}  span 数: {len(spans)}")
+    print(f"{'阶段':<22}{'次数':>8}{'失败':>6}{'p50(ms)':>12}{'p95(ms)':>12}{'max(ms)':>12}{'总计(s)':>10}")
+    for phase, count, failed, p50, p95, maximum, total in summarize_spans(spans):
+        print(f"{phase:<22}{count:>8}{failed:>6}{p50:>12.1f}{p95:>12.1f}{maximum:>12.1f}{total / 1000:>10.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="汇总章节捕获追踪文件中各阶段的耗时 (p50/p95/max)。")
+    parser.add_argument("paths", nargs="+", help="追踪文件或包含章节目录的目录（递归查找）")
+    parser.add_argument("--run", default="latest", help="要统计的运行标识，'latest'（默认）或 'all'")
+    args = parser.parse_args()
+    print_trace_summary(args.paths, args.run)